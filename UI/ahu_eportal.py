@@ -3,11 +3,16 @@
 
 """
 AHU ePortal 自动登录后台脚本
-此脚本用于macOS LaunchAgent服务，在网络状态变化时自动执行
+此脚本用于macOS LaunchAgent服务，默认在前台运行常驻登录服务（login daemon）并由launchd
+保持运行；常驻服务无法启动时退回一次性登录，由launchd按StartInterval定期重试。
+加--once参数时只执行一次登录。
 """
 
 import os
 import sys
+import json
+import signal
+import socket
 import subprocess
 import logging
 from datetime import datetime
@@ -28,25 +33,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger('AutoNet4AHU.agent')
 
+# 常驻登录服务的控制套接字
+CONTROL_SOCKET = os.path.expanduser("~/Library/Application Support/AutoNet4AHU/state/control.sock")
+
+# 常驻服务在该时间(秒)内异常退出视为无法启动，退回一次性登录
+DAEMON_STARTUP_GRACE = 30
+
 def get_script_path():
     """获取当前脚本的路径"""
     return os.path.dirname(os.path.realpath(__file__))
 
+def login_via_service():
+    """
+    通过常驻登录服务的控制接口登录
+    
+    Returns:
+        bool: 登录是否成功，常驻服务未运行时返回None
+    """
+    if not os.path.exists(CONTROL_SOCKET):
+        return None
+    
+    request = {"jsonrpc": "2.0", "id": 1, "method": "login", "params": {}}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(120)
+            sock.connect(CONTROL_SOCKET)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            response = json.loads(sock.makefile("rb").readline())
+    except (OSError, ValueError) as e:
+        logger.warning(f"常驻服务不可用: {e}")
+        return None
+    
+    if "error" in response:
+        logger.warning(f"常驻服务返回错误: {response['error'].get('message')}")
+        return None
+    
+    result = response["result"]
+    logger.info(f"常驻服务登录结果: {result.get('message')} (账号 {result.get('account')}, 耗时 {result.get('duration')}s)")
+    return bool(result.get("success"))
+
+def get_login_path():
+    """
+    获取登录程序路径并确保其可执行
+    
+    Returns:
+        str: 登录程序路径，不存在时返回None
+    """
+    login_path = os.path.join(get_script_path(), "login")
+    if not os.path.exists(login_path):
+        logger.error(f"登录程序不存在: {login_path}")
+        return None
+    os.chmod(login_path, 0o755)
+    return login_path
+
 def run_login():
     """运行登录程序"""
     try:
-        # 获取login程序路径
-        script_dir = get_script_path()
-        login_path = os.path.join(script_dir, "login")
-        
-        # 检查login程序是否存在
-        if not os.path.exists(login_path):
-            logger.error(f"登录程序不存在: {login_path}")
+        login_path = get_login_path()
+        if login_path is None:
             return False
         
-        # 确保登录程序有执行权限
-        os.chmod(login_path, 0o755)
-        
         logger.info(f"开始执行登录程序: {login_path}")
         
         # 使用subprocess执行登录程序
@@ -71,19 +117,77 @@ def run_login():
         logger.exception(f"执行登录程序时发生异常: {e}")
         return False
 
+def run_daemon():
+    """
+    在前台运行常驻登录服务，直到其退出
+    
+    Returns:
+        int: 常驻服务的退出码，无法启动时返回None
+    """
+    login_path = get_login_path()
+    if login_path is None:
+        return None
+    
+    logger.info(f"启动常驻登录服务: {login_path} daemon")
+    try:
+        # 输出直接写入launchd配置的日志文件
+        process = subprocess.Popen([login_path, "daemon"])
+    except OSError as e:
+        logger.error(f"启动常驻服务失败: {e}")
+        return None
+    
+    # launchd停止启动项时把SIGTERM转给常驻服务，等待其正常退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: process.terminate())
+    started = time.monotonic()
+    returncode = process.wait()
+    if returncode != 0 and time.monotonic() - started < DAEMON_STARTUP_GRACE:
+        logger.error(f"常驻服务启动后立即退出，返回码: {returncode}")
+        return None
+    logger.info(f"常驻服务已退出，返回码: {returncode}")
+    return returncode
+
+def run_once():
+    """
+    执行一次登录
+    
+    Returns:
+        bool: 登录是否成功
+    """
+    # 优先交给常驻服务登录，未运行时启动登录程序
+    success = login_via_service()
+    if success is None:
+        success = run_login()
+    logger.info(f"自动登录{'成功' if success else '失败'}")
+    return success
+
 def main():
-    """主函数"""
+    """
+    主函数
+    
+    Returns:
+        int: 退出码。常驻模式下只有常驻服务运行一段时间后异常退出时返回非0，
+        launchd据此（KeepAlive.SuccessfulExit=false）重新启动
+    """
     logger.info("=" * 50)
     logger.info(f"AHU ePortal 自动登录服务启动 - {datetime.now()}")
     
     # 延迟几秒，确保网络连接已经建立
     time.sleep(3)
     
-    # 运行登录程序
-    success = run_login()
-    logger.info(f"自动登录{'成功' if success else '失败'}")
+    if "--once" in sys.argv[1:]:
+        return 0 if run_once() else 1
+    
+    # 常驻服务已由其他方式启动时只请求其登录一次
+    if login_via_service() is not None:
+        return 0
     
-    return 0 if success else 1
+    returncode = run_daemon()
+    if returncode is None:
+        # 常驻服务无法启动，退回一次性登录；正常退出，由StartInterval定期重试，避免launchd反复拉起
+        logger.warning("常驻服务无法启动，改为执行一次性登录")
+        run_once()
+        return 0
+    return returncode
 
 if __name__ == "__main__":
     try:
@@ -58,6 +58,7 @@ pyinstaller \
   --name="${APP_NAME}" \
   --icon="${CURRENT_DIR}/icon.icns" \
   --windowed \
+  --paths="${ROOT_DIR}/loginCore" \
   --add-data="${CURRENT_DIR}/login:." \
   --add-data="${CURRENT_DIR}/register_agent.sh:." \
   --add-data="${CURRENT_DIR}/unregister_agent.sh:." \
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+内存映射的日志文件索引
+
+长期运行的机器上日志文件可达数百MB。这里用mmap映射文件，只为每一行记录起始偏移
+（array('Q')，8字节）和级别（array('B')，1字节），文件增长时只索引新增部分，
+文件被截断或轮转时重新索引。分页和过滤都按需进行：时间范围通过二分查找定位，
+运行ID和关键字直接在映射上反向查找，只解码最终显示的行，因此打开和搜索的耗时
+与内存占用都不随文件大小线性增长。
+
+日志行格式与登录核心一致：
+2024-09-02 08:00:00,123 - AutoNet4AHU.portal - INFO - [运行ID] 消息
+不符合该格式的行（多行消息、异常堆栈）视为上一条记录的续行，继承其级别和运行ID。
+"""
+
+import os
+import re
+import mmap
+import bisect
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+# 每次索引的最大字节数，索引分多次完成，界面不会卡顿
+DEFAULT_CHUNK = 4 * 1024 * 1024
+# 每页显示的行数
+PAGE_LINES = 500
+# 一次查找最多检查的行数，超过后返回游标由调用方继续
+DEFAULT_MAX_SCAN = 200000
+
+LEVEL_UNKNOWN = 0
+LEVELS = {b"DEBUG": 1, b"INFO": 2, b"WARNING": 3, b"ERROR": 4, b"CRITICAL": 5}
+LEVEL_NAMES = {code: name.decode("ascii") for name, code in LEVELS.items()}
+# 级别数组中标记记录首行的位
+_HEADER = 0x80
+_LEVEL_MASK = 0x7F
+
+_HEADER_PATTERN = re.compile(
+    rb"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d{3} - \S+ - ([A-Z]+) - (?:\[([0-9a-f]{8,32})\] )?"
+)
+
+LogFilter = namedtuple("LogFilter", ["min_level", "run_id", "text", "since", "until"])
+LogFilter.__new__.__defaults__ = (LEVEL_UNKNOWN, None, None, None, None)
+LogFilter.__doc__ = """
+日志过滤条件
+
+Args:
+    min_level: 最低级别，LEVELS中的值，LEVEL_UNKNOWN表示不限
+    run_id: 只显示指定登录运行的记录
+    text: 包含的文本（区分大小写）
+    since: 起始时间(Unix时间戳)
+    until: 截止时间(Unix时间戳)，不含
+"""
+
+
+class LogIndex:
+    """单个日志文件的行索引"""
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK):
+        """
+        初始化索引，实际的索引在refresh()中分批进行
+
+        Args:
+            path: 日志文件路径
+            chunk_size: 每次索引的最大字节数
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._file = None
+        self._map = None
+        self._inode = None
+        self._reset()
+
+    def _reset(self):
+        self.close()
+        self._offsets = array("Q")
+        self._levels = array("B")
+        self._indexed = 0
+        self._last_level = LEVEL_UNKNOWN
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @property
+    def size(self):
+        """已映射的文件大小(字节)"""
+        return len(self._map) if self._map is not None else 0
+
+    @property
+    def complete(self):
+        """是否已索引到文件末尾"""
+        return self._map is None or self._indexed >= len(self._map)
+
+    def _remap(self):
+        """
+        文件增长时重新映射，截断或轮转时清空索引
+
+        Returns:
+            bool: 文件是否可读
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._reset()
+            self._inode = None
+            return False
+        if stat.st_ino != self._inode or stat.st_size < self._indexed:
+            self._reset()
+            self._inode = stat.st_ino
+        if stat.st_size == self.size or stat.st_size == 0:
+            return True
+        if self._map is not None:
+            self._map.close()
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), stat.st_size, access=mmap.ACCESS_READ)
+        return True
+
+    def refresh(self, budget=None):
+        """
+        索引文件中新增的完整行
+
+        Args:
+            budget: 本次最多索引的字节数，默认为chunk_size
+
+        Returns:
+            bool: 是否已索引到文件末尾
+        """
+        if not self._remap() or self._map is None:
+            return True
+        end = min(len(self._map), self._indexed + (budget or self.chunk_size))
+        data = self._map[self._indexed:end]
+        # 只索引以换行结束的完整行，最后一行等写完后再索引
+        last_newline = data.rfind(b"\n")
+        if last_newline < 0:
+            if end == len(self._map) or not data:
+                return True
+            # 超长的单行按块大小截断处理
+            last_newline = len(data) - 1
+        offset = self._indexed
+        level = self._last_level
+        for line in data[:last_newline + 1].splitlines(keepends=True):
+            match = _HEADER_PATTERN.match(line)
+            if match:
+                level = LEVELS.get(match.group(2), LEVEL_UNKNOWN)
+                self._levels.append(level | _HEADER)
+            else:
+                self._levels.append(level)
+            self._offsets.append(offset)
+            offset += len(line)
+        self._indexed = offset
+        self._last_level = level
+        return self.complete
+
+    def tail_lines(self, count):
+        """
+        不依赖索引读取文件末尾的若干行，索引尚未完成时用于立即显示最新日志
+
+        Args:
+            count: 行数
+
+        Returns:
+            list: 行内容列表，从旧到新
+        """
+        self._remap()
+        if self._map is None:
+            return []
+        end = len(self._map)
+        if self._map[end - 1:end] == b"\n":
+            end -= 1
+        start = end
+        for _ in range(count):
+            newline = self._map.rfind(b"\n", 0, start)
+            if newline < 0:
+                start = 0
+                break
+            start = newline
+        if start:
+            start += 1
+        return self._map[start:end].decode("utf-8", errors="replace").splitlines()
+
+    def close(self):
+        """释放文件映射"""
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
+
+    def _line_bytes(self, index):
+        start = self._offsets[index]
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._indexed
+        return self._map[start:end].rstrip(b"\r\n")
+
+    def line(self, index):
+        """
+        Args:
+            index: 行号
+
+        Returns:
+            str: 行内容
+        """
+        return self._line_bytes(index).decode("utf-8", errors="replace")
+
+    def level(self, index):
+        """
+        Returns:
+            int: 行所在记录的级别
+        """
+        return self._levels[index] & _LEVEL_MASK
+
+    def _record_start(self, index):
+        """行所在记录的首行行号，文件开头的续行返回自身"""
+        while index > 0 and not self._levels[index] & _HEADER:
+            index -= 1
+        return index
+
+    def _header(self, index):
+        return _HEADER_PATTERN.match(self._line_bytes(self._record_start(index)))
+
+    def timestamp(self, index):
+        """
+        Returns:
+            float: 行所在记录的时间戳，无法解析时返回None
+        """
+        match = self._header(index)
+        if not match:
+            return None
+        return datetime.strptime(match.group(1).decode("ascii"), "%Y-%m-%d %H:%M:%S").timestamp()
+
+    def run_id(self, index):
+        """
+        Returns:
+            str: 行所在记录的运行ID，没有时返回None
+        """
+        match = self._header(index)
+        return match.group(3).decode("ascii") if match and match.group(3) else None
+
+    def find_time(self, ts):
+        """
+        二分查找第一条时间不早于ts的行，日志按时间顺序写入
+
+        Args:
+            ts: Unix时间戳
+
+        Returns:
+            int: 行号，所有行都更早时返回行数
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.timestamp(mid)
+            if value is not None and value >= ts:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _matches(self, index, log_filter):
+        if self.level(index) < log_filter.min_level:
+            return False
+        if log_filter.run_id and self.run_id(index) != log_filter.run_id:
+            return False
+        if log_filter.text and log_filter.text.encode("utf-8") not in self._line_bytes(index):
+            return False
+        return True
+
+    def search(self, log_filter=None, end=None, limit=PAGE_LINES, max_scan=DEFAULT_MAX_SCAN):
+        """
+        从end向文件开头查找符合条件的行，用于从最新的记录开始逐页向前浏览
+
+        Args:
+            log_filter: LogFilter过滤条件，为空时不过滤
+            end: 从该行号（不含）向前查找，为空时从文件末尾开始
+            limit: 最多返回的行数
+            max_scan: 最多检查的行数或关键字匹配次数
+
+        Returns:
+            tuple: (行号列表（升序）, 游标)；游标为继续向前查找时的end，已查找到开头时为None
+        """
+        log_filter = log_filter or LogFilter()
+        if self._map is None:
+            return [], None
+        lo = 0 if log_filter.since is None else self.find_time(log_filter.since)
+        hi = len(self) if log_filter.until is None else self.find_time(log_filter.until)
+        end = hi if end is None else min(end, hi)
+        matches = []
+
+        # 有运行ID或关键字时直接在映射上反向查找，跳过大段不相关的内容
+        needle = None
+        if log_filter.run_id:
+            needle = f"[{log_filter.run_id}] ".encode("ascii")
+        elif log_filter.text:
+            needle = log_filter.text.encode("utf-8")
+
+        if needle is None:
+            index = end - 1
+            stop = max(lo, end - max_scan)
+            while index >= stop and len(matches) < limit:
+                if self._levels[index] & _LEVEL_MASK >= log_filter.min_level:
+                    matches.append(index)
+                index -= 1
+            cursor = index + 1 if index >= lo else None
+        else:
+            floor = self._offsets[lo] if lo < len(self) else self._indexed
+            position = self._offsets[end] if end < len(self) else self._indexed
+            cursor = None
+            for _ in range(max_scan):
+                if len(matches) >= limit:
+                    break
+                found = self._map.rfind(needle, floor, position)
+                if found < 0:
+                    cursor = None
+                    break
+                index = bisect.bisect_right(self._offsets, found) - 1
+                # 运行ID只出现在记录首行，其续行一并显示
+                lines = [index]
+                if log_filter.run_id:
+                    following = index + 1
+                    while following < end and not self._levels[following] & _HEADER:
+                        lines.append(following)
+                        following += 1
+                for line in reversed(lines):
+                    if line < end and self._matches(line, log_filter):
+                        matches.append(line)
+                position = self._offsets[index]
+                cursor = index if index > lo else None
+        matches.reverse()
+        return matches, cursor
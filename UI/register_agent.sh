@@ -59,7 +59,8 @@ if [ -f "${PLIST_TEMPLATE}" ]; then
     if launchctl list | grep com.biubush.autonet4ahu &> /dev/null; then
         echo "启动项注册成功！"
         echo "系统已启用AutoNet4AHU自动登录服务。"
-        echo "服务将在系统启动和网络状态变化时自动运行。"
+        echo "常驻登录服务将随登录会话启动并保持运行，异常退出后自动重启；"
+        echo "常驻服务无法启动时改为在网络状态变化时和每15分钟执行一次登录。"
         exit 0
     else
         echo "错误: 启动项注册失败，请检查日志获取更多信息" >&2
@@ -3,17 +3,31 @@
 
 import sys
 import os
-import json
-import subprocess
 import shutil
+import time
+import threading
 from pathlib import Path
 import logging
 
-from PySide6.QtCore import Qt, QSize, QUrl, QTimer
-from PySide6.QtGui import QDesktopServices, QIcon
+# 源码运行时从相邻的loginCore目录导入共享模块，打包后由PyInstaller收集
+_CORE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, "loginCore")
+if os.path.isdir(_CORE_DIR):
+    sys.path.insert(0, os.path.abspath(_CORE_DIR))
+
+from config_store import ConfigStore, ConfigError
+from control import ControlClient, ControlError
+from paths import get_log_dir
+from log_index import LogIndex, LogFilter, LEVELS, PAGE_LINES
+
+from collections import deque
+from datetime import datetime
+
+from PySide6.QtCore import Qt, QSize, QUrl, QTimer, QObject, QProcess, QThread, Signal, QPointF
+from PySide6.QtGui import QDesktopServices, QIcon, QPainter, QPen, QColor, QPolygonF, QTextCursor
 from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                               QLineEdit, QSpacerItem, QSizePolicy, QMessageBox,
-                              QPushButton, QMainWindow, QSystemTrayIcon, QMenu)
+                              QPushButton, QMainWindow, QSystemTrayIcon, QMenu, QPlainTextEdit,
+                              QGroupBox, QListWidget, QComboBox)
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -28,15 +42,443 @@ class StyledPushButton(QPushButton):
         font.setPointSize(12)
         self.setFont(font)
 
+class CommandRunner(QObject):
+    """基于QProcess的异步命令执行器，逐行推送输出，不阻塞GUI线程"""
+    
+    output = Signal(str)
+    finished = Signal(int, str)
+    
+    # 取消时等待进程正常退出的时间(毫秒)，超时后强制结束
+    KILL_TIMEOUT_MS = 3000
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.process = None
+        self._buffer = b""
+        self._lines = []
+        self._cancelled = False
+    
+    def is_running(self):
+        """是否有命令正在执行"""
+        return self.process is not None and self.process.state() != QProcess.NotRunning
+    
+    def start(self, program, arguments=None):
+        """
+        启动命令
+        
+        Args:
+            program: 可执行文件路径
+            arguments: 参数列表
+        
+        Returns:
+            bool: 是否成功启动（已有命令在执行时返回False）
+        """
+        if self.is_running():
+            return False
+        
+        self._buffer = b""
+        self._lines = []
+        self._cancelled = False
+        
+        if self.process is not None:
+            self.process.deleteLater()
+        self.process = QProcess(self)
+        # 合并标准输出和错误输出，保证日志按时间顺序显示
+        self.process.setProcessChannelMode(QProcess.MergedChannels)
+        self.process.readyReadStandardOutput.connect(self._on_ready_read)
+        self.process.finished.connect(self._on_finished)
+        self.process.errorOccurred.connect(self._on_error)
+        self.process.start(program, arguments or [])
+        return True
+    
+    def cancel(self):
+        """取消正在执行的命令，先发送SIGTERM，超时后强制结束"""
+        if not self.is_running():
+            return
+        self._cancelled = True
+        self.process.terminate()
+        process = self.process
+        QTimer.singleShot(self.KILL_TIMEOUT_MS, lambda: self._kill(process))
+    
+    @staticmethod
+    def _kill(process):
+        if process.state() != QProcess.NotRunning:
+            process.kill()
+    
+    @property
+    def cancelled(self):
+        """最近一次命令是否被取消"""
+        return self._cancelled
+    
+    def _on_ready_read(self):
+        self._buffer += bytes(self.process.readAllStandardOutput())
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            self._emit_line(line)
+    
+    def _emit_line(self, raw):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+        self._lines.append(line)
+        self.output.emit(line)
+    
+    def _on_finished(self, exit_code, exit_status):
+        if self._buffer:
+            self._emit_line(self._buffer)
+            self._buffer = b""
+        if exit_status != QProcess.NormalExit and exit_code == 0:
+            exit_code = -1
+        self.finished.emit(exit_code, "\n".join(self._lines))
+    
+    def _on_error(self, error):
+        # 启动失败时不会触发finished信号
+        if error == QProcess.FailedToStart:
+            message = f"无法启动程序: {self.process.program()}"
+            self._lines.append(message)
+            self.output.emit(message)
+            self.finished.emit(-1, "\n".join(self._lines))
+
+
+class ServiceCallWorker(QThread):
+    """在后台线程中调用常驻服务的控制接口"""
+    
+    succeeded = Signal(object)
+    failed = Signal(str)
+    
+    def __init__(self, method, params=None, parent=None):
+        super().__init__(parent)
+        self.method = method
+        self.params = params or {}
+    
+    def run(self):
+        try:
+            self.succeeded.emit(ControlClient().call(self.method, **self.params))
+        except (OSError, ValueError, ControlError) as e:
+            self.failed.emit(str(e))
+
+
+class EventStreamWorker(QThread):
+    """订阅常驻服务的事件流，连接断开后按退避时间重连"""
+    
+    connected = Signal(object)
+    # 断开原因和距下次重连的秒数
+    disconnected = Signal(str, int)
+    event_received = Signal(object)
+    
+    RECONNECT_MIN = 2
+    RECONNECT_MAX = 60
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._running = True
+        self._client = None
+        self._wake = threading.Event()
+    
+    def stop(self):
+        """停止订阅并结束线程"""
+        self._running = False
+        self._wake.set()
+        if self._client is not None:
+            self._client.close()
+        self.wait(2000)
+    
+    def retry_now(self):
+        """立即重连，如注册启动项、常驻服务刚启动时"""
+        self._wake.set()
+    
+    def run(self):
+        delay = self.RECONNECT_MIN
+        while self._running:
+            self._client = ControlClient(timeout=5)
+            try:
+                # 连接后先获取一次完整状态，之后只接收增量事件
+                self.connected.emit(self._client.call("status"))
+                delay = self.RECONNECT_MIN
+                for event in self._client.subscribe():
+                    if not self._running:
+                        break
+                    self.event_received.emit(event)
+                reason = "常驻服务已断开"
+            except (FileNotFoundError, ConnectionRefusedError):
+                # 套接字不存在或无人监听
+                reason = "常驻服务未运行"
+            except (OSError, ValueError, ControlError) as e:
+                reason = f"连接常驻服务失败: {e}"
+            if not self._running:
+                break
+            self.disconnected.emit(reason, delay)
+            # 常驻服务未运行时不频繁重试，避免空转；被retry_now()唤醒时从最短间隔重新开始
+            if self._wake.wait(delay):
+                self._wake.clear()
+                delay = self.RECONNECT_MIN
+            else:
+                delay = min(delay * 2, self.RECONNECT_MAX)
+
+
+class LatencySparkline(QWidget):
+    """登录耗时的迷你折线图"""
+    
+    def __init__(self, capacity=30, parent=None):
+        super().__init__(parent)
+        self.samples = deque(maxlen=capacity)
+        self.setFixedHeight(36)
+        self.setMinimumWidth(120)
+    
+    def add_sample(self, duration, success=True):
+        """
+        追加一次登录耗时
+        
+        Args:
+            duration: 登录耗时(秒)
+            success: 登录是否成功，失败的点以红色标出
+        """
+        self.samples.append((float(duration or 0), success))
+        self.update()
+    
+    def set_samples(self, samples):
+        """
+        替换全部样本
+        
+        Args:
+            samples: (耗时, 是否成功) 列表
+        """
+        self.samples.clear()
+        self.samples.extend((float(duration or 0), success) for duration, success in samples)
+        self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = self.rect().adjusted(2, 4, -2, -4)
+        painter.setPen(QPen(QColor("#dee2e6"), 1))
+        painter.drawLine(rect.bottomLeft(), rect.bottomRight())
+        
+        if not self.samples:
+            return
+        peak = max(duration for duration, _ in self.samples) or 1.0
+        step = rect.width() / max(1, self.samples.maxlen - 1)
+        points = [
+            QPointF(rect.left() + i * step, rect.bottom() - rect.height() * duration / peak)
+            for i, (duration, _) in enumerate(self.samples)
+        ]
+        painter.setPen(QPen(QColor("#007aff"), 1.5))
+        painter.drawPolyline(QPolygonF(points))
+        
+        painter.setPen(Qt.NoPen)
+        for point, (_, success) in zip(points, self.samples):
+            if not success:
+                painter.setBrush(QColor("#dc3545"))
+                painter.drawEllipse(point, 2.5, 2.5)
+
+
+class LogPanel(QGroupBox):
+    """日志查看面板：按需索引日志文件，分页显示并按级别、运行ID、关键字和时间过滤"""
+    
+    LOG_FILES = (
+        ('运行日志', 'autonet4ahu.log'),
+        ('标准输出', 'autonet4ahu_output.log'),
+        ('错误输出', 'autonet4ahu_error.log'),
+    )
+    LEVEL_CHOICES = (
+        ('全部级别', 0),
+        ('INFO及以上', LEVELS[b"INFO"]),
+        ('WARNING及以上', LEVELS[b"WARNING"]),
+        ('ERROR及以上', LEVELS[b"ERROR"]),
+    )
+    TIME_CHOICES = (
+        ('全部时间', None),
+        ('最近1小时', 3600),
+        ('最近24小时', 86400),
+        ('最近7天', 7 * 86400),
+    )
+    
+    # 建立索引期间每次定时器触发索引的字节数和间隔(毫秒)，大文件分多次索引，界面不会卡顿
+    INDEX_BUDGET = 2 * 1024 * 1024
+    INDEX_INTERVAL_MS = 20
+    # 索引完成后检查文件增长的间隔(毫秒)
+    FOLLOW_INTERVAL_MS = 2000
+    # 过滤条件输入停止后延迟刷新的时间(毫秒)
+    FILTER_DELAY_MS = 300
+    
+    def __init__(self, log_dir=None, parent=None):
+        super().__init__('日志', parent)
+        self.log_dir = log_dir or get_log_dir()
+        self._indexes = {}
+        # 当前页之前继续查找的位置，为None时已到文件开头
+        self._cursor = None
+        # 显示的是否为最新一页，文件增长时自动刷新
+        self._following = True
+        # 当前页是否在索引完成前生成，索引完成后需要重新生成
+        self._partial = False
+        
+        self.file_combo = QComboBox(self)
+        for title, name in self.LOG_FILES:
+            self.file_combo.addItem(title, name)
+        self.level_combo = QComboBox(self)
+        for title, level in self.LEVEL_CHOICES:
+            self.level_combo.addItem(title, level)
+        self.time_combo = QComboBox(self)
+        for title, seconds in self.TIME_CHOICES:
+            self.time_combo.addItem(title, seconds)
+        self.run_id_edit = QLineEdit(self)
+        self.run_id_edit.setPlaceholderText('运行ID')
+        self.text_edit = QLineEdit(self)
+        self.text_edit.setPlaceholderText('关键字（区分大小写）')
+        
+        self.view = QPlainTextEdit(self)
+        self.view.setReadOnly(True)
+        self.view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.view.setMinimumHeight(220)
+        self.view.setPlaceholderText('没有符合条件的日志')
+        
+        self.summary_label = QLabel('', self)
+        self.older_button = QPushButton('更早', self)
+        self.latest_button = QPushButton('最新', self)
+        
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.file_combo)
+        filter_layout.addWidget(self.level_combo)
+        filter_layout.addWidget(self.time_combo)
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.run_id_edit)
+        search_layout.addWidget(self.text_edit)
+        page_layout = QHBoxLayout()
+        page_layout.addWidget(self.summary_label, 1)
+        page_layout.addWidget(self.older_button)
+        page_layout.addWidget(self.latest_button)
+        layout = QVBoxLayout(self)
+        layout.addLayout(filter_layout)
+        layout.addLayout(search_layout)
+        layout.addWidget(self.view)
+        layout.addLayout(page_layout)
+        
+        self.index_timer = QTimer(self)
+        self.index_timer.timeout.connect(self.index_step)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.show_latest)
+        
+        self.file_combo.currentIndexChanged.connect(self.on_file_changed)
+        self.level_combo.currentIndexChanged.connect(self.show_latest)
+        self.time_combo.currentIndexChanged.connect(self.show_latest)
+        self.run_id_edit.textChanged.connect(self.filter_timer.start)
+        self.text_edit.textChanged.connect(self.filter_timer.start)
+        self.older_button.clicked.connect(self.show_older)
+        self.latest_button.clicked.connect(self.show_latest)
+    
+    def current_index(self):
+        """当前选中日志文件的索引，首次选中时创建"""
+        name = self.file_combo.currentData()
+        if name not in self._indexes:
+            self._indexes[name] = LogIndex(os.path.join(self.log_dir, name))
+        return self._indexes[name]
+    
+    def current_filter(self):
+        """根据界面上的选项生成过滤条件"""
+        seconds = self.time_combo.currentData()
+        return LogFilter(
+            min_level=self.level_combo.currentData() or 0,
+            run_id=self.run_id_edit.text().strip().strip('[]').lower() or None,
+            text=self.text_edit.text() or None,
+            since=time.time() - seconds if seconds else None,
+        )
+    
+    def is_filtered(self, log_filter):
+        return bool(log_filter.min_level or log_filter.run_id or log_filter.text or log_filter.since)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.show_latest()
+        self.index_timer.start(self.INDEX_INTERVAL_MS)
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.index_timer.stop()
+        # 隐藏时释放文件映射和索引，下次打开时重新建立
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+    
+    def on_file_changed(self):
+        self.show_latest()
+        self.index_timer.start(self.INDEX_INTERVAL_MS)
+    
+    def index_step(self):
+        """定时索引文件中新增的部分，索引完成后降低检查频率"""
+        index = self.current_index()
+        count = len(index)
+        complete = index.refresh(self.INDEX_BUDGET)
+        self.index_timer.setInterval(self.FOLLOW_INTERVAL_MS if complete else self.INDEX_INTERVAL_MS)
+        # 索引完成或文件有新内容时刷新最新一页，浏览更早的页面时不打断
+        if complete and self._following and (self._partial or len(index) != count):
+            self.show_latest()
+        else:
+            self.update_summary()
+    
+    def show_latest(self):
+        """显示符合条件的最新一页"""
+        self._following = True
+        index = self.current_index()
+        log_filter = self.current_filter()
+        if not index.complete and not self.is_filtered(log_filter):
+            # 索引尚未完成时直接读取文件末尾，打开大文件也能立即显示
+            self.render(index.tail_lines(PAGE_LINES))
+            self._cursor = None
+        else:
+            matches, self._cursor = index.search(log_filter)
+            self.render([index.line(line) for line in matches])
+        self._partial = not index.complete
+        self.update_summary()
+    
+    def show_older(self):
+        """显示当前页之前的一页"""
+        if self._cursor is None:
+            return
+        self._following = False
+        index = self.current_index()
+        matches, self._cursor = index.search(self.current_filter(), end=self._cursor)
+        self.render([index.line(line) for line in matches], scroll_to_end=False)
+        self.update_summary()
+    
+    def render(self, lines, scroll_to_end=True):
+        self.view.setPlainText("\n".join(lines))
+        if scroll_to_end:
+            scrollbar = self.view.verticalScrollBar()
+            scrollbar.setValue(scrollbar.maximum())
+        else:
+            self.view.moveCursor(QTextCursor.Start)
+    
+    def update_summary(self):
+        index = self.current_index()
+        size = index.size / (1024 * 1024)
+        state = '' if index.complete else '，正在建立索引'
+        self.summary_label.setText(f"{size:.1f} MB，已索引 {len(index)} 行{state}")
+        self.older_button.setEnabled(self._cursor is not None)
+
+
 class LoginWidget(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle('AHU校园网自动登录程序 (macOS)')
-        self.resize(400, 320)
+        self.resize(400, 480)
+        # 与登录核心共享的配置存储，旧版应用目录下的配置仅作为读取兜底
+        self.config_store = ConfigStore(
+            fallback_paths=[os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")]
+        )
+        # 登录、注册、卸载共用一个执行器，同一时间只执行一个操作；状态检查单独执行
+        self.command_runner = CommandRunner(self)
+        self.command_runner.output.connect(self.append_output)
+        self.status_runner = CommandRunner(self)
+        self.status_runner.finished.connect(self.on_agent_status_checked)
+        self._command_done = None
+        self._service_worker = None
+        # 启动项是否已注册，未检查时为None
+        self.agent_registered = None
         self.setup_ui()
         self.load_config()
         self.bind_events()
         self.setup_tray()
+        self.start_event_stream()
 
     def setup_ui(self):
         """设置UI界面"""
@@ -87,6 +529,41 @@ class LoginWidget(QMainWindow):
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_layout.addWidget(self.status_label)
         
+        # 命令输出区域，实时显示登录和启动项操作的进度
+        self.output_view = QPlainTextEdit(self)
+        self.output_view.setReadOnly(True)
+        self.output_view.setMaximumBlockCount(500)
+        self.output_view.setFixedHeight(110)
+        self.output_view.setPlaceholderText('操作进度将显示在这里')
+        self.output_view.hide()
+        self.status_layout.addWidget(self.output_view)
+        
+        # 常驻服务运行状态面板，由事件流增量更新
+        self.dashboard_group = QGroupBox('运行状态')
+        self.dashboard_layout = QVBoxLayout(self.dashboard_group)
+        self.service_label = QLabel('常驻服务: 正在连接...')
+        self.service_label.setStyleSheet("color: #6c757d;")
+        self.service_label.setWordWrap(True)
+        self.network_label = QLabel('网络状态: 未知')
+        self.last_login_label = QLabel('上次登录: 无记录')
+        self.latency_label = QLabel('登录耗时')
+        self.latency_sparkline = LatencySparkline(parent=self)
+        self.errors_list = QListWidget(self)
+        self.errors_list.setFixedHeight(60)
+        self.errors_list.hide()
+        self.dashboard_layout.addWidget(self.service_label)
+        self.dashboard_layout.addWidget(self.network_label)
+        self.dashboard_layout.addWidget(self.last_login_label)
+        self.dashboard_layout.addWidget(self.latency_label)
+        self.dashboard_layout.addWidget(self.latency_sparkline)
+        self.dashboard_layout.addWidget(self.errors_list)
+        self.log_button = QPushButton('查看日志', self)
+        self.dashboard_layout.addWidget(self.log_button, 0, Qt.AlignRight)
+        
+        # 日志面板，默认隐藏，显示时才映射和索引日志文件
+        self.log_panel = LogPanel(parent=self)
+        self.log_panel.hide()
+        
         # 按钮布局
         self.button_layout = QHBoxLayout()
         self.button_layout.setSpacing(10)
@@ -145,9 +622,29 @@ class LoginWidget(QMainWindow):
             }
         """)
         
+        # 取消按钮，仅在命令执行期间显示
+        self.cancel_button = StyledPushButton('取消', self)
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #dc3545;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 16px;
+            }
+            QPushButton:hover {
+                background-color: #c82333;
+            }
+            QPushButton:pressed {
+                background-color: #bd2130;
+            }
+        """)
+        self.cancel_button.hide()
+        
         self.button_layout.addWidget(self.register_button)
         self.button_layout.addWidget(self.uninstall_button)
         self.button_layout.addWidget(self.login_now_button)
+        self.button_layout.addWidget(self.cancel_button)
         
         # 底部信息
         self.footer_layout = QHBoxLayout()
@@ -162,6 +659,8 @@ class LoginWidget(QMainWindow):
         self.main_layout.addLayout(self.webhook_layout)
         self.main_layout.addSpacing(10)
         self.main_layout.addLayout(self.status_layout)
+        self.main_layout.addWidget(self.dashboard_group)
+        self.main_layout.addWidget(self.log_panel)
         self.main_layout.addSpacing(5)
         self.main_layout.addLayout(self.button_layout)
         self.main_layout.addStretch(1)
@@ -199,7 +698,9 @@ class LoginWidget(QMainWindow):
         self.register_button.clicked.connect(self.register_agent)
         self.uninstall_button.clicked.connect(self.uninstall_agent)
         self.login_now_button.clicked.connect(self.login_now)
+        self.cancel_button.clicked.connect(self.cancel_command)
         self.info_button.clicked.connect(self.open_webhook_help)
+        self.log_button.clicked.connect(self.toggle_log_panel)
 
     def setup_tray(self):
         """设置系统托盘图标"""
@@ -216,6 +717,10 @@ class LoginWidget(QMainWindow):
         tray_menu = QMenu()
         
         # 添加菜单项
+        self.tray_status_action = tray_menu.addAction("网络状态: 未知")
+        self.tray_status_action.setEnabled(False)
+        tray_menu.addSeparator()
+        
         show_action = tray_menu.addAction("显示主窗口")
         show_action.triggered.connect(self.show)
         
@@ -236,6 +741,103 @@ class LoginWidget(QMainWindow):
         # 显示托盘图标
         self.tray_icon.show()
     
+    def start_event_stream(self):
+        """订阅常驻服务的事件流，用于实时更新运行状态"""
+        self.event_worker = EventStreamWorker(self)
+        self.event_worker.connected.connect(self.on_service_connected)
+        self.event_worker.disconnected.connect(self.on_service_disconnected)
+        self.event_worker.event_received.connect(self.on_service_event)
+        self.event_worker.start()
+        QApplication.instance().aboutToQuit.connect(self.event_worker.stop)
+    
+    def on_service_connected(self, status):
+        """连接常驻服务后用完整状态初始化面板"""
+        self.service_label.setText("常驻服务: 运行中 ✅")
+        self.service_label.setStyleSheet("color: #28a745;")
+        self.set_network_state(status.get("online"))
+        recent = status.get("recent_logins") or []
+        self.latency_sparkline.set_samples((item["duration"], item["success"]) for item in recent)
+        self.errors_list.clear()
+        for item in recent:
+            if not item["success"]:
+                self.add_error(item["finished_at"], item["message"])
+        if status.get("last_login"):
+            self.show_last_login(status["last_login"])
+    
+    def on_service_disconnected(self, reason, retry_in):
+        """
+        常驻服务未运行或连接断开，显示原因和下次重连时间
+        
+        Args:
+            reason: 断开原因
+            retry_in: 距下次重连的秒数
+        """
+        hint = "，注册启动项后自动启动" if self.agent_registered is False else ""
+        self.service_label.setText(f"常驻服务: {reason}{hint}（{retry_in} 秒后重试）")
+        self.service_label.setStyleSheet("color: #dc3545;")
+        self.set_network_state(None)
+    
+    def on_service_event(self, event):
+        """处理常驻服务推送的事件"""
+        event_type = event.get("type")
+        if event_type == "state":
+            self.set_network_state(event.get("online"))
+        elif event_type == "deauth_detected":
+            self.add_error(event.get("at"), "认证会话已掉线")
+        elif event_type == "login":
+            self.show_last_login(event)
+            self.latency_sparkline.add_sample(event.get("duration"), event.get("success"))
+            if event.get("success"):
+                self.set_network_state(True)
+            else:
+                self.add_error(event.get("finished_at"), event.get("message"))
+    
+    def set_network_state(self, online):
+        """
+        更新网络状态显示
+        
+        Args:
+            online: 是否在线，None表示未知
+        """
+        if online is None:
+            text, color = "未知", "#6c757d"
+        elif online:
+            text, color = "已认证 ✅", "#28a745"
+        else:
+            text, color = "未认证 ❌", "#dc3545"
+        self.network_label.setText(f"网络状态: {text}")
+        self.network_label.setStyleSheet(f"color: {color};")
+        self.tray_status_action.setText(f"网络状态: {text}")
+        self.tray_icon.setToolTip(f"AutoNet4AHU - {text}")
+    
+    def show_last_login(self, result):
+        """显示最近一次登录结果"""
+        finished = datetime.fromtimestamp(result.get("finished_at") or 0).strftime('%m-%d %H:%M:%S')
+        status = "成功" if result.get("success") else "失败"
+        account = result.get("account") or "-"
+        self.last_login_label.setText(
+            f"上次登录: {finished} {status}，耗时 {result.get('duration', 0):.2f}s，账号 {account}"
+        )
+    
+    def add_error(self, at, message):
+        """在最近错误列表顶部插入一条记录，最多保留5条"""
+        when = datetime.fromtimestamp(at or 0).strftime('%m-%d %H:%M')
+        self.errors_list.insertItem(0, f"{when} {message}")
+        while self.errors_list.count() > 5:
+            self.errors_list.takeItem(self.errors_list.count() - 1)
+        self.errors_list.show()
+    
+    def toggle_log_panel(self):
+        """显示或隐藏日志面板，并相应调整窗口大小"""
+        if self.log_panel.isVisible():
+            self.log_panel.hide()
+            self.log_button.setText('查看日志')
+            self.resize(400, 480)
+        else:
+            self.log_panel.show()
+            self.log_button.setText('隐藏日志')
+            self.resize(max(self.width(), 760), max(self.height(), 860))
+    
     def tray_icon_activated(self, reason):
         """处理托盘图标的激活事件"""
         if reason == QSystemTrayIcon.Trigger:
@@ -261,73 +863,122 @@ class LoginWidget(QMainWindow):
         QDesktopServices.openUrl(QUrl("https://developer.work.weixin.qq.com/document/path/91770"))
     
     def check_agent_status(self):
-        """检查启动项状态"""
-        try:
-            result = subprocess.run(
-                ["launchctl", "list"], 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            if "com.biubush.autonet4ahu" in result.stdout:
-                self.status_label.setText("当前状态: 已注册启动项 ✅")
-                self.status_label.setStyleSheet("color: #28a745;")
-            else:
-                self.status_label.setText("当前状态: 未注册启动项 ❌")
-                self.status_label.setStyleSheet("color: #dc3545;")
-                
-        except Exception as e:
-            logger.error(f"检查启动项状态失败: {e}")
+        """异步检查启动项状态"""
+        # 只查询本服务的标签，避免每次读取完整的launchctl列表
+        self.status_runner.start("launchctl", ["list", "com.biubush.autonet4ahu"])
+    
+    def on_agent_status_checked(self, exit_code, output):
+        """启动项状态检查完成"""
+        if exit_code == 0:
+            self.agent_registered = True
+            self.status_label.setText("当前状态: 已注册启动项 ✅")
+            self.status_label.setStyleSheet("color: #28a745;")
+        elif exit_code > 0:
+            self.agent_registered = False
+            self.status_label.setText("当前状态: 未注册启动项 ❌")
+            self.status_label.setStyleSheet("color: #dc3545;")
+        else:
+            logger.error(f"检查启动项状态失败: {output}")
             self.status_label.setText("当前状态: 检查失败 ⚠️")
             self.status_label.setStyleSheet("color: #ffc107;")
     
+    def append_output(self, line):
+        """追加一行命令输出"""
+        logger.info(line)
+        self.output_view.appendPlainText(line)
+    
+    def run_command(self, program, title, on_done):
+        """
+        异步执行命令，执行期间禁用操作按钮并显示取消按钮
+        
+        Args:
+            program: 可执行文件路径
+            title: 显示在输出区域的操作名称
+            on_done: 完成回调，参数为(返回码, 输出文本)
+        
+        Returns:
+            bool: 是否成功启动
+        """
+        if self.is_busy():
+            QMessageBox.information(self, "提示", "已有操作正在执行，请稍候")
+            return False
+        
+        self.output_view.clear()
+        self.output_view.show()
+        self.output_view.appendPlainText(f"{title}...")
+        self._command_done = on_done
+        self.set_busy(True)
+        
+        self.command_runner.finished.connect(self._on_command_finished)
+        self.command_runner.start(program)
+        return True
+    
+    def _on_command_finished(self, exit_code, output):
+        self.command_runner.finished.disconnect(self._on_command_finished)
+        self.set_busy(False)
+        logger.info(f"命令执行结果: {exit_code}")
+        
+        on_done, self._command_done = self._command_done, None
+        if self.command_runner.cancelled:
+            self.output_view.appendPlainText("操作已取消")
+            return
+        if on_done is not None:
+            on_done(exit_code, output)
+    
+    def cancel_command(self):
+        """取消正在执行的操作"""
+        self.output_view.appendPlainText("正在取消...")
+        self.command_runner.cancel()
+    
+    def is_busy(self):
+        """是否有操作正在执行"""
+        return self.command_runner.is_running() or (
+            self._service_worker is not None and self._service_worker.isRunning()
+        )
+    
+    def set_busy(self, busy, cancellable=True):
+        """
+        切换操作按钮的忙碌状态
+        
+        Args:
+            busy: 是否有操作正在执行
+            cancellable: 操作能否取消，交给常驻服务执行的登录无法取消
+        """
+        self.register_button.setEnabled(not busy)
+        self.uninstall_button.setEnabled(not busy)
+        self.login_now_button.setEnabled(not busy)
+        logging_in = busy and self._command_done == self.on_login_finished
+        self.login_now_button.setText("登录中..." if logging_in else "立即登录")
+        self.cancel_button.setVisible(busy and cancellable)
+    
+    @staticmethod
+    def tail(output, lines=10):
+        """取输出的最后几行用于错误提示"""
+        return "\n".join(output.strip().splitlines()[-lines:])
+    
     def load_config(self):
         """加载配置文件"""
         try:
-            # 尝试从用户目录读取配置
-            user_config_path = os.path.expanduser("~/Library/Application Support/AutoNet4AHU/config.json")
+            config = self.config_store.load()
             
-            if os.path.exists(user_config_path):
-                with open(user_config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    
-                    self.student_id_line_edit.setText(config.get('student_id', ''))
-                    self.password_line_edit.setText(config.get('password', ''))
-                    
-                    # 如果webhook_urls非空，则使用第一个URL
-                    webhook_urls = config.get('webhook_urls', [])
-                    if webhook_urls and len(webhook_urls) > 0:
-                        self.webhook_line_edit.setText(webhook_urls[0])
-                        
-                logger.info("已从用户目录加载配置")
-                return
+            self.student_id_line_edit.setText(config.student_id)
+            self.password_line_edit.setText(config.password)
             
-            # 如果用户目录没有配置文件，尝试从应用目录读取
-            app_config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")
+            # 如果webhook_urls非空，则使用第一个URL
+            if config.webhook_urls:
+                self.webhook_line_edit.setText(config.webhook_urls[0])
             
-            if os.path.exists(app_config_path):
-                with open(app_config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    
-                    self.student_id_line_edit.setText(config.get('student_id', ''))
-                    self.password_line_edit.setText(config.get('password', ''))
-                    
-                    # 如果webhook_urls非空，则使用第一个URL
-                    webhook_urls = config.get('webhook_urls', [])
-                    if webhook_urls and len(webhook_urls) > 0:
-                        self.webhook_line_edit.setText(webhook_urls[0])
-                
-                logger.info("已从应用目录加载配置")
+            if config.path:
+                logger.info(f"已加载配置: {config.path}")
             else:
                 logger.info("未找到配置文件")
         
-        except Exception as e:
+        except ConfigError as e:
             logger.error(f"加载配置失败: {e}")
             QMessageBox.warning(self, "加载配置失败", f"无法加载配置文件: {str(e)}")
     
     def save_config(self):
-        """保存配置文件"""
+        """保存配置文件，仅在内容变化时原子写入用户目录"""
         student_id = self.student_id_line_edit.text().strip()
         password = self.password_line_edit.text().strip()
         webhook_url = self.webhook_line_edit.text().strip()
@@ -336,35 +987,27 @@ class LoginWidget(QMainWindow):
         if webhook_url:
             webhook_urls.append(webhook_url)
         
-        config = {
-            'student_id': student_id,
-            'password': password,
-            'webhook_urls': webhook_urls
-        }
-        
         try:
-            # 保存到用户目录
-            user_config_dir = os.path.expanduser("~/Library/Application Support/AutoNet4AHU")
-            user_config_path = os.path.join(user_config_dir, "config.json")
+            # 保留界面未展示的配置项（如备用账号）
+            current = self.config_store.load()
+            config = current.to_dict()
+            config.pop('version', None)
+            previous = dict(config)
+            config.update({
+                'student_id': student_id,
+                'password': password,
+                'webhook_urls': webhook_urls
+            })
             
-            # 确保目录存在
-            os.makedirs(user_config_dir, exist_ok=True)
-            
-            with open(user_config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
+            # 内容未变化且已保存在用户目录时无需重写
+            if config == previous and current.path == self.config_store.path:
+                return True
             
+            self.config_store.save(config)
             logger.info("配置已保存到用户目录")
-            
-            # 同时保存一份到应用目录
-            app_config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")
-            
-            with open(app_config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
-                
-            logger.info("配置已保存到应用目录")
             return True
             
-        except Exception as e:
+        except (OSError, ConfigError) as e:
             logger.error(f"保存配置失败: {e}")
             QMessageBox.critical(self, "保存配置失败", f"无法保存配置文件: {str(e)}")
             return False
@@ -410,28 +1053,23 @@ class LoginWidget(QMainWindow):
                 # 确保脚本有执行权限
                 os.chmod(script_path, 0o755)
                 
-                # 执行注册脚本
-                result = subprocess.run(
-                    [script_path], 
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                logger.info(f"注册结果: {result.returncode}")
-                logger.info(f"标准输出: {result.stdout}")
-                logger.info(f"错误输出: {result.stderr}")
-                
-                if result.returncode == 0:
-                    QMessageBox.information(self, "注册成功", "自动登录服务已成功注册！系统将在启动和网络状态变化时自动登录校园网。")
-                    self.check_agent_status()
-                else:
-                    QMessageBox.critical(self, "注册失败", f"自动登录服务注册失败，错误信息:\n{result.stderr}")
+                # 异步执行注册脚本
+                self.run_command(script_path, "正在注册启动项", self.on_register_finished)
         
         except Exception as e:
             logger.exception(f"注册启动项失败: {e}")
             QMessageBox.critical(self, "注册失败", f"发生异常: {str(e)}")
     
+    def on_register_finished(self, exit_code, output):
+        """注册脚本执行完成"""
+        if exit_code == 0:
+            QMessageBox.information(self, "注册成功", "自动登录服务已成功注册！常驻服务将保持运行，掉线后自动重新登录校园网。")
+            self.check_agent_status()
+            # 启动项已拉起常驻服务，立即连接而不等待退避时间
+            self.event_worker.retry_now()
+        else:
+            QMessageBox.critical(self, "注册失败", f"自动登录服务注册失败，错误信息:\n{self.tail(output)}")
+    
     def uninstall_agent(self):
         """卸载启动项"""
         try:
@@ -450,28 +1088,21 @@ class LoginWidget(QMainWindow):
                 # 确保脚本有执行权限
                 os.chmod(script_path, 0o755)
                 
-                # 执行卸载脚本
-                result = subprocess.run(
-                    [script_path], 
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                logger.info(f"卸载结果: {result.returncode}")
-                logger.info(f"标准输出: {result.stdout}")
-                logger.info(f"错误输出: {result.stderr}")
-                
-                if result.returncode == 0:
-                    QMessageBox.information(self, "卸载成功", "自动登录服务已成功卸载！系统将不再自动登录校园网。")
-                    self.check_agent_status()
-                else:
-                    QMessageBox.critical(self, "卸载失败", f"自动登录服务卸载失败，错误信息:\n{result.stderr}")
+                # 异步执行卸载脚本
+                self.run_command(script_path, "正在卸载启动项", self.on_uninstall_finished)
         
         except Exception as e:
             logger.exception(f"卸载启动项失败: {e}")
             QMessageBox.critical(self, "卸载失败", f"发生异常: {str(e)}")
     
+    def on_uninstall_finished(self, exit_code, output):
+        """卸载脚本执行完成"""
+        if exit_code == 0:
+            QMessageBox.information(self, "卸载成功", "自动登录服务已成功卸载！系统将不再自动登录校园网。")
+            self.check_agent_status()
+        else:
+            QMessageBox.critical(self, "卸载失败", f"自动登录服务卸载失败，错误信息:\n{self.tail(output)}")
+    
     def login_now(self):
         """立即执行登录"""
         # 检查输入
@@ -482,6 +1113,19 @@ class LoginWidget(QMainWindow):
         if not self.save_config():
             return
             
+        if self.is_busy():
+            QMessageBox.information(self, "提示", "已有操作正在执行，请稍候")
+            return
+        
+        # 常驻服务在运行时直接通过控制接口登录，无需启动新进程
+        if ControlClient().is_available():
+            self.login_via_service()
+            return
+        
+        self.login_via_process()
+    
+    def login_via_process(self):
+        """启动登录程序执行登录"""
         try:
             # 获取登录程序路径
             login_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "login")
@@ -494,39 +1138,55 @@ class LoginWidget(QMainWindow):
             # 确保登录程序有执行权限
             os.chmod(login_path, 0o755)
             
-            # 显示正在登录提示
-            self.login_now_button.setEnabled(False)
-            self.login_now_button.setText("登录中...")
-            QApplication.processEvents()
-            
-            # 执行登录程序
-            result = subprocess.run(
-                [login_path], 
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            logger.info(f"登录结果: {result.returncode}")
-            logger.info(f"标准输出: {result.stdout}")
-            logger.info(f"错误输出: {result.stderr}")
-            
-            # 恢复按钮状态
-            self.login_now_button.setEnabled(True)
-            self.login_now_button.setText("立即登录")
-            
-            if result.returncode == 0:
-                QMessageBox.information(self, "登录成功", "校园网登录成功！")
-            else:
-                QMessageBox.warning(self, "登录失败", f"校园网登录失败，错误信息:\n{result.stderr}")
+            # 异步执行登录程序，输出实时显示在状态区域
+            self.run_command(login_path, "正在登录校园网", self.on_login_finished)
         
         except Exception as e:
             logger.exception(f"执行登录失败: {e}")
             QMessageBox.critical(self, "登录失败", f"发生异常: {str(e)}")
-            
-            # 恢复按钮状态
-            self.login_now_button.setEnabled(True)
-            self.login_now_button.setText("立即登录")
+    
+    def login_via_service(self):
+        """通过常驻服务的控制接口执行登录"""
+        self.output_view.clear()
+        self.output_view.show()
+        self.output_view.appendPlainText("正在通过常驻服务登录校园网...")
+        self._command_done = self.on_login_finished
+        self.set_busy(True, cancellable=False)
+        
+        worker = ServiceCallWorker("login", parent=self)
+        worker.succeeded.connect(self.on_service_login_finished)
+        worker.failed.connect(self.on_service_login_failed)
+        worker.finished.connect(worker.deleteLater)
+        self._service_worker = worker
+        worker.start()
+    
+    def on_service_login_finished(self, result):
+        """常驻服务登录完成"""
+        self._service_worker = None
+        self._command_done = None
+        self.set_busy(False)
+        
+        for phase in result.get("phases") or []:
+            self.output_view.appendPlainText(f"{phase['name']}: {phase['duration']:.3f}s")
+        account = result.get("account") or "未知"
+        self.output_view.appendPlainText(f"账号 {account}，耗时 {result.get('duration', 0):.2f}s: {result.get('message')}")
+        self.on_login_finished(0 if result.get("success") else 1, result.get("message") or "")
+    
+    def on_service_login_failed(self, error):
+        """常驻服务不可用时改为启动登录程序"""
+        self._service_worker = None
+        self._command_done = None
+        self.set_busy(False)
+        logger.warning(f"通过常驻服务登录失败: {error}")
+        self.output_view.appendPlainText(f"常驻服务不可用({error})，改为直接登录")
+        self.login_via_process()
+    
+    def on_login_finished(self, exit_code, output):
+        """登录程序执行完成"""
+        if exit_code == 0:
+            QMessageBox.information(self, "登录成功", "校园网登录成功！")
+        else:
+            QMessageBox.warning(self, "登录失败", f"校园网登录失败，错误信息:\n{self.tail(output)}")
 
 
 if __name__ == '__main__':
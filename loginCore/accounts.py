@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+
+from clock import get_clock
+from paths import get_state_dir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 非POSIX平台
+    fcntl = None
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.accounts')
+
+# 各类账号级错误的默认冷却时间(秒)
+DEFAULT_COOLDOWNS = {
+    "auth_failed": 24 * 3600,
+    "account_disabled": 24 * 3600,
+    "quota_exhausted": 6 * 3600,
+    "device_limit": 3600,
+}
+DEFAULT_COOLDOWN = 3600
+
+
+class Account:
+    """账号池中的单个账号"""
+
+    def __init__(self, student_id, password, name=None):
+        """
+        初始化账号
+
+        Args:
+            student_id: 学号
+            password: 密码
+            name: 账号别名，默认为学号
+        """
+        self.student_id = student_id
+        self.password = password
+        self.name = name or student_id
+
+    @property
+    def fingerprint(self):
+        """账号凭据指纹，凭据修改后旧的耗尽记录自动失效"""
+        raw = f"{self.student_id}\0{self.password}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()[:16]
+
+    def __repr__(self):
+        return f"Account({self.name})"
+
+
+class AccountPool:
+    """有序账号池，支持账号级错误的故障转移并持久化已耗尽的账号"""
+
+    def __init__(self, accounts, state_file=None, cooldowns=None):
+        """
+        初始化账号池
+
+        Args:
+            accounts: Account列表，顺序即优先级
+            state_file: 耗尽状态文件路径，默认保存在状态目录
+            cooldowns: 各错误码的冷却时间(秒)，覆盖默认值
+        """
+        self.accounts = list(accounts)
+        self.state_file = state_file or os.path.join(get_state_dir(), "accounts.json")
+        self.cooldowns = dict(DEFAULT_COOLDOWNS)
+        if cooldowns:
+            self.cooldowns.update(cooldowns)
+        self._exhausted = self._load_state()
+
+    @classmethod
+    def from_config(cls, config, state_file=None):
+        """
+        从配置创建账号池，兼容旧版的单账号字段
+
+        Args:
+            config: 配置字典
+            state_file: 耗尽状态文件路径
+
+        Returns:
+            AccountPool: 账号池实例
+        """
+        accounts = []
+        seen = set()
+
+        legacy_id = config.student_id
+        if legacy_id and config.password:
+            accounts.append(Account(legacy_id, config.password))
+            seen.add(legacy_id)
+
+        for item in config.accounts:
+            if not isinstance(item, dict):
+                logger.warning(f"忽略格式错误的账号配置: {item!r}")
+                continue
+            student_id = item.get("student_id")
+            password = item.get("password")
+            if not student_id or not password or student_id in seen:
+                continue
+            accounts.append(Account(student_id, password, item.get("name")))
+            seen.add(student_id)
+
+        return cls(accounts, state_file=state_file, cooldowns=config.account_cooldowns)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def find(self, reference):
+        """
+        按学号或别名查找账号
+
+        Args:
+            reference: 学号或别名
+
+        Returns:
+            Account: 找到的账号，未找到返回None
+        """
+        for account in self.accounts:
+            if reference in (account.student_id, account.name):
+                return account
+        return None
+
+    def available(self):
+        """
+        按优先级返回当前未耗尽的账号
+
+        Returns:
+            list: Account列表
+        """
+        return [account for account in self.accounts if not self.is_exhausted(account)]
+
+    def is_exhausted(self, account):
+        """
+        检查账号是否处于耗尽冷却期
+
+        Args:
+            account: Account实例
+
+        Returns:
+            bool: 是否已耗尽
+        """
+        entry = self._exhausted.get(account.student_id)
+        if not entry:
+            return False
+        if entry.get("fingerprint") != account.fingerprint:
+            return False
+        return entry.get("until", 0) > get_clock().time()
+
+    def mark_exhausted(self, account, error_code, message=""):
+        """
+        将账号标记为耗尽，冷却期内后续运行直接跳过
+
+        Args:
+            account: Account实例
+            error_code: 账号级错误码
+            message: 门户返回的错误信息
+        """
+        cooldown = self.cooldowns.get(error_code, DEFAULT_COOLDOWN)
+        entry = {
+            "fingerprint": account.fingerprint,
+            "error_code": error_code,
+            "message": message,
+            "until": get_clock().time() + cooldown,
+        }
+        logger.warning(f"账号 {account.name} 已标记为不可用({error_code})，{int(cooldown)} 秒内跳过")
+        with self._locked_state() as state:
+            state[account.student_id] = entry
+
+    def mark_ok(self, account):
+        """
+        登录成功后清除账号的耗尽记录
+
+        Args:
+            account: Account实例
+        """
+        # 常见路径无需加锁和写回
+        if account.student_id not in self._load_state():
+            self._exhausted.pop(account.student_id, None)
+            return
+        with self._locked_state() as state:
+            state.pop(account.student_id, None)
+
+    def _load_state(self):
+        """
+        加载耗尽状态并丢弃已过期的记录
+
+        Returns:
+            dict: 学号到耗尽记录的映射
+        """
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取账号状态失败: {e}")
+            return {}
+        if not isinstance(state, dict):
+            return {}
+
+        now = get_clock().time()
+        return {
+            student_id: entry for student_id, entry in state.items()
+            if isinstance(entry, dict) and entry.get("until", 0) > now
+        }
+
+    def _save_state(self, state):
+        """原子写入耗尽状态，临时文件名唯一，并发写入互不覆盖"""
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".accounts.", suffix=".tmp",
+                                            dir=os.path.dirname(os.path.abspath(self.state_file)))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"保存账号状态失败: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        在进程间文件锁内读取、修改并写回耗尽状态
+
+        一次性登录、常驻服务和网关可能同时修改状态，每次修改都基于文件中的最新内容，
+        其他进程写入的耗尽记录不会丢失。
+        """
+        fd = None
+        if fcntl is not None:
+            fd = os.open(f"{self.state_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            state = self._load_state()
+            yield state
+            self._save_state(state)
+            self._exhausted = state
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP引擎基准测试
+
+在本机启动一个模拟门户登录接口的HTTP/1.1服务，分别在独立子进程中测试各引擎的
+导入耗时、请求延迟(p50/p95)、每次请求的内存分配和进程内存峰值。
+
+用法: python bench_transport.py [-n 请求次数] [--engine requests|builtin]
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from transport import ENGINES
+
+DEFAULT_REQUESTS = 500
+
+# 子进程中运行的测试代码，结果以一行JSON输出
+_WORKER = r"""
+import sys, time, json, resource, tracemalloc
+sys.path.insert(0, sys.argv[1])
+engine, url, count = sys.argv[2], sys.argv[3], int(sys.argv[4])
+
+started = time.perf_counter()
+from transport import create_transport
+transport = create_transport(engine)
+import_ms = (time.perf_counter() - started) * 1000
+
+params = {"callback": "dr1003", "login_method": "1", "user_account": ",0,S25000000",
+          "user_password": "x", "wlan_user_ip": "172.16.1.2", "jsVersion": "4.1.3", "v": "1234"}
+headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)", "Accept": "*/*"}
+for _ in range(10):
+    transport.get(url, params=params, headers=headers, timeout=5)
+
+latencies = []
+for _ in range(count):
+    begin = time.perf_counter()
+    response = transport.get(url, params=params, headers=headers, timeout=5)
+    response.text
+    latencies.append((time.perf_counter() - begin) * 1000)
+
+tracemalloc.start()
+snapshot_before = tracemalloc.take_snapshot()
+for _ in range(100):
+    transport.get(url, params=params, headers=headers, timeout=5).text
+snapshot_after = tracemalloc.take_snapshot()
+stats = snapshot_after.compare_to(snapshot_before, "filename")
+allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+tracemalloc.stop()
+transport.close()
+
+latencies.sort()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024
+print(json.dumps({
+    "import_ms": round(import_ms, 2),
+    "p50_ms": round(latencies[len(latencies) // 2], 3),
+    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    "alloc_bytes_per_request": allocated // 100,
+    "max_rss_kb": rss,
+}))
+"""
+
+
+class _PortalHandler(BaseHTTPRequestHandler):
+    """返回与ePortal登录成功相同格式的JSONP响应"""
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体合并为一次发送，避免Nagle算法与延迟确认叠加造成的40ms等待
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    body = ('dr1003(' + json.dumps({"result": "1", "msg": "Portal协议认证成功！"}) + ');').encode("utf-8")
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/javascript; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_engine(engine, url, count):
+    """
+    在子进程中测试一个引擎
+
+    Returns:
+        dict: 测试结果，引擎不可用时包含error字段
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _WORKER, os.path.dirname(os.path.abspath(__file__)), engine, url, str(count)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"退出码 {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP引擎基准测试")
+    parser.add_argument("-n", type=int, default=DEFAULT_REQUESTS, help="每个引擎的请求次数")
+    parser.add_argument("--engine", choices=ENGINES, action="append", help="只测试指定引擎，可重复")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PortalHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/eportal/portal/login"
+
+    results = {}
+    try:
+        for engine in args.engine or ENGINES:
+            results[engine] = run_engine(engine, url, max(1, args.n))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'引擎':<10}{'导入(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'分配/请求(B)':>14}{'RSS峰值(KB)':>14}")
+    for engine, result in results.items():
+        if "error" in result:
+            print(f"{engine:<10}跳过: {result['error']}")
+            continue
+        print(f"{engine:<10}{result['import_ms']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['alloc_bytes_per_request']:>14}{result['max_rss_kb']:>14}")
+
+
+if __name__ == "__main__":
+    main()
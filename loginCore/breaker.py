@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import random
+import logging
+from contextlib import contextmanager
+
+from clock import get_clock
+from paths import get_state_dir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 非POSIX平台
+    fcntl = None
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.breaker')
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 连续失败多少次后熔断
+DEFAULT_FAILURE_THRESHOLD = 5
+# 熔断后首次试探前的等待时间(秒)，试探失败后翻倍，直到上限
+DEFAULT_RESET_TIMEOUT = 60
+DEFAULT_MAX_RESET_TIMEOUT = 900
+# 等待时间的随机延长比例，避免大量机器在同一时刻试探
+DEFAULT_JITTER = 0.5
+# 试探请求的租期(秒)，持有者异常退出后其他进程可重新试探
+TRIAL_LEASE = 30
+
+
+class CircuitBreaker:
+    """
+    门户登录请求的熔断器，状态持久化到状态目录，各个一次性登录进程共享
+
+    连续失败达到阈值后进入open状态，期间所有登录直接失败；等待时间到达后进入
+    half_open状态，只允许一个进程发出试探请求，成功则恢复，失败则延长等待时间重新熔断。
+    """
+
+    def __init__(self, state_file=None, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT, max_reset_timeout=DEFAULT_MAX_RESET_TIMEOUT,
+                 jitter=DEFAULT_JITTER):
+        """
+        初始化熔断器
+
+        Args:
+            state_file: 状态文件路径，默认保存在状态目录
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断后首次试探前的等待时间(秒)
+            max_reset_timeout: 等待时间上限(秒)
+            jitter: 等待时间的随机延长比例
+        """
+        self.state_file = state_file or os.path.join(get_state_dir(), "breaker.json")
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.jitter = jitter
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        根据配置创建熔断器
+
+        Args:
+            config: 配置字典或ConfigSnapshot
+
+        Returns:
+            CircuitBreaker: 熔断器
+        """
+        return cls(
+            failure_threshold=config.breaker_threshold,
+            reset_timeout=config.breaker_reset_timeout,
+            max_reset_timeout=config.breaker_max_reset_timeout,
+        )
+
+    def allow(self, now=None):
+        """
+        判断是否允许发出登录请求；等待时间到达后只有一个调用方获得试探机会
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            bool: 是否允许请求
+        """
+        now = get_clock().time() if now is None else now
+        # 常见路径无需加锁和写回
+        if self._read()["state"] == STATE_CLOSED:
+            return True
+        with self._locked_state() as state:
+            if state["state"] == STATE_CLOSED:
+                return True
+            if now < state["open_until"] or now < state.get("trial_until", 0):
+                return False
+            state["state"] = STATE_HALF_OPEN
+            state["trial_until"] = now + TRIAL_LEASE
+            logger.info("门户熔断等待结束，发出试探请求")
+            return True
+
+    def record_success(self):
+        """记录一次门户正常响应，关闭熔断"""
+        stored = self._read()
+        if stored["state"] == STATE_CLOSED and stored["failures"] == 0:
+            return
+        with self._locked_state() as state:
+            if state["state"] != STATE_CLOSED:
+                logger.info("门户已恢复，关闭熔断")
+            state.update(state=STATE_CLOSED, failures=0, open_until=0, trial_until=0, timeout=0)
+
+    def record_failure(self, now=None):
+        """
+        记录一次门户故障（超时、连接错误或服务器错误）
+
+        Args:
+            now: 当前时间
+        """
+        now = get_clock().time() if now is None else now
+        with self._locked_state() as state:
+            state["failures"] += 1
+            if state["state"] == STATE_HALF_OPEN:
+                timeout = min(self.max_reset_timeout, max(self.reset_timeout, state.get("timeout", 0) * 2))
+            elif state["state"] == STATE_CLOSED and state["failures"] >= self.failure_threshold:
+                timeout = self.reset_timeout
+            else:
+                return
+            wait = timeout * (1 + random.uniform(0, self.jitter))
+            state.update(state=STATE_OPEN, open_until=now + wait, trial_until=0, timeout=timeout)
+            logger.warning(f"门户连续 {state['failures']} 次请求失败，熔断 {wait:.0f} 秒")
+
+    def retry_after(self, now=None):
+        """
+        距离下一次允许试探的秒数
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            float: 秒数，未熔断时为0
+        """
+        now = get_clock().time() if now is None else now
+        state = self._read()
+        if state["state"] == STATE_CLOSED:
+            return 0.0
+        return max(0.0, state["open_until"] - now, state.get("trial_until", 0) - now)
+
+    def snapshot(self):
+        """
+        导出熔断器状态
+
+        Returns:
+            dict: 当前状态、连续失败次数和剩余等待时间
+        """
+        state = self._read()
+        return {
+            "state": state["state"],
+            "failures": state["failures"],
+            "retry_after": round(self.retry_after(), 1),
+        }
+
+    def _read(self):
+        state = {"state": STATE_CLOSED, "failures": 0, "open_until": 0}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if isinstance(stored, dict):
+                state.update(stored)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取熔断器状态失败: {e}")
+        return state
+
+    def _write(self, state):
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=4)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"保存熔断器状态失败: {e}")
+
+    @contextmanager
+    def _locked_state(self):
+        """在进程间文件锁内读取、修改并写回状态"""
+        fd = None
+        if fcntl is not None:
+            fd = os.open(f"{self.state_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            state = self._read()
+            yield state
+            self._write(state)
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
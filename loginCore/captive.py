@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import ipaddress
+import logging
+from collections import namedtuple
+from urllib.parse import urljoin, urlparse, parse_qsl
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.captive')
+
+# 未认证时会被门户拦截并重定向的明文HTTP地址
+DEFAULT_PROBE_URL = "http://captive.apple.com/hotspot-detect.html"
+
+# 门户常用的页面内跳转写法
+_BODY_REDIRECT_PATTERNS = (
+    re.compile(r"""location\.href\s*=\s*['"]([^'"]+)['"]""", re.IGNORECASE),
+    re.compile(r"""location\.replace\(\s*['"]([^'"]+)['"]""", re.IGNORECASE),
+    re.compile(r"""http-equiv=['"]?refresh['"]?[^>]*url=([^'">\s]+)""", re.IGNORECASE),
+)
+
+# 门户重定向地址中携带的用户与接入控制器参数，不同门户版本的参数名不同（已去掉下划线并转为小写）
+_REDIRECT_PARAM_NAMES = {
+    "user_ip": ("wlanuserip", "userip", "clientip"),
+    "user_mac": ("wlanusermac", "usermac", "clientmac", "mac"),
+    "ac_ip": ("wlanacip", "acip", "nasip"),
+    "ac_name": ("wlanacname", "acname", "nasname"),
+}
+
+RedirectParams = namedtuple("RedirectParams", ["user_ip", "user_mac", "ac_ip", "ac_name"])
+
+
+def extract_redirect(status_code, headers, body, base_url):
+    """
+    从HTTP响应中提取门户重定向地址
+
+    Args:
+        status_code: HTTP状态码
+        headers: 响应头
+        body: 响应正文
+        base_url: 请求地址，用于解析相对地址
+
+    Returns:
+        str: 重定向地址，没有重定向时返回None
+    """
+    if 300 <= status_code < 400 and headers.get("Location"):
+        return urljoin(base_url, headers["Location"])
+    for pattern in _BODY_REDIRECT_PATTERNS:
+        match = pattern.search(body or "")
+        if match:
+            return urljoin(base_url, match.group(1))
+    return None
+
+
+def _normalize_ip(value):
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except ValueError:
+        return None
+
+
+def _normalize_mac(value):
+    mac = re.sub(r"[-:.]", "", value.strip()).lower()
+    return mac if re.fullmatch(r"[0-9a-f]{12}", mac) else None
+
+
+def parse_redirect_params(url):
+    """
+    解析门户重定向地址中携带的用户IP、MAC、接入控制器(AC)地址和名称
+
+    Args:
+        url: 门户重定向地址，如 http://172.16.253.3/a79.htm?wlanuserip=10.1.2.3&wlanacname=...
+
+    Returns:
+        RedirectParams: 各字段为规范化后的值，地址中没有或格式无效时为None
+    """
+    query = {}
+    for key, value in parse_qsl(urlparse(url).query, keep_blank_values=False):
+        query.setdefault(key.replace("_", "").lower(), value)
+
+    def first(field):
+        for name in _REDIRECT_PARAM_NAMES[field]:
+            if query.get(name):
+                return query[name]
+        return None
+
+    user_ip = first("user_ip")
+    user_mac = first("user_mac")
+    ac_ip = first("ac_ip")
+    ac_name = first("ac_name")
+    return RedirectParams(
+        user_ip=_normalize_ip(user_ip) if user_ip else None,
+        user_mac=_normalize_mac(user_mac) if user_mac else None,
+        ac_ip=_normalize_ip(ac_ip) if ac_ip else None,
+        ac_name=ac_name.strip()[:64] if ac_name and ac_name.strip() else None,
+    )
+
+
+def probe_redirect(transport, probe_url=DEFAULT_PROBE_URL, timeout=3):
+    """
+    访问明文HTTP地址，捕获门户的重定向
+
+    Args:
+        transport: HTTP传输（见transport.create_transport）
+        probe_url: 探测地址
+        timeout: 超时时间(秒)
+
+    Returns:
+        str: 门户重定向地址，未被拦截或请求失败时返回None
+    """
+    try:
+        response = transport.get(probe_url, timeout=timeout, allow_redirects=False)
+    except Exception as e:
+        logger.debug(f"门户重定向探测失败: {e}")
+        return None
+
+    redirect = extract_redirect(response.status_code, response.headers, response.text[:8192], probe_url)
+    if redirect and urlparse(redirect).hostname == urlparse(probe_url).hostname:
+        # 探测地址自身的跳转不是门户拦截
+        return None
+    if redirect:
+        logger.info(f"捕获到门户重定向: {redirect}")
+    return redirect
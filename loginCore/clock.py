@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程内共享的时钟
+
+常驻服务的调度、会话到期预测、熔断、账号冷却和登录历史都通过这里读取当前时间，
+模拟器（simulate.py）替换为虚拟时钟后，可以在几秒内跑完一周的调度过程。
+"""
+
+import time
+import threading
+
+
+class SystemClock:
+    """系统时钟"""
+
+    def time(self):
+        """
+        Returns:
+            float: 当前的Unix时间戳
+        """
+        return time.time()
+
+    def monotonic(self):
+        """
+        Returns:
+            float: 单调时钟读数，用于计算耗时
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """
+        等待指定时间
+
+        Args:
+            seconds: 秒数
+        """
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """虚拟时钟，只在sleep()或advance()时前进"""
+
+    def __init__(self, start=None):
+        """
+        初始化虚拟时钟
+
+        Args:
+            start: 起始的Unix时间戳，默认为当前时间
+        """
+        self._now = time.time() if start is None else float(start)
+        self._origin = self._now
+        self._lock = threading.Lock()
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def monotonic(self):
+        with self._lock:
+            return self._now - self._origin
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """
+        让时钟前进
+
+        Args:
+            seconds: 秒数，负数视为0
+
+        Returns:
+            float: 前进后的时间戳
+        """
+        with self._lock:
+            self._now += max(0.0, seconds)
+            return self._now
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    """
+    获取进程内共享的时钟
+
+    Returns:
+        SystemClock或VirtualClock: 当前时钟
+    """
+    return _clock
+
+
+def set_clock(clock):
+    """
+    替换进程内共享的时钟
+
+    Args:
+        clock: 新时钟，为None时恢复系统时钟
+
+    Returns:
+        SystemClock或VirtualClock: 替换前的时钟
+    """
+    global _clock
+    previous = _clock
+    _clock = clock or SystemClock()
+    return previous
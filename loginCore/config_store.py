@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+配置存储模块，由UI和登录核心共享
+
+配置以原子方式写入（临时文件 + rename），每次写入递增版本号；
+读取时校验为不可变的配置快照，文件未变化时直接复用缓存；
+常驻进程可通过inotify(Linux)/kqueue(macOS)监听配置变化并热加载。
+"""
+
+import os
+import sys
+import json
+import copy
+import errno
+import select
+import struct
+import tempfile
+import ipaddress
+import threading
+import logging
+from dataclasses import dataclass, field, fields
+
+from paths import get_config_dir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 非POSIX平台
+    fcntl = None
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.config')
+
+CONFIG_FILENAME = "config.json"
+
+
+class ConfigError(ValueError):
+    """配置文件格式或内容错误"""
+
+
+def _boolean():
+    def check(key, value):
+        if not isinstance(value, bool):
+            raise ConfigError(f"配置项 {key} 必须是true或false")
+        return value
+    return check
+
+
+def _number(minimum=0, positive=False, maximum=None, integer=False, optional=False):
+    """
+    数值配置项的校验函数
+
+    Args:
+        minimum: 最小值
+        positive: 是否必须大于最小值
+        maximum: 最大值
+        integer: 是否必须是整数
+        optional: 是否允许null
+    """
+    kind = "整数" if integer else "数字"
+    bound = f"大于{minimum}" if positive else f"不小于{minimum}"
+    if maximum is not None:
+        bound += f"且不大于{maximum}"
+
+    def check(key, value):
+        if value is None and optional:
+            return None
+        types = int if integer else (int, float)
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ConfigError(f"配置项 {key} 必须是{kind}")
+        if value < minimum or (positive and value == minimum) or (maximum is not None and value > maximum):
+            raise ConfigError(f"配置项 {key} 必须{bound}")
+        return value
+    return check
+
+
+def _string(choices=None, optional=False):
+    def check(key, value):
+        if value is None and optional:
+            return None
+        if not isinstance(value, str):
+            raise ConfigError(f"配置项 {key} 必须是字符串")
+        if choices and value not in choices:
+            raise ConfigError(f"配置项 {key} 只能是 {', '.join(choices)}")
+        return value
+    return check
+
+
+def _networks():
+    def check(key, value):
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ConfigError(f"配置项 {key} 必须是网段字符串列表")
+        for item in value:
+            try:
+                ipaddress.ip_network(item, strict=False)
+            except ValueError as e:
+                raise ConfigError(f"配置项 {key} 中的网段无效: {e}") from e
+        return tuple(value)
+    return check
+
+
+def _object_list():
+    def check(key, value):
+        if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+            raise ConfigError(f"配置项 {key} 必须是对象列表")
+        return tuple(value)
+    return check
+
+
+def _endpoints():
+    def check(key, value):
+        if not isinstance(value, list) or not all(
+                (isinstance(item, str) and item) or (isinstance(item, dict) and isinstance(item.get("base_url"), str))
+                for item in value):
+            raise ConfigError(f"配置项 {key} 必须是URL字符串或包含base_url的对象列表")
+        return tuple(value)
+    return check
+
+
+def _cooldowns():
+    def check(key, value):
+        if not isinstance(value, dict) or not all(
+                isinstance(seconds, (int, float)) and not isinstance(seconds, bool) and seconds >= 0
+                for seconds in value.values()):
+            raise ConfigError(f"配置项 {key} 必须是错误码到冷却秒数的映射")
+        return dict(value)
+    return check
+
+
+def _setting(default, check):
+    """声明带默认值和校验函数的配置项，列表和对象类的取值不参与哈希"""
+    if isinstance(default, dict):
+        return field(default_factory=lambda: copy.deepcopy(default), hash=False, metadata={"check": check})
+    return field(default=default, hash=False, metadata={"check": check})
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    经过校验的只读配置快照
+
+    各模块读取的配置项在加载时统一校验类型和取值范围，使用时直接读取对应属性；
+    配置文件中未出现的配置项取这里声明的默认值。
+    """
+
+    version: int = 0
+    student_id: str = ""
+    password: str = ""
+    webhook_urls: tuple = ()
+    accounts: tuple = _setting((), _object_list())
+    account_cooldowns: dict = _setting({}, _cooldowns())
+    # 登录
+    http_engine: str = _setting("requests", _string())
+    portal_endpoints: tuple = _setting((), _endpoints())
+    discover_portal: bool = _setting(True, _boolean())
+    redirect_params: bool = _setting(True, _boolean())
+    ipv6: bool = _setting(True, _boolean())
+    multi_interface: bool = _setting(True, _boolean())
+    # 多接口登录时视为校园网的网段
+    campus_networks: tuple = _setting(("10.0.0.0/8", "172.16.0.0/12"), _networks())
+    breaker_threshold: int = _setting(5, _number(1, integer=True))
+    breaker_reset_timeout: float = _setting(60, _number(positive=True))
+    breaker_max_reset_timeout: float = _setting(900, _number(positive=True))
+    hedge: bool = _setting(True, _boolean())
+    hedge_delay: float = _setting(None, _number(positive=True, optional=True))
+    hedge_percentile: float = _setting(95, _number(positive=True, maximum=100))
+    hedge_max_rate: float = _setting(0.1, _number(maximum=1))
+    history_retention_days: float = _setting(90, _number(positive=True))
+    hooks: tuple = _setting((), _object_list())
+    hook_budget: float = _setting(60, _number(positive=True))
+    hook_concurrency: int = _setting(4, _number(1, integer=True))
+    trace_buffer_size: int = _setting(4096, _number(1, integer=True))
+    trace_keep: int = _setting(20, _number(integer=True))
+    # 运行耗时超过该值(秒)时自动导出追踪，0表示不自动导出
+    trace_slow_threshold: float = _setting(10.0, _number())
+    # 常驻服务
+    check_interval: float = _setting(900, _number(positive=True))
+    retry_interval: float = _setting(60, _number(positive=True))
+    reauth_mode: str = _setting("probe", _string(choices=("probe", "relogin", "off")))
+    reauth_lead: float = _setting(60, _number())
+    burst_interval: float = _setting(2, _number(positive=True))
+    burst_window: float = _setting(300, _number())
+    # 套接字激活启动的常驻服务在线且空闲超过该时间(秒)后退出，0表示不退出
+    idle_exit: float = _setting(600, _number())
+    # 链路质量采样间隔(秒)，0或null表示不启用监测
+    link_monitor_interval: float = _setting(60, _number(optional=True))
+    link_monitor_window: int = _setting(256, _number(1, integer=True))
+    link_relogin: bool = _setting(False, _boolean())
+    # 判断链路退化时查看的最近样本数，以及其中外网丢包率达到多少时视为退化
+    link_relogin_samples: int = _setting(5, _number(1, integer=True))
+    link_relogin_loss: float = _setting(0.6, _number(maximum=1))
+    # 两次强制重新登录的最小间隔(秒)
+    link_relogin_cooldown: float = _setting(600, _number())
+    # 局域网网关
+    # 默认只在本机可用，监听其他地址时必须设置gateway_token并配置局域网网段
+    gateway_listen: str = _setting("127.0.0.1:8765", _string())
+    gateway_allowed_networks: tuple = _setting(("127.0.0.0/8", "::1/128"), _networks())
+    gateway_token: str = _setting(None, _string(optional=True))
+    gateway_max_workers: int = _setting(4, _number(1, integer=True))
+    gateway_max_queue: int = _setting(256, _number(1, integer=True))
+    gateway_cache_size: int = _setting(1024, _number(integer=True))
+    gateway_cache_ttl: float = _setting(600, _number())
+    path: str = ""
+    raw: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def get(self, key, default=None):
+        """
+        按键读取配置，兼容旧代码中对配置字典的访问方式
+
+        Args:
+            key: 配置键
+            default: 默认值
+
+        Returns:
+            配置值
+        """
+        return self.raw.get(key, default)
+
+    def to_dict(self):
+        """
+        导出可修改的配置字典副本
+
+        Returns:
+            dict: 配置字典
+        """
+        return copy.deepcopy(self.raw)
+
+
+def validate_config(data, path=""):
+    """
+    校验配置字典并生成配置快照
+
+    Args:
+        data: 从JSON解析出的配置
+        path: 配置来源路径
+
+    Returns:
+        ConfigSnapshot: 配置快照
+
+    Raises:
+        ConfigError: 配置不合法
+    """
+    if not isinstance(data, dict):
+        raise ConfigError("配置文件顶层必须是JSON对象")
+
+    for key in ("student_id", "password"):
+        if not isinstance(data.get(key, ""), str):
+            raise ConfigError(f"配置项 {key} 必须是字符串")
+
+    webhook_urls = data.get("webhook_urls", [])
+    if isinstance(webhook_urls, str):
+        webhook_urls = [webhook_urls]
+    if not isinstance(webhook_urls, list) or not all(isinstance(url, str) for url in webhook_urls):
+        raise ConfigError("配置项 webhook_urls 必须是字符串列表")
+
+    version = data.get("version", 0)
+    if not isinstance(version, int) or version < 0:
+        raise ConfigError("配置项 version 必须是非负整数")
+
+    settings = {}
+    for item in fields(ConfigSnapshot):
+        check = item.metadata.get("check")
+        if check is not None and item.name in data:
+            settings[item.name] = check(item.name, data[item.name])
+
+    raw = copy.deepcopy(data)
+    raw["webhook_urls"] = list(webhook_urls)
+    return ConfigSnapshot(
+        version=version,
+        student_id=data.get("student_id", ""),
+        password=data.get("password", ""),
+        webhook_urls=tuple(webhook_urls),
+        path=path,
+        raw=raw,
+        **settings
+    )
+
+
+class ConfigStore:
+    """原子写入、带版本号的配置存储"""
+
+    def __init__(self, path=None, fallback_paths=()):
+        """
+        初始化配置存储
+
+        Args:
+            path: 主配置文件路径，默认为用户配置目录下的config.json
+            fallback_paths: 主配置不存在时依次尝试读取的旧版配置路径
+        """
+        self.path = path or os.path.join(get_config_dir(), CONFIG_FILENAME)
+        self.fallback_paths = [p for p in fallback_paths if p]
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stat_key = None
+        self._watcher = None
+
+    def _locate(self):
+        """
+        查找当前生效的配置文件
+
+        Returns:
+            tuple: (路径, os.stat结果)，均不存在时返回(None, None)
+        """
+        for candidate in [self.path] + self.fallback_paths:
+            try:
+                return candidate, os.stat(candidate)
+            except OSError:
+                continue
+        return None, None
+
+    def load(self, force=False):
+        """
+        加载配置快照，配置文件未变化时直接返回缓存
+
+        Args:
+            force: 是否忽略缓存强制重新读取
+
+        Returns:
+            ConfigSnapshot: 配置快照，配置文件不存在时返回空快照
+
+        Raises:
+            ConfigError: 配置文件无法解析或内容不合法
+        """
+        with self._lock:
+            path, st = self._locate()
+            if path is None:
+                if self._snapshot is None or self._stat_key is not None:
+                    logger.warning("未找到配置文件，使用默认配置")
+                self._snapshot, self._stat_key = ConfigSnapshot(), None
+                return self._snapshot
+
+            stat_key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+            if not force and self._snapshot is not None and stat_key == self._stat_key:
+                return self._snapshot
+
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ConfigError(f"配置文件 {path} 格式错误: {e}") from e
+            except OSError as e:
+                raise ConfigError(f"读取配置文件 {path} 失败: {e}") from e
+
+            self._snapshot = validate_config(data, path)
+            self._stat_key = stat_key
+            logger.info(f"已加载配置: {path} (版本 {self._snapshot.version})")
+            return self._snapshot
+
+    def save(self, data):
+        """
+        原子写入配置，版本号在当前磁盘版本的基础上加一
+
+        Args:
+            data: 配置字典（无需包含version字段）
+
+        Returns:
+            ConfigSnapshot: 写入后的配置快照
+
+        Raises:
+            ConfigError: 配置内容不合法
+            OSError: 写入失败
+        """
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock, _FileLock(f"{self.path}.lock"):
+            current_version = 0
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    current_version = int(json.load(f).get("version", 0))
+            except (OSError, ValueError, AttributeError):
+                pass
+
+            payload = dict(data)
+            payload["version"] = current_version + 1
+            snapshot = validate_config(payload, self.path)
+
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp_path, 0o600)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            _fsync_dir(directory)
+
+            st = os.stat(self.path)
+            self._snapshot = snapshot
+            self._stat_key = (self.path, st.st_ino, st.st_size, st.st_mtime_ns)
+
+        logger.info(f"配置已保存: {self.path} (版本 {snapshot.version})")
+        return snapshot
+
+    def start_watching(self, callback):
+        """
+        在后台线程监听配置变化，变化后重新加载并回调
+
+        Args:
+            callback: 回调函数，参数为新的ConfigSnapshot
+        """
+        if self._watcher is not None:
+            return
+
+        def on_change():
+            try:
+                previous = self._snapshot
+                snapshot = self.load()
+                if snapshot is not previous:
+                    callback(snapshot)
+            except ConfigError as e:
+                logger.error(f"热加载配置失败，继续使用旧配置: {e}")
+
+        self._watcher = ConfigWatcher(os.path.dirname(self.path), os.path.basename(self.path), on_change)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """停止监听配置变化"""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+
+class ConfigWatcher:
+    """监听配置文件所在目录，优先使用inotify/kqueue，不可用时退化为轮询"""
+
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, directory, filename, on_change):
+        """
+        初始化监听器
+
+        Args:
+            directory: 配置文件所在目录
+            filename: 配置文件名
+            on_change: 文件变化时调用的无参函数
+        """
+        self.directory = directory
+        self.filename = filename
+        self.on_change = on_change
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台监听线程"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监听"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.POLL_INTERVAL + 1)
+
+    def _run(self):
+        try:
+            if sys.platform.startswith("linux"):
+                self._run_inotify()
+                return
+            if hasattr(select, "kqueue"):
+                self._run_kqueue()
+                return
+        except OSError as e:
+            logger.warning(f"文件系统事件监听不可用，改用轮询: {e}")
+        self._run_polling()
+
+    def _run_inotify(self):
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        in_close_write, in_moved_to = 0x00000008, 0x00000080
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        try:
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.directory), in_close_write | in_moved_to)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch失败")
+            logger.debug(f"使用inotify监听配置目录: {self.directory}")
+            target = os.fsencode(self.filename)
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 1.0)
+                if not readable:
+                    continue
+                try:
+                    buffer = os.read(fd, 4096)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                changed = False
+                offset = 0
+                while offset + 16 <= len(buffer):
+                    _, _, _, name_len = struct.unpack_from("iIII", buffer, offset)
+                    name = buffer[offset + 16:offset + 16 + name_len].rstrip(b"\0")
+                    offset += 16 + name_len
+                    changed = changed or name == target
+                if changed:
+                    self.on_change()
+        finally:
+            os.close(fd)
+
+    def _run_kqueue(self):
+        kq = select.kqueue()
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            event = select.kevent(
+                dir_fd,
+                filter=select.KQ_FILTER_VNODE,
+                flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                fflags=select.KQ_NOTE_WRITE,
+            )
+            kq.control([event], 0, 0)
+            logger.debug(f"使用kqueue监听配置目录: {self.directory}")
+            last_key = self._stat_key()
+            while not self._stop.is_set():
+                if not kq.control(None, 1, 1.0):
+                    continue
+                # 目录写事件不区分文件，比较配置文件元数据过滤无关变化
+                key = self._stat_key()
+                if key != last_key:
+                    last_key = key
+                    self.on_change()
+        finally:
+            os.close(dir_fd)
+            kq.close()
+
+    def _run_polling(self):
+        last_key = self._stat_key()
+        while not self._stop.wait(self.POLL_INTERVAL):
+            key = self._stat_key()
+            if key != last_key:
+                last_key = key
+                self.on_change()
+
+    def _stat_key(self):
+        try:
+            st = os.stat(os.path.join(self.directory, self.filename))
+            return st.st_ino, st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+
+class _FileLock:
+    """基于fcntl的进程间互斥锁，防止UI与登录核心同时写配置"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return False
+
+
+def _fsync_dir(directory):
+    """同步目录项，确保rename在断电后依然生效"""
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
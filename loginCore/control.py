@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常驻登录服务的本地控制接口
+
+基于Unix域套接字的JSON-RPC 2.0协议，每行一个JSON消息。
+支持的方法: login、status、metrics、reload_config、subscribe。
+subscribe之后连接保持打开，服务端以method为"event"的通知推送事件。
+由systemd套接字激活启动时直接使用systemd传入的监听套接字。
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import inspect
+import threading
+import socketserver
+import logging
+
+from paths import get_state_dir
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.control')
+
+SOCKET_FILENAME = "control.sock"
+
+# JSON-RPC错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# 单个订阅者允许积压的事件数，超出后丢弃最旧的事件
+SUBSCRIBER_QUEUE_SIZE = 256
+MAX_REQUEST_SIZE = 64 * 1024
+
+# systemd传入的第一个监听套接字的文件描述符
+SD_LISTEN_FDS_START = 3
+
+
+def get_socket_path():
+    """
+    获取控制套接字路径
+
+    Returns:
+        str: 套接字路径
+    """
+    return os.path.join(get_state_dir(), SOCKET_FILENAME)
+
+
+def get_activated_socket():
+    """
+    获取systemd套接字激活传入的监听套接字
+
+    Returns:
+        socket.socket: 监听套接字，不是由套接字激活启动时返回None
+    """
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+    try:
+        count = int(os.environ.get("LISTEN_FDS", "0"))
+    except ValueError:
+        return None
+    # 避免子进程误认为套接字是传给自己的
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    if count < 1:
+        return None
+    return socket.socket(fileno=SD_LISTEN_FDS_START)
+
+
+class ControlError(Exception):
+    """控制接口调用失败"""
+
+    def __init__(self, message, code=INTERNAL_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """处理单个客户端连接"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                line = self.rfile.readline(MAX_REQUEST_SIZE)
+            except OSError:
+                return
+            if not line:
+                return
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self._send({"jsonrpc": "2.0", "id": None,
+                            "error": {"code": PARSE_ERROR, "message": "无法解析请求"}})
+                continue
+
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                self._send({"jsonrpc": "2.0", "id": None,
+                            "error": {"code": INVALID_REQUEST, "message": "无效的请求"}})
+                continue
+
+            request_id = request.get("id")
+            method = request["method"]
+            params = request.get("params") or {}
+
+            if method == "subscribe":
+                self._subscribe(request_id, params)
+                return
+
+            response = server.controller.dispatch(method, params)
+            response.update({"jsonrpc": "2.0", "id": request_id})
+            # 没有id的请求是通知，不需要回复
+            if request_id is not None:
+                self._send(response)
+
+    def _subscribe(self, request_id, params):
+        """订阅事件流，直到客户端断开连接"""
+        events = params.get("events") if isinstance(params, dict) else None
+        subscriber = self.server.controller.add_subscriber(events)
+        try:
+            self._send({"jsonrpc": "2.0", "id": request_id, "result": {"subscribed": events or "*"}})
+            while not self.server.stopping.is_set():
+                try:
+                    event = subscriber.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                self._send({"jsonrpc": "2.0", "method": "event", "params": event})
+        except OSError:
+            pass
+        finally:
+            self.server.controller.remove_subscriber(subscriber)
+
+    def _send(self, message):
+        data = json.dumps(message, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    """常驻服务的控制接口服务端"""
+
+    def __init__(self, service, socket_path=None):
+        """
+        初始化控制接口
+
+        Args:
+            service: 提供login/status/metrics_snapshot/trace/reload_config方法的服务对象（LoginDaemon）
+            socket_path: 套接字路径，默认位于状态目录
+        """
+        self.service = service
+        self.socket_path = socket_path or get_socket_path()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.socket_activated = False
+        self.last_request_at = time.monotonic()
+        self.methods = {
+            "login": lambda force=False, trace=False: service.login(force=bool(force), trace=bool(trace)),
+            "status": service.status,
+            "metrics": service.metrics_snapshot,
+            "trace": service.trace,
+            "reload_config": service.reload_config,
+        }
+
+    def start(self):
+        """在后台线程启动服务端，由套接字激活启动时使用systemd传入的套接字"""
+        activated = get_activated_socket()
+        if activated is not None:
+            self._server = _Server(self.socket_path, _Handler, bind_and_activate=False)
+            self._server.socket.close()
+            self._server.socket = activated
+            self.socket_activated = True
+        else:
+            self._remove_stale_socket()
+            old_umask = os.umask(0o077)
+            try:
+                self._server = _Server(self.socket_path, _Handler)
+            finally:
+                os.umask(old_umask)
+        self._server.controller = self
+        self._server.stopping = threading.Event()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control-server", daemon=True)
+        self._thread.start()
+        logger.info(f"控制接口已启动: {self.socket_path}")
+
+    def stop(self):
+        """停止服务端并删除套接字文件"""
+        if self._server is None:
+            return
+        self._server.stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if self.socket_activated:
+            # 套接字文件由systemd管理，服务退出后继续监听以便按需启动
+            return
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def _remove_stale_socket(self):
+        """删除上次异常退出遗留的套接字文件，已有服务在运行时报错"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise ControlError(f"已有常驻服务在运行: {self.socket_path}")
+
+    def dispatch(self, method, params):
+        """
+        调用服务方法
+
+        Args:
+            method: 方法名
+            params: 参数字典
+
+        Returns:
+            dict: 包含result或error的响应
+        """
+        self.last_request_at = time.monotonic()
+        handler = self.methods.get(method)
+        if handler is None:
+            return {"error": {"code": METHOD_NOT_FOUND, "message": f"未知方法: {method}"}}
+        if not isinstance(params, dict):
+            return {"error": {"code": INVALID_PARAMS, "message": "参数必须是对象"}}
+        # 调用前按方法签名检查参数，方法内部抛出的TypeError属于服务端错误
+        try:
+            inspect.signature(handler).bind(**params)
+        except TypeError as e:
+            return {"error": {"code": INVALID_PARAMS, "message": str(e)}}
+        try:
+            return {"result": handler(**params)}
+        except Exception as e:
+            logger.exception(f"控制接口方法 {method} 执行失败: {e}")
+            return {"error": {"code": INTERNAL_ERROR, "message": str(e)}}
+
+    def idle_seconds(self):
+        """
+        距离上一次请求的秒数，有订阅者连接时视为不空闲
+
+        Returns:
+            float: 空闲秒数
+        """
+        with self._subscribers_lock:
+            if self._subscribers:
+                return 0.0
+        return time.monotonic() - self.last_request_at
+
+    def add_subscriber(self, events=None):
+        """
+        注册事件订阅者
+
+        Args:
+            events: 关注的事件类型列表，为空表示全部
+
+        Returns:
+            queue.Queue: 订阅者的事件队列
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber.events = set(events) if events else None
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def remove_subscriber(self, subscriber):
+        """注销事件订阅者"""
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        self.last_request_at = time.monotonic()
+
+    def publish(self, event_type, data):
+        """
+        向所有订阅者推送事件，慢订阅者只会丢失自己最旧的事件，不影响发布方
+
+        Args:
+            event_type: 事件类型
+            data: 事件数据
+        """
+        event = dict(data, type=event_type)
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.events is not None and event_type not in subscriber.events:
+                continue
+            while True:
+                try:
+                    subscriber.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+class ControlClient:
+    """控制接口客户端"""
+
+    def __init__(self, socket_path=None, timeout=60):
+        """
+        初始化客户端
+
+        Args:
+            socket_path: 套接字路径，默认位于状态目录
+            timeout: 调用超时时间(秒)
+        """
+        self.socket_path = socket_path or get_socket_path()
+        self.timeout = timeout
+        self._next_id = 0
+        self._stream = None
+
+    def is_available(self):
+        """
+        检查常驻服务是否在运行
+
+        Returns:
+            bool: 能否连接到控制套接字
+        """
+        try:
+            sock = self._connect(timeout=1.0)
+        except OSError:
+            return False
+        sock.close()
+        return True
+
+    def _connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, method, params):
+        self._next_id += 1
+        message = {"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params}
+        return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def call(self, method, **params):
+        """
+        调用服务方法
+
+        Args:
+            method: 方法名
+            **params: 方法参数
+
+        Returns:
+            方法返回值
+
+        Raises:
+            OSError: 无法连接常驻服务
+            ControlError: 服务端返回错误
+        """
+        sock = self._connect()
+        try:
+            sock.sendall(self._request(method, params))
+            reader = sock.makefile("rb")
+            line = reader.readline()
+        finally:
+            sock.close()
+        if not line:
+            raise ControlError("常驻服务关闭了连接")
+        response = json.loads(line)
+        if "error" in response:
+            error = response["error"]
+            raise ControlError(error.get("message", "未知错误"), error.get("code", INTERNAL_ERROR))
+        return response.get("result")
+
+    def subscribe(self, events=None):
+        """
+        订阅事件流
+
+        Args:
+            events: 关注的事件类型列表，为空表示全部
+
+        Yields:
+            dict: 事件数据，包含type字段
+
+        Raises:
+            OSError: 无法连接常驻服务
+        """
+        sock = self._connect()
+        self._stream = sock
+        # 事件流是长连接，只在建立订阅时使用超时
+        try:
+            sock.sendall(self._request("subscribe", {"events": events} if events else {}))
+            reader = sock.makefile("rb")
+            reader.readline()
+            sock.settimeout(None)
+            for line in reader:
+                message = json.loads(line)
+                if message.get("method") == "event":
+                    yield message.get("params") or {}
+        finally:
+            self._stream = None
+            sock.close()
+
+    def close(self):
+        """关闭事件流连接，可在其他线程中调用以结束subscribe()"""
+        sock = self._stream
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import logging
+from collections import deque
+
+from clock import get_clock
+from portal import probe_online
+from history import OUTCOME_ONLINE
+from predictor import SessionPredictor
+from metrics import Metrics
+from tracing import get_tracer
+from linkmon import LinkMonitor
+from events import PROBE_RESULT, DEAUTH_DETECTED
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.daemon')
+
+# status接口返回的最近登录记录条数
+RECENT_LOGINS = 30
+
+
+class LoginDaemon:
+    """常驻登录服务：定期检查在线状态，在预测的会话到期前密集探测或主动重新登录"""
+
+    def __init__(self, auto_login, probe=None):
+        """
+        初始化常驻服务
+
+        Args:
+            auto_login: AutoLogin实例
+            probe: 在线状态探测函数，返回bool，默认访问外网检测
+        """
+        self.auto_login = auto_login
+        self.probe = probe or self._probe_online
+        self.history = auto_login.get_history()
+        self.predictor = SessionPredictor(self.history)
+        self.prediction = None
+        self.metrics = Metrics()
+        self.metrics.register("endpoints", lambda: self.auto_login.get_endpoint_selector().snapshot())
+        self.metrics.register("breaker", lambda: self.auto_login.get_breaker().snapshot())
+        self.metrics.register("hedge", self._hedge_snapshot)
+        self.events = auto_login.events
+        self.metrics.register("events", self.events.snapshot)
+        self.metrics.register("hooks", auto_login.hooks.snapshot)
+        self.online = None
+        self.last_probe_at = None
+        self.last_result = None
+        self.recent_logins = deque(maxlen=RECENT_LOGINS)
+        self._relogin_for = None
+        self._login_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.link_monitor = LinkMonitor.from_config(self)
+        if self.link_monitor is not None:
+            self.metrics.register("link", self.link_monitor.snapshot)
+
+    def add_listener(self, listener, name=None):
+        """
+        注册事件监听函数，监听函数在事件总线的订阅者线程中调用，不会阻塞服务主循环和登录
+
+        Args:
+            listener: 回调函数，参数为(事件类型, 事件数据)
+            name: 订阅者名称
+
+        Returns:
+            Subscription: 事件总线上的订阅
+        """
+        return self.events.subscribe(
+            lambda event: listener(event.type, event.data),
+            name=name or getattr(listener, "__name__", None),
+        )
+
+    def _emit(self, event_type, data):
+        self.events.publish(event_type, **data)
+
+    def _probe_online(self):
+        return probe_online(engine=self.config.http_engine)
+
+    @property
+    def config(self):
+        """当前生效的配置快照，热加载后自动切换"""
+        return self.auto_login.config
+
+    @property
+    def reauth_mode(self):
+        return self.config.reauth_mode
+
+    def run(self):
+        """运行服务主循环，直到调用stop()"""
+        logger.info("常驻登录服务已启动")
+        self.auto_login.enable_hot_reload()
+        self.predictor.fit()
+        if self.link_monitor is not None:
+            self.link_monitor.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    delay = self.step()
+                except Exception as e:
+                    logger.exception(f"常驻服务执行检查时发生异常: {e}")
+                    delay = self.config.retry_interval
+                self._wake.wait(delay)
+                self._wake.clear()
+        finally:
+            if self.link_monitor is not None:
+                self.link_monitor.stop()
+        logger.info("常驻登录服务已停止")
+
+    @property
+    def stopped(self):
+        """服务主循环是否已停止"""
+        return self._stop.is_set()
+
+    def stop(self):
+        """停止服务主循环"""
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """立即执行下一次检查"""
+        self._wake.set()
+
+    def step(self, now=None):
+        """
+        执行一次检查：探测在线状态，掉线时立即登录，并根据会话到期预测安排下一次检查
+
+        Args:
+            now: 当前时间，默认为当前时间
+
+        Returns:
+            float: 距离下一次检查的秒数
+        """
+        now = get_clock().time() if now is None else now
+        check_interval = self.config.check_interval
+        burst_interval = self.config.burst_interval
+
+        if not self._probe(now):
+            if self.history.mark_deauth(now):
+                logger.warning("检测到认证会话已掉线，立即重新登录")
+                self.metrics.incr("deauths")
+                self._emit(DEAUTH_DETECTED, {"at": now})
+            success = self.login()["success"]
+            self._refresh_prediction(refit=True)
+            if success:
+                return check_interval
+            # 门户熔断期间等到允许试探时再重试
+            retry_interval = self.config.retry_interval
+            retry_interval = max(retry_interval, self.auto_login.get_breaker().retry_after())
+            return min(check_interval, retry_interval)
+
+        self.history.observe_session(OUTCOME_ONLINE, now)
+        if self.prediction is None:
+            self._refresh_prediction()
+
+        prediction = self.prediction
+        if prediction is None or self.reauth_mode == "off":
+            return check_interval
+
+        act_at = prediction.expires_at - self.config.reauth_lead
+        if now < act_at:
+            return max(burst_interval, min(check_interval, act_at - now))
+
+        if now < prediction.expires_at + self.config.burst_window:
+            if self.reauth_mode == "relogin" and self._relogin_for != prediction.expires_at:
+                self._relogin_for = prediction.expires_at
+                logger.info(f"会话预计在 {prediction.expires_at - now:.0f} 秒后到期({prediction.model})，主动重新登录")
+                if self.login(force=True)["success"]:
+                    self._refresh_prediction()
+            return burst_interval
+
+        # 预测时间已过仍未掉线，说明预测偏早，重新学习
+        self._refresh_prediction(refit=True)
+        return check_interval
+
+    def _probe(self, now):
+        """
+        探测在线状态并在状态变化时推送事件
+
+        Returns:
+            bool: 是否在线
+        """
+        online = self.probe()
+        self.metrics.incr("probes")
+        if not online:
+            self.metrics.incr("probes_offline")
+        self._emit(PROBE_RESULT, {"online": online, "at": now})
+        if online != self.online:
+            self._emit("state", {"online": online, "at": now})
+        self.online = online
+        self.last_probe_at = now
+        return online
+
+    def login(self, force=False, trace=False):
+        """
+        执行登录，同一时间只有一个登录在进行；等待期间已有登录成功完成时直接复用其结果
+
+        Args:
+            force: 是否跳过在线检查直接重新登录
+            trace: 是否无论耗时都导出本次登录的追踪
+
+        Returns:
+            dict: 登录结果
+        """
+        requested_at = get_clock().time()
+        with self._login_lock:
+            last = self.last_result
+            if not force and not trace and last and last["success"] and last["finished_at"] >= requested_at:
+                self.metrics.incr("logins_coalesced")
+                return last
+
+            self._emit("login_started", {"at": requested_at, "force": force})
+            success = self.auto_login.login(force=force, trace=trace)
+            run = self.auto_login.last_run
+            result = {
+                "success": success,
+                "outcome": run["outcome"],
+                "message": run["message"],
+                "error_code": run["error_code"],
+                "account": run["account"],
+                "ip": run["ip"],
+                "started_at": run["started_at"],
+                "finished_at": run["started_at"] + run["duration"],
+                "duration": run["duration"],
+                "forced": force,
+                "phases": run["phases"],
+                "interfaces": run["interfaces"],
+                "skipped_interfaces": run["skipped_interfaces"],
+                "trace_id": run["trace_id"],
+                "trace_file": run["trace_file"],
+            }
+
+            self.metrics.incr("logins")
+            self.metrics.incr("login_successes" if success else "login_failures")
+            self.metrics.set("last_login_duration", run["duration"])
+            if success:
+                self.online = True
+            self.last_result = result
+            self.recent_logins.append({
+                "finished_at": result["finished_at"],
+                "duration": result["duration"],
+                "success": success,
+                "message": result["message"],
+                "error_code": result["error_code"],
+            })
+            self._emit("login", result)
+            return result
+
+    def status(self):
+        """
+        获取服务当前状态
+
+        Returns:
+            dict: 在线状态、最近一次登录结果和会话到期预测
+        """
+        prediction = self.prediction
+        return {
+            "pid": os.getpid(),
+            "online": self.online,
+            "last_probe_at": self.last_probe_at,
+            "last_login": self.last_result,
+            "recent_logins": list(self.recent_logins),
+            "prediction": prediction._asdict() if prediction else None,
+            "reauth_mode": self.reauth_mode,
+            "config_version": self.auto_login.config.version,
+        }
+
+    def metrics_snapshot(self):
+        """
+        导出服务指标
+
+        Returns:
+            dict: 指标快照
+        """
+        return self.metrics.snapshot()
+
+    def _hedge_snapshot(self):
+        # 配置可热加载，每次导出时按当前配置读取
+        policy = self.auto_login.get_hedge_policy()
+        return policy.snapshot() if policy is not None else {"enabled": False}
+
+    def trace(self, trace_id=None):
+        """
+        导出环形缓冲区中的追踪
+
+        Args:
+            trace_id: 只导出指定追踪（如某次登录结果中的trace_id），为空时导出全部
+
+        Returns:
+            dict: Chrome trace-event格式的追踪
+        """
+        return get_tracer().export(trace_id)
+
+    def reload_config(self):
+        """
+        立即重新加载配置
+
+        Returns:
+            dict: 加载后的配置版本
+        """
+        self.auto_login.reload_config(self.auto_login.store.load(force=True))
+        self._emit("config_reloaded", {"version": self.auto_login.config.version})
+        return {"version": self.auto_login.config.version}
+
+    def _refresh_prediction(self, refit=False):
+        """
+        重新计算当前会话的到期预测
+
+        Args:
+            refit: 是否先根据最新历史重新学习
+        """
+        if refit:
+            self.predictor.fit()
+        session = self.history.current_session()
+        self.prediction = self.predictor.predict(session[0] if session else None)
+        if self.prediction is not None:
+            remaining = self.prediction.expires_at - get_clock().time()
+            logger.info(f"预测当前会话将在 {remaining / 60:.1f} 分钟后到期({self.prediction.model})")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+import logging
+from urllib.parse import urlparse
+
+from clock import get_clock
+from paths import get_state_dir
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.endpoints')
+
+DEFAULT_PORTAL_URL = "http://172.16.253.3:801/eportal/"
+
+# 未测量过的节点按该RTT参与排序，保证新节点有机会被尝试
+DEFAULT_RTT = 0.2
+# RTT和错误率的指数加权平均系数
+EWMA_ALPHA = 0.3
+# 最近失败的节点在该时间内排到最后
+FAILURE_COOLDOWN = 60
+# 错误率对得分的放大系数
+ERROR_WEIGHT = 4.0
+
+
+class PortalEndpoint:
+    """单个门户节点"""
+
+    def __init__(self, base_url, check_url=None):
+        """
+        初始化门户节点
+
+        Args:
+            base_url: ePortal接口地址，如 http://172.16.253.3:801/eportal/
+            check_url: 校园网连通性检查页面，默认为同一主机的a79.htm
+        """
+        if not base_url.endswith("/"):
+            base_url += "/"
+        self.base_url = base_url
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.check_url = check_url or f"{parsed.scheme}://{parsed.hostname}/a79.htm"
+        # 显式配置的检查页面不会被自动发现的门户协议参数覆盖
+        self.custom_check_url = check_url is not None
+        self.referer = f"{parsed.scheme}://{parsed.hostname}/"
+
+    @classmethod
+    def from_config(cls, item):
+        """
+        从配置项创建节点，配置项可以是URL字符串或包含base_url/check_url的对象
+
+        Returns:
+            PortalEndpoint: 节点，配置无效时返回None
+        """
+        if isinstance(item, str) and item:
+            return cls(item)
+        if isinstance(item, dict) and item.get("base_url"):
+            return cls(item["base_url"], item.get("check_url"))
+        logger.warning(f"忽略无效的门户节点配置: {item!r}")
+        return None
+
+    def __eq__(self, other):
+        return isinstance(other, PortalEndpoint) and other.base_url == self.base_url
+
+    def __hash__(self):
+        return hash(self.base_url)
+
+    def __repr__(self):
+        return f"PortalEndpoint({self.base_url})"
+
+
+class EndpointSelector:
+    """按RTT和错误率为门户节点排序，统计数据持久化到状态目录供各进程共享"""
+
+    def __init__(self, endpoints=None, state_file=None):
+        """
+        初始化节点选择器
+
+        Args:
+            endpoints: 配置的节点列表（URL字符串或对象），为空时使用默认节点
+            state_file: 统计数据文件路径，默认保存在状态目录
+        """
+        configured = [PortalEndpoint.from_config(item) for item in (endpoints or [DEFAULT_PORTAL_URL])]
+        self.endpoints = [endpoint for endpoint in configured if endpoint is not None]
+        if not self.endpoints:
+            self.endpoints = [PortalEndpoint(DEFAULT_PORTAL_URL)]
+        self.state_file = state_file or os.path.join(get_state_dir(), "endpoints.json")
+        self._lock = threading.Lock()
+        self._stats = self._load_state()
+
+        # 加入此前从重定向中发现的节点
+        for base_url in self._stats.get("_discovered", []):
+            self._add(PortalEndpoint(base_url))
+
+    def _add(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints.append(endpoint)
+            return True
+        return False
+
+    def add_discovered(self, endpoint):
+        """
+        加入从门户重定向中发现的节点
+
+        Args:
+            endpoint: PortalEndpoint实例
+        """
+        with self._lock:
+            if not self._add(endpoint):
+                return
+            discovered = self._stats.setdefault("_discovered", [])
+            discovered.append(endpoint.base_url)
+            logger.info(f"发现新的门户节点: {endpoint.base_url}")
+            self._save_state()
+
+    def score(self, endpoint, now=None):
+        """
+        计算节点得分，越小越好
+
+        Args:
+            endpoint: PortalEndpoint实例
+            now: 当前时间
+
+        Returns:
+            float: 得分
+        """
+        now = get_clock().time() if now is None else now
+        stats = self._stats.get(endpoint.base_url) or {}
+        rtt = stats.get("rtt", DEFAULT_RTT)
+        error_rate = stats.get("error_rate", 0.0)
+        score = rtt * (1 + ERROR_WEIGHT * error_rate)
+        if now - stats.get("last_failure", 0) < FAILURE_COOLDOWN:
+            score += 1000
+        return score
+
+    def ranked(self, exclude=()):
+        """
+        按得分排序的节点列表，得分相同时保持配置顺序
+
+        Args:
+            exclude: 需要排到最后的节点（如本次运行中已失败的节点）
+
+        Returns:
+            list: PortalEndpoint列表
+        """
+        now = get_clock().time()
+        with self._lock:
+            order = {endpoint: index for index, endpoint in enumerate(self.endpoints)}
+            return sorted(
+                self.endpoints,
+                key=lambda endpoint: (endpoint in exclude, self.score(endpoint, now), order[endpoint]),
+            )
+
+    def best(self, exclude=()):
+        """
+        当前最优节点
+
+        Args:
+            exclude: 本次运行中已失败、应尽量避开的节点
+
+        Returns:
+            PortalEndpoint: 节点
+        """
+        return self.ranked(exclude)[0]
+
+    def record_success(self, endpoint, rtt):
+        """
+        记录一次成功请求
+
+        Args:
+            endpoint: PortalEndpoint实例
+            rtt: 请求耗时(秒)
+        """
+        with self._lock:
+            stats = self._stats.setdefault(endpoint.base_url, {})
+            stats["rtt"] = _ewma(stats.get("rtt"), rtt)
+            stats["error_rate"] = _ewma(stats.get("error_rate"), 0.0)
+            stats["samples"] = stats.get("samples", 0) + 1
+            self._save_state()
+
+    def record_failure(self, endpoint):
+        """
+        记录一次失败请求（超时、连接错误或服务器错误）
+
+        Args:
+            endpoint: PortalEndpoint实例
+        """
+        with self._lock:
+            stats = self._stats.setdefault(endpoint.base_url, {})
+            stats["error_rate"] = _ewma(stats.get("error_rate"), 1.0)
+            stats["last_failure"] = get_clock().time()
+            stats["samples"] = stats.get("samples", 0) + 1
+            self._save_state()
+        logger.warning(f"门户节点 {endpoint.base_url} 请求失败，错误率 {stats['error_rate']:.2f}")
+
+    def snapshot(self):
+        """
+        导出各节点的统计数据
+
+        Returns:
+            dict: 节点地址到统计数据的映射
+        """
+        with self._lock:
+            return {
+                endpoint.base_url: dict(self._stats.get(endpoint.base_url) or {}, score=self.score(endpoint))
+                for endpoint in self.endpoints
+            }
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except Exception as e:
+            logger.warning(f"读取门户节点统计失败: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._stats, f, indent=4)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"保存门户节点统计失败: {e}")
+
+
+def _ewma(previous, sample):
+    if previous is None:
+        return sample
+    return (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * sample
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程内事件总线
+
+登录流程只负责发布事件，通知、控制接口推送等消费方作为订阅者在各自的工作线程中
+处理。每个订阅者有独立的有界队列：发布只是入队，从不等待订阅者；订阅者处理不过来时
+丢弃其最旧的事件并计数，其他订阅者和登录流程不受影响，因此增加消费方不会增加登录耗时。
+同一订阅者按发布顺序逐个处理事件。
+
+登录相关的事件类型及数据字段：
+- probe_result: 在线状态探测结果，online
+- attempt_started: 开始用某个账号登录，account、interface、index
+- login_succeeded / login_failed: 一次登录运行结束，outcome、message、error_code、ip、
+  account（成功时为登录所用账号，失败时为最后尝试的账号）、duration、forced、trace_id
+- deauth_detected: 常驻服务检测到认证会话掉线
+"""
+
+import time
+import threading
+import logging
+from collections import deque, namedtuple
+
+from clock import get_clock
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.events')
+
+PROBE_RESULT = "probe_result"
+ATTEMPT_STARTED = "attempt_started"
+LOGIN_SUCCEEDED = "login_succeeded"
+LOGIN_FAILED = "login_failed"
+DEAUTH_DETECTED = "deauth_detected"
+
+EVENT_TYPES = (PROBE_RESULT, ATTEMPT_STARTED, LOGIN_SUCCEEDED, LOGIN_FAILED, DEAUTH_DETECTED)
+
+# 每个订阅者队列的默认容量
+DEFAULT_QUEUE_SIZE = 256
+# 进程退出前等待订阅者处理完事件的默认时间(秒)
+DEFAULT_FLUSH_TIMEOUT = 30
+
+Event = namedtuple("Event", ["type", "at", "data"])
+
+
+class Subscription:
+    """一个订阅者：有界队列加一个按顺序处理事件的工作线程"""
+
+    def __init__(self, handler, types=None, name=None, maxsize=DEFAULT_QUEUE_SIZE):
+        """
+        初始化订阅并启动工作线程
+
+        Args:
+            handler: 处理函数，参数为Event
+            types: 订阅的事件类型，为空时订阅全部事件
+            name: 订阅者名称，用于日志和指标
+            maxsize: 队列容量，队列满时丢弃最旧的事件
+        """
+        self.handler = handler
+        self.types = frozenset(types) if types else None
+        self.name = name or getattr(handler, "__name__", "subscriber")
+        self.maxsize = max(1, int(maxsize))
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = deque()
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"events-{self.name}", daemon=True)
+        self._thread.start()
+
+    def accepts(self, event_type):
+        return self.types is None or event_type in self.types
+
+    def offer(self, event):
+        """
+        将事件放入队列，从不阻塞
+
+        Args:
+            event: Event
+
+        Returns:
+            bool: 是否因队列已满丢弃了最旧的事件
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            overflow = len(self._queue) >= self.maxsize
+            if overflow:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify_all()
+        if overflow:
+            logger.debug(f"订阅者 {self.name} 处理不及，丢弃最旧的事件")
+        return overflow
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                event = self._queue.popleft()
+                self._busy = True
+            try:
+                self.handler(event)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"订阅者 {self.name} 处理事件 {event.type} 失败: {e}")
+            with self._cond:
+                self._busy = False
+                self.delivered += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        等待队列中的事件处理完成
+
+        Args:
+            timeout: 最长等待时间(秒)，为空时一直等待
+
+        Returns:
+            bool: 是否已全部处理
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                if self._closed and not self._thread.is_alive():
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._queue and not self._busy
+
+    def close(self, timeout=None):
+        """
+        停止接收新事件，等待已入队的事件处理完后结束工作线程
+
+        Args:
+            timeout: 最长等待时间(秒)，为空时一直等待
+
+        Returns:
+            bool: 工作线程是否已结束
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 队列中的事件数、已处理数、丢弃数和处理失败数
+        """
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+class EventBus:
+    """进程内事件总线"""
+
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler, types=None, name=None, maxsize=DEFAULT_QUEUE_SIZE):
+        """
+        注册订阅者
+
+        Args:
+            handler: 处理函数，参数为Event，在订阅者自己的工作线程中调用
+            types: 订阅的事件类型，为空时订阅全部事件
+            name: 订阅者名称
+            maxsize: 队列容量
+
+        Returns:
+            Subscription: 订阅，可用于unsubscribe()
+        """
+        subscription = Subscription(handler, types=types, name=name, maxsize=maxsize)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription, timeout=None):
+        """
+        取消订阅，已入队的事件仍会处理完
+
+        Args:
+            subscription: subscribe()返回的订阅
+            timeout: 等待工作线程结束的最长时间(秒)
+        """
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+        subscription.close(timeout)
+
+    def publish(self, event_type, **data):
+        """
+        发布事件，只入队不等待订阅者处理
+
+        Args:
+            event_type: 事件类型
+            **data: 事件数据
+
+        Returns:
+            Event: 发布的事件
+        """
+        event = Event(event_type, get_clock().time(), data)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.accepts(event_type):
+                subscription.offer(event)
+        return event
+
+    def flush(self, timeout=DEFAULT_FLUSH_TIMEOUT):
+        """
+        等待所有订阅者处理完已发布的事件
+
+        Args:
+            timeout: 最长等待时间(秒)，为空时一直等待
+
+        Returns:
+            bool: 是否已全部处理
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not subscription.flush(remaining):
+                logger.warning(f"订阅者 {subscription.name} 未能在限定时间内处理完事件")
+                return False
+        return True
+
+    def close(self, timeout=DEFAULT_FLUSH_TIMEOUT):
+        """
+        处理完已发布的事件后停止所有订阅者
+
+        Args:
+            timeout: 等待的最长时间(秒)
+
+        Returns:
+            bool: 是否已全部处理
+        """
+        flushed = self.flush(timeout)
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close(0 if not flushed else None)
+        return flushed
+
+    def snapshot(self):
+        """
+        导出各订阅者的状态
+
+        Returns:
+            dict: 订阅者名称到其状态的映射
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return {subscription.name: subscription.snapshot() for subscription in subscriptions}
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+局域网网关模式：由一台主机为局域网内无法运行本工具的设备完成校园网认证
+
+接口（JSON）：
+- POST /login    {"ip": "设备IP，默认为请求方地址", "account": "学号或别名，可选", "force": false, "wait": true}
+- GET  /sessions 所有设备的会话状态
+- GET  /sessions/<ip> 单个设备的会话状态
+
+同一设备的重复请求会合并到正在进行的登录；登录在固定大小的线程池中执行，
+排队数量和会话缓存大小都有上限，内存和CPU占用不随设备数增长。
+
+网关使用本机配置的账号为任意IP登录，并能列出所有设备的IP和账号，因此默认只监听回环地址；
+监听其他地址时必须设置访问令牌，并在gateway_allowed_networks中显式配置局域网网段。
+"""
+
+import json
+import time
+import hmac
+import socket
+import threading
+import ipaddress
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from portal import ePortal, ACCOUNT_ERRORS
+from accounts import AccountPool
+from tracing import get_tracer
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.gateway')
+
+DEFAULT_LISTEN = "127.0.0.1:8765"
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_CACHE_SIZE = 1024
+# 设备登录成功后在该时间(秒)内的重复请求直接返回缓存结果
+DEFAULT_CACHE_TTL = 600
+# 默认只接受本机的请求，局域网网段需显式配置
+DEFAULT_ALLOWED_NETWORKS = ("127.0.0.0/8", "::1/128")
+# wait=true时等待登录完成的最长时间(秒)
+WAIT_TIMEOUT = 60
+MAX_BODY_SIZE = 4096
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+
+class GatewayError(Exception):
+    """网关请求无法受理"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class GatewayJob:
+    """单个设备的一次登录任务"""
+
+    def __init__(self, ip, account, force):
+        self.ip = ip
+        self.account = account
+        self.force = force
+        self.state = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.result = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "result": self.result,
+        }
+
+
+class LoginGateway:
+    """为局域网设备排队、去重并执行登录，缓存各设备的会话状态"""
+
+    def __init__(self, auto_login, max_workers=DEFAULT_MAX_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                 cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
+        """
+        初始化网关
+
+        Args:
+            auto_login: AutoLogin实例，提供配置、门户节点选择器和熔断器
+            max_workers: 同时进行的登录数
+            max_queue: 排队和进行中的登录数上限，超出时拒绝新请求
+            cache_size: 缓存会话状态的设备数上限，超出时淘汰最久未使用的设备
+            cache_ttl: 登录成功后直接返回缓存结果的时间(秒)
+        """
+        self.auto_login = auto_login
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gateway")
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._inflight = {}
+        self._sessions = OrderedDict()
+
+    @classmethod
+    def from_config(cls, auto_login):
+        """
+        根据配置创建网关
+
+        Args:
+            auto_login: AutoLogin实例
+
+        Returns:
+            LoginGateway: 网关
+        """
+        config = auto_login.config
+        return cls(
+            auto_login,
+            max_workers=config.gateway_max_workers,
+            max_queue=config.gateway_max_queue,
+            cache_size=config.gateway_cache_size,
+            cache_ttl=config.gateway_cache_ttl,
+        )
+
+    def submit(self, ip, account=None, force=False):
+        """
+        提交设备登录请求；同一设备已有登录在进行时返回该任务，近期已登录成功时返回缓存结果
+
+        Args:
+            ip: 设备IP
+            account: 学号或别名，为空时按账号池顺序选择
+            force: 是否忽略缓存重新登录
+
+        Returns:
+            GatewayJob: 登录任务
+
+        Raises:
+            GatewayError: 排队已满
+        """
+        with self._lock:
+            job = self._inflight.get(ip)
+            if job is not None:
+                return job
+
+            session = self._sessions.get(ip)
+            if (not force and session and session["success"]
+                    and time.time() - session["finished_at"] < self.cache_ttl):
+                self._sessions.move_to_end(ip)
+                job = GatewayJob(ip, account, force)
+                job.state = JOB_DONE
+                job.result = dict(session, cached=True)
+                job.done.set()
+                return job
+
+            if len(self._inflight) >= self.max_queue:
+                raise GatewayError("登录请求过多，请稍后再试", status=503)
+            job = GatewayJob(ip, account, force)
+            self._inflight[ip] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.state = JOB_RUNNING
+        started_at = time.time()
+        trace_id = None
+        try:
+            with get_tracer().trace("gateway_login", device=job.ip) as span:
+                trace_id = span.trace_id
+                success, message, error_code, account = self._login(job)
+                span.set("error_code", error_code)
+        except Exception as e:
+            logger.exception(f"设备 {job.ip} 登录时发生异常: {e}")
+            success, message, error_code, account = False, str(e), None, None
+        # 对冲的耗时样本和预算在进程内累积，每次登录结束后写入状态文件
+        hedge = self.auto_login.get_hedge_policy()
+        if hedge is not None:
+            hedge.flush()
+
+        finished_at = time.time()
+        result = {
+            "ip": job.ip,
+            "success": success,
+            "message": message,
+            "error_code": error_code,
+            "account": account,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "duration": round(finished_at - started_at, 4),
+            "trace_id": trace_id,
+        }
+        with self._lock:
+            previous = self._sessions.pop(job.ip, None)
+            result["logins"] = (previous or {}).get("logins", 0) + 1
+            self._sessions[job.ip] = result
+            while len(self._sessions) > self.cache_size:
+                self._sessions.popitem(last=False)
+            del self._inflight[job.ip]
+        job.result = result
+        job.state = JOB_DONE
+        job.done.set()
+        if success:
+            logger.info(f"设备 {job.ip} 登录成功(账号 {account})")
+        else:
+            logger.warning(f"设备 {job.ip} 登录失败: {message}")
+
+    def _login(self, job):
+        """
+        为设备执行登录，未指定账号时遇到账号级错误切换到下一个账号
+
+        Returns:
+            tuple: (是否成功, 消息, 错误码, 账号学号)
+        """
+        auto_login = self.auto_login
+        with self._pool_lock:
+            pool = AccountPool.from_config(auto_login.config)
+        if job.account:
+            account = pool.find(job.account)
+            if account is None:
+                return False, f"未找到账号: {job.account}", "unknown_account", None
+            accounts = [account]
+        else:
+            accounts = pool.available()
+            if not accounts:
+                return False, "所有账号均处于不可用状态", "accounts_exhausted", None
+
+        success, message, error_code = False, "登录失败", None
+        for account in accounts:
+            portal = ePortal(
+                account.student_id,
+                account.password,
+                selector=auto_login.get_endpoint_selector(),
+                breaker=auto_login.get_breaker(),
+                wlan_user_ip=job.ip,
+                engine=auto_login.config.http_engine,
+                profiles=auto_login.get_profile_cache(),
+                hedge=auto_login.get_hedge_policy(),
+            )
+            try:
+                success, message = portal.login(check_status=False)
+            finally:
+                portal.close()
+            error_code = None if success else portal.last_error_code
+            if success or error_code not in ACCOUNT_ERRORS:
+                break
+            if not job.account:
+                # 其他任务可能已更新账号状态，基于最新状态标记，避免覆盖
+                with self._pool_lock:
+                    AccountPool.from_config(auto_login.config).mark_exhausted(account, error_code, message)
+        return success, message, error_code, account.student_id
+
+    def session(self, ip):
+        """
+        获取设备的会话状态
+
+        Args:
+            ip: 设备IP
+
+        Returns:
+            dict: 会话状态，正在登录时包含pending字段；未知设备返回None
+        """
+        with self._lock:
+            session = self._sessions.get(ip)
+            pending = ip in self._inflight
+        if session is None and not pending:
+            return None
+        return dict(session or {"ip": ip}, pending=pending)
+
+    def sessions(self):
+        """
+        导出所有设备的会话状态和队列情况
+
+        Returns:
+            dict: 会话列表和进行中的任务数
+        """
+        with self._lock:
+            return {
+                "inflight": len(self._inflight),
+                "sessions": list(self._sessions.values()),
+            }
+
+    def shutdown(self):
+        """停止接受新任务并等待进行中的登录完成"""
+        self._executor.shutdown(wait=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """网关HTTP接口"""
+
+    server_version = "AutoNet4AHU-Gateway"
+
+    def do_GET(self):
+        if not self._authorize():
+            return
+        gateway = self.server.gateway
+        if self.path == "/sessions":
+            self._send(200, gateway.sessions())
+            return
+        if self.path.startswith("/sessions/"):
+            session = gateway.session(self.path[len("/sessions/"):])
+            if session is None:
+                self._send(404, {"error": "未知设备"})
+            else:
+                self._send(200, session)
+            return
+        self._send(404, {"error": "未知接口"})
+
+    def do_POST(self):
+        if not self._authorize():
+            return
+        if self.path != "/login":
+            self._send(404, {"error": "未知接口"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_SIZE:
+                raise GatewayError("请求体过大", status=413)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise GatewayError("请求体必须是JSON对象")
+            ip = _parse_device_ip(body.get("ip") or _client_ip(self.client_address[0]))
+            job = self.server.gateway.submit(ip, body.get("account"), bool(body.get("force")))
+        except GatewayError as e:
+            self._send(e.status, {"error": str(e)})
+            return
+        except ValueError:
+            self._send(400, {"error": "无法解析请求"})
+            return
+
+        if body.get("wait", True):
+            job.done.wait(WAIT_TIMEOUT)
+        if job.state == JOB_DONE:
+            self._send(200 if job.result["success"] else 502, job.to_dict())
+        else:
+            self._send(202, job.to_dict())
+
+    def _authorize(self):
+        """检查请求方地址和访问令牌"""
+        client = _client_ip(self.client_address[0])
+        if not any(client in network for network in self.server.allowed_networks):
+            self._send(403, {"error": "不允许的来源地址"})
+            return False
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            self._send(401, {"error": "访问令牌无效"})
+            return False
+        return True
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+def _client_ip(address):
+    """解析请求方地址，IPv4映射的IPv6地址还原为IPv4地址"""
+    client = ipaddress.ip_address(address.split("%")[0])
+    if client.version == 6 and client.ipv4_mapped:
+        return client.ipv4_mapped
+    return client
+
+
+def _is_loopback(host):
+    """监听地址是否只在本机可达，主机名按localhost处理"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _parse_device_ip(value):
+    """校验设备IPv4地址"""
+    try:
+        return str(ipaddress.IPv4Address(str(value).strip()))
+    except ValueError:
+        raise GatewayError(f"无效的设备IP: {value}")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _Server6(_Server):
+    address_family = socket.AF_INET6
+
+
+class GatewayServer:
+    """网关HTTP服务端"""
+
+    def __init__(self, gateway, listen=DEFAULT_LISTEN, allowed_networks=DEFAULT_ALLOWED_NETWORKS, token=None):
+        """
+        初始化网关服务端
+
+        Args:
+            gateway: LoginGateway实例
+            listen: 监听地址，格式为"主机:端口"
+            allowed_networks: 允许访问的来源网络列表
+            token: 访问令牌，设置后请求需携带"Authorization: Bearer <token>"；监听非回环地址时必须设置
+
+        Raises:
+            ValueError: 监听地址无效，或监听非回环地址但未设置访问令牌
+        """
+        host, _, port = listen.rpartition(":")
+        host = host.strip("[]") or "0.0.0.0"
+        if not _is_loopback(host):
+            if not token:
+                raise ValueError(f"网关监听非回环地址 {host} 时必须设置gateway_token")
+            if all(ipaddress.ip_network(network).is_loopback for network in allowed_networks):
+                logger.warning("gateway_allowed_networks只包含回环地址，局域网设备的请求都会被拒绝，请配置局域网网段")
+        server_class = _Server6 if ":" in host else _Server
+        self._server = server_class((host, int(port)), _Handler)
+        self._server.gateway = gateway
+        self._server.allowed_networks = [ipaddress.ip_network(network) for network in allowed_networks]
+        self._server.token = token
+        self.gateway = gateway
+        self.address = self._server.server_address
+
+    @classmethod
+    def from_config(cls, auto_login):
+        """
+        根据配置创建网关服务端
+
+        Args:
+            auto_login: AutoLogin实例
+
+        Returns:
+            GatewayServer: 服务端
+        """
+        config = auto_login.config
+        return cls(
+            LoginGateway.from_config(auto_login),
+            listen=config.gateway_listen,
+            allowed_networks=config.gateway_allowed_networks,
+            token=config.gateway_token,
+        )
+
+    def serve_forever(self):
+        """运行服务端，直到调用shutdown()"""
+        logger.info(f"网关服务已启动: {self.address[0]}:{self.address[1]}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.gateway.shutdown()
+
+    def shutdown(self):
+        """停止服务端，可在其他线程中调用"""
+        self._server.shutdown()
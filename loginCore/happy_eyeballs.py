@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+双栈网络下的Happy Eyeballs连接（RFC 8305）
+
+域名同时解析出IPv6和IPv4地址时交替发起连接，每次尝试间隔一小段时间，
+哪个协议栈先连通就使用哪个，避免某一协议栈不通时等待整个连接超时。
+"""
+
+import time
+import errno
+import socket
+import selectors
+import ipaddress
+import logging
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.happy_eyeballs')
+
+# 相邻两次连接尝试的间隔(秒)，RFC 8305建议250毫秒
+DEFAULT_ATTEMPT_DELAY = 0.25
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+def _interleave(infos):
+    """按首选地址族开始交替排列IPv6和IPv4地址"""
+    if not infos:
+        return []
+    first_family = infos[0][0]
+    preferred = [info for info in infos if info[0] == first_family]
+    others = [info for info in infos if info[0] != first_family]
+    ordered = []
+    while preferred or others:
+        if preferred:
+            ordered.append(preferred.pop(0))
+        if others:
+            ordered.append(others.pop(0))
+    return ordered
+
+
+def _family_of(host):
+    try:
+        return socket.AF_INET6 if ipaddress.ip_address(host).version == 6 else socket.AF_INET
+    except ValueError:
+        return None
+
+
+def happy_eyeballs_connect(host, port, timeout=None, source_address=None, delay=DEFAULT_ATTEMPT_DELAY):
+    """
+    建立TCP连接，多个地址时按Happy Eyeballs方式竞速
+
+    Args:
+        host: 主机名或IP地址
+        port: 端口
+        timeout: 总超时时间(秒)，也作为返回套接字的读写超时
+        source_address: 绑定的本地地址(host, port)，只用于相同地址族的连接
+        delay: 相邻两次连接尝试的间隔(秒)
+
+    Returns:
+        socket.socket: 已连接的套接字
+
+    Raises:
+        socket.timeout: 超时前没有任何地址连通
+        OSError: 所有地址均连接失败
+    """
+    infos = _interleave(socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM))
+    if not infos:
+        raise OSError(f"无法解析地址: {host}")
+
+    source_family = _family_of(source_address[0]) if source_address else None
+    deadline = None if timeout is None else time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    pending = []
+    errors = []
+    winner = None
+    next_attempt_at = time.monotonic()
+
+    try:
+        while winner is None and (infos or pending):
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise socket.timeout(f"连接 {host}:{port} 超时")
+
+            if infos and (now >= next_attempt_at or not pending):
+                family, sock_type, proto, _, sockaddr = infos.pop(0)
+                if source_family is not None and family != source_family:
+                    continue
+                sock = socket.socket(family, sock_type, proto)
+                try:
+                    if source_address:
+                        sock.bind(source_address)
+                    sock.setblocking(False)
+                    error = sock.connect_ex(sockaddr)
+                except OSError as e:
+                    sock.close()
+                    errors.append(e)
+                    continue
+                if error == 0:
+                    winner = sock
+                    break
+                if error not in _IN_PROGRESS:
+                    sock.close()
+                    errors.append(OSError(error, f"连接 {sockaddr[0]} 失败"))
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                pending.append(sock)
+                next_attempt_at = now + delay
+
+            wait = next_attempt_at - now if infos else None
+            if deadline is not None:
+                remaining = deadline - now
+                wait = remaining if wait is None else min(wait, remaining)
+            for key, _ in selector.select(None if wait is None else max(0.0, wait)):
+                sock = key.fileobj
+                selector.unregister(sock)
+                pending.remove(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    winner = sock
+                    logger.debug(f"Happy Eyeballs: {key.data[0]} 先连通")
+                    break
+                sock.close()
+                errors.append(OSError(error, f"连接 {key.data[0]} 失败"))
+                # 有尝试失败时立即发起下一次尝试
+                next_attempt_at = time.monotonic()
+    finally:
+        for sock in pending:
+            if sock is not winner:
+                sock.close()
+        selector.close()
+
+    if winner is None:
+        raise errors[-1] if errors else OSError(f"连接 {host}:{port} 失败")
+    winner.setblocking(True)
+    winner.settimeout(timeout)
+    return winner
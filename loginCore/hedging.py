@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+登录请求的对冲（hedged request）
+
+门户负载高时，个别登录请求会一直挂起到超时，而紧接着的重试却立即成功。对冲请求在
+首个请求超过自适应阈值（默认为历史登录请求耗时的p95）仍未响应时，通过另一条连接
+发出相同的第二个请求，采用先返回的响应并中断另一个。对冲次数受预算限制：每个登录
+请求积累max_rate个额度，每次对冲消耗1个，因此对冲请求占比不会超过max_rate，门户
+负载有界。耗时样本和预算在进程内累积，每次登录运行结束时调用flush()合并写入状态目录
+一次，由所有登录进程共享。
+"""
+
+import os
+import json
+import math
+import time
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+
+from paths import get_state_dir
+from transport import CancelHandle
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 非POSIX平台
+    fcntl = None
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.hedging')
+
+# 用于计算阈值的百分位
+DEFAULT_PERCENTILE = 95
+# 对冲请求占登录请求的比例上限
+DEFAULT_MAX_RATE = 0.1
+# 保留的耗时样本数
+DEFAULT_WINDOW = 128
+# 样本不足时使用的阈值(秒)
+DEFAULT_DELAY = 2.0
+# 样本数达到该值后使用自适应阈值
+MIN_SAMPLES = 20
+# 自适应阈值的上下限(秒)
+MIN_DELAY = 0.2
+MAX_DELAY = 5.0
+# 预算上限，即连续对冲的最大次数
+MAX_BUDGET = 1.0
+
+OUTCOME_PRIMARY = "primary"
+OUTCOME_HEDGE = "hedge"
+
+
+def _empty_changes():
+    return {"latencies": [], "budget": 0.0, "requests": 0, "hedges": 0, "hedge_wins": 0}
+
+
+class HedgePolicy:
+    """对冲策略：决定何时发出对冲请求，并限制对冲比例"""
+
+    def __init__(self, state_file=None, delay=None, percentile=DEFAULT_PERCENTILE,
+                 max_rate=DEFAULT_MAX_RATE, window=DEFAULT_WINDOW):
+        """
+        初始化对冲策略
+
+        Args:
+            state_file: 状态文件路径，默认保存在状态目录
+            delay: 固定的对冲阈值(秒)，为空时按历史耗时自适应
+            percentile: 自适应阈值使用的百分位
+            max_rate: 对冲请求占登录请求的比例上限
+            window: 保留的耗时样本数
+        """
+        self.state_file = state_file or os.path.join(get_state_dir(), "hedge.json")
+        self.delay = delay
+        self.percentile = percentile
+        self.max_rate = max(0.0, max_rate)
+        self.window = max(1, int(window))
+        self._lock = threading.Lock()
+        # 进程内的状态，首次使用时从状态文件读取
+        self._state = None
+        # 上次读取状态文件以来的变化，flush()时合并到状态文件
+        self._pending = _empty_changes()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        根据配置创建对冲策略
+
+        Args:
+            config: 配置字典或ConfigSnapshot
+
+        Returns:
+            HedgePolicy: 对冲策略，配置为不启用时返回None
+        """
+        if not config.hedge:
+            return None
+        return cls(
+            delay=config.hedge_delay,
+            percentile=config.hedge_percentile,
+            max_rate=config.hedge_max_rate,
+        )
+
+    def threshold(self, state=None):
+        """
+        计算对冲阈值
+
+        Args:
+            state: 已读取的状态，为空时使用进程内的状态
+
+        Returns:
+            float: 首个请求超过该时间(秒)未响应时发出对冲请求
+        """
+        if self.delay is not None:
+            return self.delay
+        if state is None:
+            with self._lock:
+                samples = sorted(self._memory()["latencies"])
+        else:
+            samples = sorted(state["latencies"])
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_DELAY
+        index = min(len(samples) - 1, max(0, math.ceil(self.percentile / 100 * len(samples)) - 1))
+        return min(MAX_DELAY, max(MIN_DELAY, samples[index]))
+
+    def begin(self):
+        """
+        记录一次登录请求并积累对冲预算
+
+        Returns:
+            float: 本次请求的对冲阈值(秒)
+        """
+        with self._lock:
+            state = self._memory()
+            budget = min(MAX_BUDGET, state["budget"] + self.max_rate)
+            self._change(state, requests=1, budget=budget - state["budget"])
+            return self.threshold(state)
+
+    def acquire(self):
+        """
+        申请发出一次对冲请求
+
+        Returns:
+            bool: 预算充足时消耗预算并返回True
+        """
+        with self._lock:
+            state = self._memory()
+            if state["budget"] < 1:
+                return False
+            self._change(state, budget=-1, hedges=1)
+            return True
+
+    def record(self, latency, outcome=None):
+        """
+        记录登录请求的耗时
+
+        Args:
+            latency: 从首个请求发出到响应返回的耗时(秒)
+            outcome: 对冲结果，OUTCOME_PRIMARY或OUTCOME_HEDGE，未对冲时为None
+        """
+        latency = round(latency, 4)
+        with self._lock:
+            state = self._memory()
+            state["latencies"] = (state["latencies"] + [latency])[-self.window:]
+            self._pending["latencies"] = (self._pending["latencies"] + [latency])[-self.window:]
+            if outcome == OUTCOME_HEDGE:
+                self._change(state, hedge_wins=1)
+
+    def flush(self):
+        """
+        将进程内累积的变化合并写入状态文件，每次登录运行结束时调用一次；
+        其他进程在此期间写入的样本和预算变化会一并保留
+        """
+        with self._lock:
+            pending = self._pending
+            if pending == _empty_changes():
+                return
+            try:
+                with self._locked_state() as state:
+                    for key in ("requests", "hedges", "hedge_wins"):
+                        state[key] += pending[key]
+                    state["budget"] = min(MAX_BUDGET, state["budget"] + pending["budget"])
+                    state["latencies"] = (state["latencies"] + pending["latencies"])[-self.window:]
+            except OSError as e:
+                logger.warning(f"保存对冲状态失败: {e}")
+                return
+            self._state = state
+            self._pending = _empty_changes()
+
+    def _memory(self):
+        # 调用方持有self._lock
+        if self._state is None:
+            self._state = self._read()
+        return self._state
+
+    def _change(self, state, **changes):
+        # 同时修改进程内的状态和待合并的变化，调用方持有self._lock
+        for key, value in changes.items():
+            state[key] += value
+            self._pending[key] += value
+
+    def get(self, transport, create_transport, url, params=None, headers=None, timeout=10):
+        """
+        发送可对冲的GET请求
+
+        Args:
+            transport: 首个请求使用的HTTP传输
+            create_transport: 无参函数，为对冲请求创建独立的HTTP传输（独立的连接）
+            url: 请求地址
+            params: 查询参数
+            headers: 请求头
+            timeout: 单个请求的超时时间(秒)
+
+        Returns:
+            tuple: (响应, 对冲结果)，对冲结果为OUTCOME_PRIMARY、OUTCOME_HEDGE或未对冲时为None
+
+        Raises:
+            TransportError: 所有请求都失败时抛出最后一个请求的异常
+        """
+        delay = self.begin()
+        results = queue.Queue()
+        # 每个请求有自己的取消句柄，中断时只关闭该请求的连接，不影响调用方传输中的其他连接
+        cancels = {OUTCOME_PRIMARY: CancelHandle(), OUTCOME_HEDGE: CancelHandle()}
+        # 耗时从首个请求发出时算起，对冲胜出时也包含等待对冲阈值的时间
+        start = time.perf_counter()
+
+        def send(name, request_transport):
+            try:
+                response = request_transport.get(url, params=params, headers=headers, timeout=timeout,
+                                                 cancel=cancels[name])
+            except Exception as e:
+                results.put((name, None, e, None))
+                return
+            results.put((name, response, None, time.perf_counter() - start))
+
+        # 请求在守护线程中发出，被放弃的请求不会阻止进程退出
+        threading.Thread(target=send, args=(OUTCOME_PRIMARY, transport), name="login-primary", daemon=True).start()
+        try:
+            name, response, error, latency = results.get(timeout=delay)
+        except queue.Empty:
+            name = None
+        if name is not None:
+            return self._finish(response, error, latency, None)
+        if not self.acquire():
+            logger.debug("对冲预算不足，继续等待首个请求")
+            return self._finish(*results.get()[1:], None)
+
+        logger.info(f"登录请求 {delay:.2f} 秒未响应，通过新连接发出对冲请求")
+        hedge_transport = create_transport()
+        threading.Thread(target=send, args=(OUTCOME_HEDGE, hedge_transport), name="login-hedge", daemon=True).start()
+        try:
+            name, response, error, latency = results.get()
+            if error is not None:
+                # 先返回的请求失败时等待另一个
+                name, response, error, latency = results.get()
+        finally:
+            # 中断仍在进行的另一个请求，已结束的请求不受影响
+            for other, cancel in cancels.items():
+                if other != name:
+                    cancel.cancel()
+            hedge_transport.close()
+        return self._finish(response, error, latency, name)
+
+    def _finish(self, response, error, latency, outcome):
+        if error is not None:
+            raise error
+        if response.status_code < 500:
+            self.record(latency, outcome)
+        return response, outcome
+
+    def snapshot(self):
+        """
+        导出对冲策略状态
+
+        Returns:
+            dict: 当前阈值、样本数、登录请求数、对冲次数、对冲胜出次数和剩余预算
+        """
+        with self._lock:
+            state = dict(self._memory())
+        return {
+            "threshold": round(self.threshold(state), 3),
+            "samples": len(state["latencies"]),
+            "requests": state["requests"],
+            "hedges": state["hedges"],
+            "hedge_wins": state["hedge_wins"],
+            "budget": round(state["budget"], 3),
+        }
+
+    def _read(self):
+        # 首次运行时给予一次对冲的预算
+        state = {"latencies": [], "budget": MAX_BUDGET, "requests": 0, "hedges": 0, "hedge_wins": 0}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if isinstance(stored, dict):
+                state.update(stored)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取对冲状态失败: {e}")
+        if not isinstance(state["latencies"], list):
+            state["latencies"] = []
+        return state
+
+    def _write(self, state):
+        tmp_path = f"{self.state_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"保存对冲状态失败: {e}")
+
+    @contextmanager
+    def _locked_state(self):
+        """在进程间文件锁内读取、修改并写回状态"""
+        fd = None
+        if fcntl is not None:
+            fd = os.open(f"{self.state_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            state = self._read()
+            yield state
+            self._write(state)
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
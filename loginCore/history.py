@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import math
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+from clock import get_clock
+from paths import get_state_dir
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.history')
+
+# 登录运行结果
+OUTCOME_ONLINE = "already_online"
+OUTCOME_LOGGED_IN = "logged_in"
+OUTCOME_FAILED = "failed"
+
+DEFAULT_RETENTION_DAYS = 90
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS login_runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    account TEXT,
+    ip TEXT,
+    error_code TEXT,
+    message TEXT,
+    phases TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_login_runs_started ON login_runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_login_runs_outcome ON login_runs (outcome, started_at, duration);
+CREATE INDEX IF NOT EXISTS idx_login_runs_error ON login_runs (error_code, started_at);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    last_seen_at REAL NOT NULL,
+    ended_at REAL,
+    end_reason TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_open ON sessions (ended_at, started_at);
+"""
+
+# 会话结束原因
+END_DEAUTH = "deauth"
+END_OFFLINE = "offline"
+END_RELOGIN = "relogin"
+
+# 这些错误说明设备离开了校园网，而不是被门户踢下线
+_OFFLINE_ERRORS = frozenset(["network_unavailable", "not_on_campus"])
+
+
+class LoginHistory:
+    """基于SQLite的登录历史记录，支持按时间窗口的聚合统计"""
+
+    def __init__(self, db_path=None, retention_days=DEFAULT_RETENTION_DAYS):
+        """
+        初始化登录历史记录
+
+        Args:
+            db_path: 数据库文件路径，默认保存在状态目录
+            retention_days: 记录保留天数，超出后自动清理
+        """
+        self.db_path = db_path or os.path.join(get_state_dir(), "history.db")
+        self.retention_days = retention_days
+        self._conn = None
+        # 连接由常驻服务主循环、控制接口和网关等多个线程共享，所有访问都在锁内进行
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _connect(self):
+        """
+        在锁内使用数据库连接，首次使用时打开连接并初始化表结构
+
+        Yields:
+            sqlite3.Connection: 数据库连接
+        """
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(_SCHEMA)
+                self._conn = conn
+            yield self._conn
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def record(self, started_at, duration, outcome, account=None, ip=None,
+               error_code=None, message=None, phases=None):
+        """
+        记录一次登录运行的结果，并清理超出保留期的记录
+
+        Args:
+            started_at: 开始时间(Unix时间戳)
+            duration: 总耗时(秒)
+            outcome: 运行结果，OUTCOME_*之一
+            account: 本次使用的账号
+            ip: 登录使用的IP地址
+            error_code: 失败时的错误码
+            message: 结果信息
+            phases: 各阶段耗时列表
+        """
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO login_runs (started_at, duration, outcome, success, account, ip, "
+                "error_code, message, phases) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    started_at, duration, outcome, int(outcome != OUTCOME_FAILED), account, ip,
+                    error_code, message, json.dumps(phases or [], ensure_ascii=False),
+                ),
+            )
+        self.prune()
+
+    def prune(self, retention_days=None):
+        """
+        删除超出保留期的记录
+
+        Args:
+            retention_days: 保留天数，默认使用初始化时的设置
+
+        Returns:
+            int: 删除的记录数
+        """
+        days = self.retention_days if retention_days is None else retention_days
+        if not days or days <= 0:
+            return 0
+        cutoff = get_clock().time() - days * 86400
+        with self._connect() as conn, conn:
+            cursor = conn.execute("DELETE FROM login_runs WHERE started_at < ?", (cutoff,))
+            conn.execute("DELETE FROM sessions WHERE ended_at < ?", (cutoff,))
+        if cursor.rowcount:
+            logger.debug(f"已清理 {cursor.rowcount} 条过期登录记录")
+        return cursor.rowcount
+
+    def report(self, since, until=None):
+        """
+        统计时间窗口内的登录情况
+
+        Args:
+            since: 窗口起始时间(Unix时间戳)
+            until: 窗口结束时间(Unix时间戳)，默认为当前时间
+
+        Returns:
+            dict: 统计结果，包括运行次数、成功率（未失败的运行占比）、登录耗时分位数和按原因分类的失败次数
+        """
+        until = get_clock().time() if until is None else until
+        window = (since, until)
+
+        with self._connect() as conn:
+            counts = dict(conn.execute(
+                "SELECT outcome, COUNT(*) FROM login_runs "
+                "WHERE started_at >= ? AND started_at < ? GROUP BY outcome",
+                window,
+            ).fetchall())
+            total = sum(counts.values())
+            failed = counts.get(OUTCOME_FAILED, 0)
+
+            latency_count = counts.get(OUTCOME_LOGGED_IN, 0)
+            latency = {
+                name: self._percentile(conn, window, latency_count, q)
+                for name, q in (("p50", 0.50), ("p95", 0.95))
+            }
+
+            failures = conn.execute(
+                "SELECT COALESCE(error_code, 'unknown'), COUNT(*) FROM login_runs "
+                "WHERE outcome = ? AND started_at >= ? AND started_at < ? "
+                "GROUP BY 1 ORDER BY 2 DESC",
+                (OUTCOME_FAILED,) + window,
+            ).fetchall()
+
+        return {
+            "since": since,
+            "until": until,
+            "runs": total,
+            "already_online": counts.get(OUTCOME_ONLINE, 0),
+            "logged_in": latency_count,
+            "failed": failed,
+            "success_ratio": (total - failed) / total if total else None,
+            "failure_rate": failed / total if total else None,
+            "login_latency": latency,
+            "failures_by_cause": dict(failures),
+        }
+
+    def observe_session(self, outcome, at, error_code=None, forced=False):
+        """
+        根据一次运行的结果维护认证会话记录，用于学习会话时长
+
+        Args:
+            outcome: 运行结果，OUTCOME_*之一
+            at: 观测时间(Unix时间戳)
+            error_code: 失败时的错误码
+            forced: 是否为会话到期前主动发起的重新登录
+        """
+        with self._connect() as conn, conn:
+            row = conn.execute(
+                "SELECT id FROM sessions WHERE ended_at IS NULL ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+            if outcome == OUTCOME_ONLINE:
+                if row:
+                    conn.execute("UPDATE sessions SET last_seen_at = ? WHERE id = ?", (at, row[0]))
+                return
+
+            if row:
+                if forced:
+                    reason = END_RELOGIN
+                elif outcome == OUTCOME_FAILED and error_code in _OFFLINE_ERRORS:
+                    reason = END_OFFLINE
+                else:
+                    reason = END_DEAUTH
+                self._close_session(conn, row[0], at, reason)
+
+            if outcome == OUTCOME_LOGGED_IN:
+                conn.execute(
+                    "INSERT INTO sessions (started_at, last_seen_at) VALUES (?, ?)", (at, at)
+                )
+
+    def mark_deauth(self, at):
+        """
+        记录检测到的掉线，关闭当前会话
+
+        Args:
+            at: 检测到掉线的时间(Unix时间戳)
+
+        Returns:
+            bool: 是否存在被关闭的会话
+        """
+        with self._connect() as conn, conn:
+            row = conn.execute(
+                "SELECT id FROM sessions WHERE ended_at IS NULL ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+            if row:
+                self._close_session(conn, row[0], at, END_DEAUTH)
+        return row is not None
+
+    def current_session(self):
+        """
+        获取当前未结束的会话
+
+        Returns:
+            tuple: (开始时间, 最后在线时间)，没有会话时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT started_at, last_seen_at FROM sessions WHERE ended_at IS NULL "
+                "ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def ended_sessions(self, since, reason=END_DEAUTH):
+        """
+        查询指定时间之后因某种原因结束的会话
+
+        Args:
+            since: 起始时间(Unix时间戳)
+            reason: 结束原因
+
+        Returns:
+            list: (开始时间, 最后在线时间, 结束时间) 列表
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT started_at, last_seen_at, ended_at FROM sessions "
+                "WHERE ended_at >= ? AND end_reason = ? ORDER BY started_at",
+                (since, reason),
+            ).fetchall()
+
+    @staticmethod
+    def _close_session(conn, session_id, at, reason):
+        conn.execute(
+            "UPDATE sessions SET ended_at = ?, end_reason = ? WHERE id = ?", (at, reason, session_id)
+        )
+        # 同时关闭可能因进程崩溃遗留的其他会话
+        conn.execute(
+            "UPDATE sessions SET ended_at = last_seen_at, end_reason = ? WHERE ended_at IS NULL",
+            (END_OFFLINE,),
+        )
+
+    @staticmethod
+    def _percentile(conn, window, count, q):
+        """
+        通过索引按耗时排序取最近秩分位数，避免把整个窗口读入内存
+
+        Returns:
+            float: 分位数对应的耗时，无数据时返回None
+        """
+        if count == 0:
+            return None
+        offset = min(count - 1, max(0, math.ceil(q * count) - 1))
+        row = conn.execute(
+            "SELECT duration FROM login_runs WHERE outcome = ? AND started_at >= ? AND started_at < ? "
+            "ORDER BY duration LIMIT 1 OFFSET ?",
+            (OUTCOME_LOGGED_IN,) + window + (offset,),
+        ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+登录后的钩子
+
+登录成功、失败或常驻服务检测到掉线后执行配置的后续操作（重新挂载网络共享、重启VPN、
+预热软件包缓存等），代替与登录相互竞争的定时任务。钩子作为事件总线的订阅者运行，
+登录结果在钩子开始执行前就已返回，因此钩子不会延迟登录。
+
+同一事件触发的钩子并发执行，并发数为hook_concurrency。每个钩子有自己的超时时间，
+所有钩子还共享一个总预算hook_budget(秒)：排队的钩子开始时只能使用剩余的预算，预算
+耗尽后尚未开始的钩子被跳过。每个钩子的耗时和结果写入日志、追踪和常驻服务指标。
+
+配置示例:
+    "hooks": [
+        {"name": "vpn", "on": ["login_succeeded"], "command": ["systemctl", "--user", "restart", "vpn"]},
+        {"name": "cache", "on": "login_succeeded", "entry_point": "mytools.cache:warm", "timeout": 120}
+    ]
+
+命令钩子通过环境变量AUTONET4AHU_EVENT、AUTONET4AHU_IP、AUTONET4AHU_ACCOUNT、
+AUTONET4AHU_MESSAGE、AUTONET4AHU_OUTCOME和AUTONET4AHU_TRACE_ID获得事件信息；Python
+钩子以(事件类型, 事件数据)调用。
+"""
+
+import os
+import time
+import shlex
+import signal
+import importlib
+import threading
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import get_tracer
+from events import LOGIN_SUCCEEDED, LOGIN_FAILED, DEAUTH_DETECTED
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.hooks')
+
+HOOK_EVENTS = (LOGIN_SUCCEEDED, LOGIN_FAILED, DEAUTH_DETECTED)
+
+# 单个钩子的默认超时时间(秒)
+DEFAULT_TIMEOUT = 30
+# 同一事件触发的所有钩子的默认总预算(秒)
+DEFAULT_BUDGET = 60
+# 同时执行的钩子数
+DEFAULT_CONCURRENCY = 4
+# 日志中保留的钩子输出长度
+OUTPUT_LIMIT = 500
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+
+
+class Hook:
+    """一个钩子：外部命令或Python函数"""
+
+    def __init__(self, name, events, command=None, entry_point=None, timeout=DEFAULT_TIMEOUT):
+        """
+        初始化钩子
+
+        Args:
+            name: 钩子名称
+            events: 触发钩子的事件类型
+            command: 命令参数列表，与entry_point二选一
+            entry_point: Python函数，格式为"模块:函数"
+            timeout: 超时时间(秒)
+        """
+        self.name = name
+        self.events = frozenset(events)
+        self.command = command
+        self.entry_point = entry_point
+        self.timeout = timeout
+        self._function = None
+
+    @classmethod
+    def from_config(cls, item):
+        """
+        从配置项创建钩子
+
+        Args:
+            item: 包含name、on、command或entry_point、timeout的字典
+
+        Returns:
+            Hook: 钩子
+
+        Raises:
+            ValueError: 配置项无效
+        """
+        if not isinstance(item, dict):
+            raise ValueError("钩子配置应为对象")
+        command = item.get("command")
+        entry_point = item.get("entry_point")
+        if bool(command) == bool(entry_point):
+            raise ValueError("钩子需要command或entry_point其中之一")
+        if isinstance(command, str):
+            command = shlex.split(command)
+        if command is not None and not (isinstance(command, list) and all(isinstance(arg, str) for arg in command)):
+            raise ValueError("command应为字符串或字符串列表")
+        if entry_point is not None and (not isinstance(entry_point, str) or ":" not in entry_point):
+            raise ValueError("entry_point的格式应为\"模块:函数\"")
+        events = item.get("on", [LOGIN_SUCCEEDED])
+        events = [events] if isinstance(events, str) else list(events)
+        unknown = [event for event in events if event not in HOOK_EVENTS]
+        if unknown or not events:
+            raise ValueError(f"on只能包含 {', '.join(HOOK_EVENTS)}")
+        timeout = item.get("timeout", DEFAULT_TIMEOUT)
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError("timeout应为正数")
+        name = item.get("name") or (os.path.basename(command[0]) if command else entry_point)
+        return cls(name, events, command=command, entry_point=entry_point, timeout=timeout)
+
+    def run(self, event, timeout):
+        """
+        执行钩子
+
+        Args:
+            event: 触发钩子的Event
+            timeout: 本次可用的时间(秒)
+
+        Returns:
+            tuple: (状态, 说明)，状态为STATUS_OK、STATUS_FAILED或STATUS_TIMEOUT
+        """
+        if self.command:
+            return self._run_command(event, timeout)
+        return self._run_entry_point(event, timeout)
+
+    def _run_command(self, event, timeout):
+        data = event.data
+        env = dict(os.environ)
+        env.update(
+            AUTONET4AHU_EVENT=event.type,
+            AUTONET4AHU_IP=str(data.get("ip") or ""),
+            AUTONET4AHU_ACCOUNT=str(data.get("account") or ""),
+            AUTONET4AHU_MESSAGE=str(data.get("message") or ""),
+            AUTONET4AHU_OUTCOME=str(data.get("outcome") or ""),
+            AUTONET4AHU_TRACE_ID=str(data.get("trace_id") or ""),
+        )
+        try:
+            # 独立的进程组，超时时连同其子进程一起结束
+            process = subprocess.Popen(self.command, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, start_new_session=True)
+        except OSError as e:
+            return STATUS_FAILED, f"无法启动: {e}"
+        try:
+            output, _ = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                process.kill()
+            process.communicate()
+            return STATUS_TIMEOUT, f"{timeout:.1f} 秒未结束，已终止"
+        output = output.decode("utf-8", errors="replace").strip()[-OUTPUT_LIMIT:]
+        if process.returncode != 0:
+            return STATUS_FAILED, f"退出码 {process.returncode}: {output}"
+        return STATUS_OK, output
+
+    def _run_entry_point(self, event, timeout):
+        try:
+            function = self._load()
+        except Exception as e:
+            return STATUS_FAILED, f"无法加载 {self.entry_point}: {e}"
+        result = {}
+
+        def call():
+            try:
+                result["value"] = function(event.type, dict(event.data))
+            except Exception as e:
+                result["error"] = e
+
+        # Python函数无法被强制终止，超时后放弃等待，线程在后台继续运行
+        thread = threading.Thread(target=call, name=f"hook-{self.name}", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            return STATUS_TIMEOUT, f"{timeout:.1f} 秒未返回，已放弃等待"
+        if "error" in result:
+            return STATUS_FAILED, f"{type(result['error']).__name__}: {result['error']}"
+        return STATUS_OK, "" if result.get("value") is None else str(result["value"])[:OUTPUT_LIMIT]
+
+    def _load(self):
+        if self._function is None:
+            module_name, _, attribute = self.entry_point.partition(":")
+            function = importlib.import_module(module_name)
+            for part in attribute.split("."):
+                function = getattr(function, part)
+            self._function = function
+        return self._function
+
+
+class HookRunner:
+    """按事件并发执行钩子，并统计各钩子的执行情况"""
+
+    def __init__(self, hooks=(), budget=DEFAULT_BUDGET, concurrency=DEFAULT_CONCURRENCY):
+        """
+        初始化钩子执行器
+
+        Args:
+            hooks: Hook列表
+            budget: 同一事件触发的所有钩子的总预算(秒)
+            concurrency: 同时执行的钩子数
+        """
+        self.hooks = list(hooks)
+        self.budget = budget
+        self.concurrency = max(1, int(concurrency))
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        根据配置创建钩子执行器，无效的钩子配置记录日志后忽略
+
+        Args:
+            config: 配置字典或ConfigSnapshot
+
+        Returns:
+            HookRunner: 钩子执行器
+        """
+        runner = cls()
+        runner.configure(config)
+        return runner
+
+    def configure(self, config):
+        """
+        按新配置更新钩子列表和预算，保留已有的统计
+
+        Args:
+            config: 配置字典或ConfigSnapshot
+        """
+        hooks = []
+        for index, item in enumerate(config.hooks):
+            try:
+                hooks.append(Hook.from_config(item))
+            except ValueError as e:
+                logger.error(f"第 {index + 1} 个钩子配置无效，已忽略: {e}")
+        with self._lock:
+            self.hooks = hooks
+            self.budget = config.hook_budget
+            self.concurrency = config.hook_concurrency
+
+    def handle(self, event):
+        """
+        事件总线订阅者：执行该事件触发的钩子，在预算内全部结束后返回
+
+        Args:
+            event: Event
+
+        Returns:
+            list: 各钩子的执行结果，见run()
+        """
+        with self._lock:
+            hooks = [hook for hook in self.hooks if event.type in hook.events]
+            budget, concurrency = self.budget, self.concurrency
+        if not hooks:
+            return []
+        return self.run(hooks, event, budget, concurrency)
+
+    def run(self, hooks, event, budget, concurrency):
+        """
+        并发执行钩子
+
+        Args:
+            hooks: Hook列表
+            event: 触发钩子的Event
+            budget: 总预算(秒)
+            concurrency: 同时执行的钩子数
+
+        Returns:
+            list: 各钩子的执行结果，包含name、status、duration和detail
+        """
+        deadline = time.monotonic() + budget
+        tracer = get_tracer()
+
+        def execute(hook):
+            with tracer.span("hook", parent=root, hook=hook.name) as span:
+                start = time.monotonic()
+                remaining = deadline - start
+                if remaining <= 0:
+                    status, detail = STATUS_SKIPPED, "总预算已用完"
+                else:
+                    status, detail = hook.run(event, min(hook.timeout, remaining))
+                duration = time.monotonic() - start
+                span.set("status", status)
+            return {"name": hook.name, "status": status, "duration": round(duration, 3), "detail": detail}
+
+        with tracer.trace("hooks", event=event.type, login_trace=event.data.get("trace_id")) as root:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(hooks)), thread_name_prefix="hook") as executor:
+                results = list(executor.map(execute, hooks))
+            root.set("hooks", len(results))
+
+        for result in results:
+            self._record(result, event)
+        return results
+
+    def _record(self, result, event):
+        name, status, duration = result["name"], result["status"], result["duration"]
+        if status == STATUS_OK:
+            logger.info(f"钩子 {name}({event.type}) 执行完成，耗时 {duration:.2f} 秒")
+        elif status == STATUS_SKIPPED:
+            logger.warning(f"钩子 {name}({event.type}) 已跳过: {result['detail']}")
+        else:
+            logger.warning(f"钩子 {name}({event.type}) 执行失败，耗时 {duration:.2f} 秒: {result['detail']}")
+        with self._lock:
+            stats = self._stats.setdefault(name, {"runs": 0, STATUS_FAILED: 0, STATUS_TIMEOUT: 0, STATUS_SKIPPED: 0})
+            stats["runs"] += 1
+            if status != STATUS_OK:
+                stats[status] += 1
+            stats.update(last_status=status, last_duration=duration, last_event=event.type, last_at=event.at)
+
+    def snapshot(self):
+        """
+        导出各钩子的执行统计
+
+        Returns:
+            dict: 钩子名称到执行次数、失败/超时/跳过次数和最近一次结果的映射
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+校园网链路质量监测
+
+按固定间隔测量三类指标：
+- gateway: 与门户主机建立TCP连接的耗时，连接失败计为丢包，反映本地到校园网出口的链路
+- portal: 请求门户检查页面的往返时间，反映门户服务本身的响应速度
+- internet: 请求外网地址的往返时间，反映认证后的出网质量
+
+每类样本保存在固定大小的数组环形缓冲区中（丢包记为NaN），滚动计算p50/p95/p99和丢包率，
+通过常驻服务的metrics接口导出。本地链路和门户正常而外网持续丢包时，说明门户会话处于
+"半死"状态，可选择强制重新登录。
+"""
+
+import math
+import time
+import socket
+import threading
+import logging
+from array import array
+from urllib.parse import urlparse
+
+from transport import create_transport
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.linkmon')
+
+# 采样间隔(秒)，0表示不启用监测
+DEFAULT_INTERVAL = 60
+# 每类指标保留的样本数
+DEFAULT_WINDOW = 256
+# 单次测量的超时时间(秒)
+PROBE_TIMEOUT = 5
+
+INTERNET_PROBE_URL = "https://www.baidu.com"
+
+TARGETS = ("gateway", "portal", "internet")
+
+
+class LatencyWindow:
+    """定长延迟样本窗口，样本保存在array中，丢包记为NaN"""
+
+    def __init__(self, capacity=DEFAULT_WINDOW):
+        """
+        初始化样本窗口
+
+        Args:
+            capacity: 保留的样本数
+        """
+        self.capacity = max(1, int(capacity))
+        self._samples = array("d", bytes(8 * self.capacity))
+        self._next = 0
+        self._count = 0
+        self._losses = 0
+        self.last = None
+
+    def __len__(self):
+        return self._count
+
+    def _push(self, value):
+        if self._count == self.capacity:
+            if math.isnan(self._samples[self._next]):
+                self._losses -= 1
+        else:
+            self._count += 1
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.last = None if math.isnan(value) else value
+
+    def add(self, rtt):
+        """
+        记录一次成功测量
+
+        Args:
+            rtt: 往返时间(秒)
+        """
+        self._push(float(rtt))
+
+    def add_loss(self):
+        """记录一次丢包（超时或连接失败）"""
+        self._push(math.nan)
+        self._losses += 1
+
+    def recent(self, count):
+        """
+        获取最近的样本，从旧到新排列
+
+        Args:
+            count: 样本数
+
+        Returns:
+            array: 样本，丢包为NaN
+        """
+        count = min(count, self._count)
+        start = (self._next - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._samples[start:start + count]
+        return self._samples[start:] + self._samples[:self._next]
+
+    def loss_rate(self, count=None):
+        """
+        计算丢包率
+
+        Args:
+            count: 只统计最近的样本数，为空时统计整个窗口
+
+        Returns:
+            float: 丢包率，没有样本时返回None
+        """
+        if self._count == 0:
+            return None
+        if count is None:
+            return self._losses / self._count
+        samples = self.recent(count)
+        return sum(1 for value in samples if math.isnan(value)) / len(samples)
+
+    def percentiles(self, points=(50, 95, 99)):
+        """
+        计算成功样本的百分位数（最近邻取值）
+
+        Args:
+            points: 百分位列表
+
+        Returns:
+            dict: 百分位到往返时间(秒)的映射，没有成功样本时值为None
+        """
+        samples = sorted(value for value in self._samples[:self._count] if not math.isnan(value))
+        if not samples:
+            return {point: None for point in points}
+        last = len(samples) - 1
+        return {point: samples[min(last, max(0, math.ceil(point / 100 * len(samples)) - 1))] for point in points}
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 样本数、丢包率、最近一次RTT和p50/p95/p99(毫秒)
+        """
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        percentiles = self.percentiles()
+        loss_rate = self.loss_rate()
+        return {
+            "samples": self._count,
+            "loss_rate": None if loss_rate is None else round(loss_rate, 4),
+            "last_ms": ms(self.last),
+            "p50_ms": ms(percentiles[50]),
+            "p95_ms": ms(percentiles[95]),
+            "p99_ms": ms(percentiles[99]),
+        }
+
+
+class LinkMonitor:
+    """链路质量监测器，在后台线程中定时采样"""
+
+    def __init__(self, daemon, interval=DEFAULT_INTERVAL, window=DEFAULT_WINDOW):
+        """
+        初始化监测器
+
+        Args:
+            daemon: LoginDaemon实例，提供配置、门户节点选择器和登录
+            interval: 采样间隔(秒)
+            window: 每类指标保留的样本数
+        """
+        self.daemon = daemon
+        self.interval = interval
+        self.windows = {target: LatencyWindow(window) for target in TARGETS}
+        self.degraded = False
+        self.relogins = 0
+        self.last_sample_at = None
+        self._last_relogin_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._transport = None
+
+    @classmethod
+    def from_config(cls, daemon):
+        """
+        按常驻服务的配置创建监测器
+
+        Returns:
+            LinkMonitor: 监测器，配置为不启用时返回None
+        """
+        config = daemon.auto_login.config
+        interval = config.link_monitor_interval
+        if not interval or interval <= 0:
+            return None
+        return cls(daemon, interval=interval, window=config.link_monitor_window)
+
+    @property
+    def config(self):
+        """当前生效的配置快照"""
+        return self.daemon.auto_login.config
+
+    def start(self):
+        """在后台线程开始定时采样"""
+        self._thread = threading.Thread(target=self._run, name="link-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"链路质量监测已启动，采样间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=PROBE_TIMEOUT * len(TARGETS))
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+                self.check_degradation()
+            except Exception as e:
+                logger.warning(f"链路质量采样失败: {e}")
+
+    def _get_transport(self):
+        if self._transport is None:
+            self._transport = create_transport(self.config.http_engine)
+        return self._transport
+
+    def _measure_connect(self, host, port):
+        start = time.perf_counter()
+        try:
+            socket.create_connection((host, port), timeout=PROBE_TIMEOUT).close()
+        except OSError:
+            return None
+        return time.perf_counter() - start
+
+    def _measure_get(self, url, require_ok=False):
+        start = time.perf_counter()
+        try:
+            response = self._get_transport().get(url, timeout=PROBE_TIMEOUT, allow_redirects=False)
+        except Exception:
+            return None
+        # 未认证时外网请求会被重定向到门户，只有200才算连通
+        if response.status_code >= 500 or (require_ok and response.status_code != 200):
+            return None
+        return time.perf_counter() - start
+
+    def sample(self):
+        """
+        对各类指标各采样一次
+
+        Returns:
+            dict: 各指标本次的往返时间(秒)，丢包为None
+        """
+        endpoint = self.daemon.auto_login.get_endpoint_selector().best()
+        parsed = urlparse(endpoint.base_url)
+        results = {
+            "gateway": self._measure_connect(endpoint.host, parsed.port or 80),
+            "portal": self._measure_get(endpoint.check_url),
+            "internet": self._measure_get(INTERNET_PROBE_URL, require_ok=True),
+        }
+        with self._lock:
+            for target, rtt in results.items():
+                if rtt is None:
+                    self.windows[target].add_loss()
+                else:
+                    self.windows[target].add(rtt)
+            self.last_sample_at = time.time()
+        return results
+
+    def is_degraded(self):
+        """
+        判断门户会话是否处于半死状态：最近的样本中本地链路和门户正常，外网却持续丢包
+
+        Returns:
+            bool: 是否退化
+        """
+        recent = self.config.link_relogin_samples
+        with self._lock:
+            if len(self.windows["internet"]) < recent:
+                return False
+            internet_loss = self.windows["internet"].loss_rate(recent)
+            gateway_loss = self.windows["gateway"].loss_rate(recent)
+            portal_loss = self.windows["portal"].loss_rate(recent)
+        return (internet_loss >= self.config.link_relogin_loss
+                and gateway_loss == 0 and portal_loss == 0)
+
+    def check_degradation(self, now=None):
+        """
+        检查链路是否退化，启用link_relogin时强制重新登录
+
+        Args:
+            now: 当前时间，默认为time.monotonic()
+
+        Returns:
+            bool: 是否触发了重新登录
+        """
+        now = time.monotonic() if now is None else now
+        degraded = self.is_degraded()
+        if degraded and not self.degraded:
+            logger.warning("链路质量退化：门户可达但外网持续丢包，门户会话可能已失效")
+        self.degraded = degraded
+        # 常驻服务认为已掉线时由其自行登录，这里只处理"看似在线"的情况
+        if not degraded or not self.daemon.online or not self.config.link_relogin:
+            return False
+        cooldown = self.config.link_relogin_cooldown
+        if self._last_relogin_at is not None and now - self._last_relogin_at < cooldown:
+            return False
+        self._last_relogin_at = now
+        self.relogins += 1
+        logger.warning("门户会话疑似半死，强制重新登录")
+        self.daemon.login(force=True)
+        return True
+
+    def snapshot(self):
+        """
+        导出链路质量指标
+
+        Returns:
+            dict: 各指标的样本统计、退化状态和强制重新登录次数
+        """
+        with self._lock:
+            result = {target: window.snapshot() for target, window in self.windows.items()}
+        result.update(
+            interval=self.interval,
+            last_sample_at=self.last_sample_at,
+            degraded=self.degraded,
+            relogins=self.relogins,
+        )
+        return result
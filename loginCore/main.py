@@ -1,25 +1,50 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
-import os
 import sys
+import json
+import time
+import socket
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import argparse
 import logging
-from datetime import datetime
-from portal import ePortal
-from notify import Notifier
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from portal import ePortal, ACCOUNT_ERRORS
+from endpoints import EndpointSelector
+from clock import get_clock
+from breaker import CircuitBreaker
+from hedging import HedgePolicy
+from portal_profile import ProfileCache
+from accounts import AccountPool
+from config_store import ConfigStore, ConfigSnapshot, ConfigError
+from daemon import LoginDaemon
+from control import ControlServer, ControlClient, ControlError
+from platforms import get_backend
+from gateway import GatewayServer
+from tracing import get_tracer, write_trace, RunIdFilter
+from systemd_units import install_units, UNIT_NAME
+from history import LoginHistory, OUTCOME_ONLINE, OUTCOME_LOGGED_IN, OUTCOME_FAILED
+from events import EventBus, ATTEMPT_STARTED, LOGIN_SUCCEEDED, LOGIN_FAILED, DEFAULT_FLUSH_TIMEOUT
+from hooks import HookRunner, HOOK_EVENTS
 
-# 配置日志系统
+# 配置日志系统，登录运行中的日志带有运行ID（即trace_id）
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.addFilter(RunIdFilter())
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(run)s%(message)s',
     handlers=[
-        logging.StreamHandler(sys.stdout)
+        _log_handler
     ]
 )
 logger = logging.getLogger('AutoNet4AHU')
 
+# 多接口登录前检查各接口能否连到门户的超时时间(秒)
+INTERFACE_PROBE_TIMEOUT = 2
+
 class AutoLogin:
     """校园网自动登录入口模块"""
     
@@ -32,7 +57,20 @@ class AutoLogin:
             log_level: 日志级别
         """
         self.config_file = config_file
+        self.store = ConfigStore(fallback_paths=[config_file])
         self.config = self.load_config()
+        self.active_account = None
+        self.last_run = None
+        self.history = None
+        self._selector = None
+        self._profiles = None
+        self._hedge = None
+        self._run_lock = threading.Lock()
+        # 登录结果通过事件总线交给通知等订阅者，不在登录流程中同步执行
+        self.events = EventBus()
+        self.events.subscribe(self._notify_event, types=(LOGIN_SUCCEEDED, LOGIN_FAILED), name="notify")
+        self.hooks = HookRunner.from_config(self.config)
+        self.events.subscribe(self.hooks.handle, types=HOOK_EVENTS, name="hooks")
         
         # 设置日志级别
         logger.setLevel(log_level)
@@ -40,45 +78,80 @@ class AutoLogin:
     
     def load_config(self):
         """
-        加载配置文件，如果不存在则返回空配置
+        通过共享配置存储加载配置，优先读取用户目录，其次读取应用目录，都不存在则返回空配置
         
         Returns:
-            dict: 配置信息
+            ConfigSnapshot: 配置快照
         """
-        default_config = {
-            "student_id": "",
-            "password": "",
-            "webhook_urls": []
-        }
+        try:
+            return self.store.load()
+        except ConfigError as e:
+            logger.error(f"加载配置失败: {e}")
+            return ConfigSnapshot()
+    
+    def reload_config(self, snapshot=None):
+        """
+        重新加载配置，常驻进程在配置文件变化后调用
         
-        # 首先检查用户目录下的配置
-        user_config_path = os.path.expanduser("~/Library/Application Support/AutoNet4AHU/config.json")
-        app_config_path = self.config_file
+        Args:
+            snapshot: 已加载的新配置快照，为空时从存储读取
+        """
+        self.config = snapshot or self.load_config()
+        # 门户节点列表可能变化，下次登录时重新创建选择器
+        self._selector = None
+        # 对冲参数可能变化，先保存旧策略累积的状态
+        if self._hedge is not None:
+            self._hedge.flush()
+            self._hedge = None
+        self.hooks.configure(self.config)
+        logger.info(f"配置已更新到版本 {self.config.version}")
+    
+    def get_endpoint_selector(self):
+        """
+        获取门户节点选择器，同一配置版本内复用以保留RTT统计
         
-        # 尝试从用户配置目录加载
-        if os.path.exists(user_config_path):
-            try:
-                with open(user_config_path, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                logger.info(f"已从用户目录加载配置")
-                return config
-            except Exception as e:
-                logger.error(f"从用户目录加载配置失败: {e}")
-                # 继续尝试从应用目录加载
-        
-        # 尝试从应用目录加载
-        if os.path.exists(app_config_path):
-            try:
-                with open(app_config_path, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                logger.info(f"已从应用目录加载配置")
-                return config
-            except Exception as e:
-                logger.error(f"从应用目录加载配置失败: {e}")
-                return default_config
+        Returns:
+            EndpointSelector: 节点选择器
+        """
+        if self._selector is None:
+            self._selector = EndpointSelector(self.config.portal_endpoints)
+        return self._selector
+    
+    def get_profile_cache(self):
+        """
+        获取门户协议参数缓存，进程内共享
+        
+        Returns:
+            ProfileCache: 协议参数缓存
+        """
+        if self._profiles is None:
+            self._profiles = ProfileCache()
+        return self._profiles
+    
+    def get_breaker(self):
+        """
+        获取门户熔断器，状态保存在状态目录，由所有登录进程共享
         
-        logger.warning("未找到配置文件，使用默认配置")
-        return default_config
+        Returns:
+            CircuitBreaker: 熔断器
+        """
+        return CircuitBreaker.from_config(self.config)
+    
+    def get_hedge_policy(self):
+        """
+        获取登录请求的对冲策略，同一配置版本内复用；耗时样本和对冲预算在进程内累积，
+        每次运行结束时写入状态目录，由所有登录进程共享
+        
+        Returns:
+            HedgePolicy: 对冲策略，配置为不启用时返回None
+        """
+        if self._hedge is None:
+            self._hedge = HedgePolicy.from_config(self.config)
+        return self._hedge
+    
+    def enable_hot_reload(self):
+        """监听配置文件变化并自动热加载，供常驻进程使用"""
+        self.store.start_watching(self.reload_config)
     
     def save_config(self):
         """
@@ -87,30 +160,12 @@ class AutoLogin:
         Returns:
             bool: 是否保存成功
         """
-        user_config_dir = os.path.expanduser("~/Library/Application Support/AutoNet4AHU")
-        user_config_path = os.path.join(user_config_dir, "config.json")
-        
         try:
-            # 确保目录存在
-            os.makedirs(user_config_dir, exist_ok=True)
-            
-            with open(user_config_path, "w", encoding="utf-8") as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-            
-            logger.info(f"配置已保存到用户目录: {user_config_path}")
+            self.config = self.store.save(self.config.to_dict())
             return True
-        except Exception as e:
+        except (OSError, ConfigError) as e:
             logger.error(f"保存配置到用户目录失败: {e}")
-            
-            # 尝试保存到应用目录作为备选
-            try:
-                with open(self.config_file, "w", encoding="utf-8") as f:
-                    json.dump(self.config, f, indent=4, ensure_ascii=False)
-                logger.info(f"配置已保存到应用目录: {self.config_file}")
-                return True
-            except Exception as e2:
-                logger.error(f"保存配置到应用目录也失败: {e2}")
-                return False
+            return False
     
     def config_is_complete(self):
         """
@@ -119,49 +174,352 @@ class AutoLogin:
         Returns:
             bool: 配置是否包含必要的信息
         """
-        return bool(self.config.get("student_id")) and bool(self.config.get("password"))
+        return len(AccountPool.from_config(self.config)) > 0
     
-    def login(self):
+    def login(self, force=False, trace=False):
         """
-        执行登录操作，如果配置不完整则直接退出
+        执行登录操作，如果配置不完整则直接退出，并将本次运行结果写入登录历史
+        
+        Args:
+            force: 是否跳过在线检查直接重新登录，用于会话到期前的主动续期
+            trace: 是否无论耗时都导出本次运行的追踪
         
         Returns:
             bool: 登录是否成功
         """
+        clock = get_clock()
+        started_at = clock.time()
+        start = clock.monotonic()
+        self.last_run = {
+            "outcome": OUTCOME_FAILED,
+            "ip": None,
+            "error_code": None,
+            "message": "",
+            "phases": [],
+            "forced": force,
+            "interfaces": None,
+            "skipped_interfaces": None,
+            "trace_id": None,
+            "trace_file": None,
+            "attempted_account": None,
+        }
+        
+        tracer = get_tracer()
+        tracer.resize(self.config.trace_buffer_size)
+        with tracer.trace("login", forced=force) as root:
+            success = self._login()
+            root.set("outcome", self.last_run["outcome"])
+            root.set("error_code", self.last_run["error_code"])
+        duration = clock.monotonic() - start
+        if self._hedge is not None:
+            self._hedge.flush()
+        self.last_run.update(
+            started_at=started_at,
+            duration=round(duration, 4),
+            account=self.active_account.student_id if self.active_account else None,
+            trace_id=root.trace_id,
+        )
+        self._record_history(started_at, duration)
+        self._dump_trace(duration, force=trace)
+        run = self.last_run
+        self.events.publish(
+            LOGIN_SUCCEEDED if success else LOGIN_FAILED,
+            outcome=run["outcome"],
+            message=run["message"],
+            error_code=run["error_code"],
+            ip=run["ip"],
+            account=run["account"] or run["attempted_account"],
+            duration=run["duration"],
+            forced=force,
+            trace_id=run["trace_id"],
+        )
+        return success
+    
+    def _dump_trace(self, duration, force=False):
+        """
+        本次运行较慢或要求导出时，将其追踪写入追踪目录
+        
+        通知在运行结束后由事件总线的订阅者异步发送，其span带有本次运行的trace_id，
+        记录在环形缓冲区中，但不会出现在此处已写入的文件里
+        
+        Args:
+            duration: 本次运行耗时(秒)
+            force: 是否无论耗时都导出
+        """
+        run = self.last_run
+        threshold = self.config.trace_slow_threshold
+        if not force and not (threshold and duration >= threshold):
+            return
+        try:
+            run["trace_file"] = get_tracer().dump(
+                trace_id=run["trace_id"], keep=self.config.trace_keep
+            )
+        except OSError as e:
+            logger.warning(f"导出登录追踪失败: {e}")
+            return
+        if force:
+            logger.info(f"登录追踪已导出: {run['trace_file']}")
+        else:
+            logger.warning(f"本次登录耗时 {duration:.1f} 秒，追踪已导出: {run['trace_file']}")
+    
+    def _login(self):
+        """
+        在每个校园网接口上按账号池顺序尝试登录，遇到账号级错误（设备数超限、欠费、
+        密码错误等）时标记该账号并切换到下一个账号
+        
+        Returns:
+            bool: 登录是否成功
+        """
+        run = self.last_run
+        
         # 检查配置是否完整，不完整则直接退出
-        if not self.config_is_complete():
+        pool = AccountPool.from_config(self.config)
+        if len(pool) == 0:
             logger.error(f"配置不完整，请配置{self.config_file}文件设置学号和密码")
+            run.update(error_code="config_incomplete", message="配置不完整")
             return False
         
-        student_id = self.config.get("student_id")
-        password = self.config.get("password")
+        self.active_account = None
+        accounts = pool.available()
+        if not accounts:
+            message = "所有账号均处于不可用状态，跳过登录"
+            logger.error(message)
+            run.update(error_code="accounts_exhausted", message=message)
+            return False
         
-        # 使用ePortal进行登录
-        try:
-            portal = ePortal(student_id, password)
-            success, message = portal.login()
-            
-            # 发送通知（如果配置了webhook URLs）
-            if self.config.get("webhook_urls"):
-                self.send_notification(success, message, portal.wlan_user_ip)
+        # 多个网络接口都接入校园网时分别认证，否则按系统选择的地址认证
+        interfaces = self.get_campus_interfaces()
+        if len(interfaces) > 1:
+            # 连不到门户的接口（如docker0、VPN）与校园网认证无关，跳过而不计为失败
+            reachable = self._reachable_interfaces(interfaces)
+            skipped = [interface for interface in interfaces if interface not in reachable]
+            if skipped:
+                logger.info(f"以下接口无法连接门户，跳过: "
+                            f"{', '.join(f'{name}({ip})' for name, ip in skipped)}")
+                run["skipped_interfaces"] = [{"interface": name, "ip": ip} for name, ip in skipped]
+            interfaces = reachable
+        if len(interfaces) > 1:
+            logger.info(f"检测到 {len(interfaces)} 个校园网接口，同时登录: "
+                        f"{', '.join(f'{name}({ip})' for name, ip in interfaces)}")
+            parent = get_tracer().current()
             
-            if success:
-                logger.info(f"登录成功: {message}")
-            else:
-                logger.error(f"登录失败: {message}")
+            def login_interface(interface):
+                # 线程池中的追踪挂在本次运行的根span下
+                with get_tracer().span("interface", parent=parent, interface=interface[0], ip=interface[1]):
+                    return self._login_interface(pool, accounts, *interface)
             
-            return success
+            with ThreadPoolExecutor(max_workers=len(interfaces)) as executor:
+                results = list(executor.map(login_interface, interfaces))
+        elif interfaces and run["skipped_interfaces"]:
+            # 只剩一个可用接口时绑定其地址，避免系统按默认路由选到被跳过的接口
+            results = [self._login_interface(pool, accounts, *interfaces[0])]
+        else:
+            results = [self._login_interface(pool, accounts)]
+        
+        # 成功与否只由实际参与登录的接口决定
+        success = all(result["success"] for result, _ in results)
+        # 有失败的接口时以其结果作为本次运行的错误
+        primary, account = next(((r, a) for r, a in results if not r["success"]), results[0])
+        if len(results) > 1:
+            message = "; ".join(f"{r['interface']}({r['ip']}): {r['message']}" for r, _ in results)
+            ip = ", ".join(r["ip"] for r, _ in results)
+            outcomes = {r["outcome"] for r, _ in results}
+            outcome = OUTCOME_FAILED if not success else (
+                OUTCOME_ONLINE if outcomes == {OUTCOME_ONLINE} else OUTCOME_LOGGED_IN)
+            run["interfaces"] = [r for r, _ in results]
+        else:
+            message, ip, outcome = primary["message"], primary["ip"], primary["outcome"]
+        self.active_account = account if success else None
+        run.update(ip=ip, message=message, error_code=primary["error_code"], outcome=outcome,
+                   attempted_account=account.student_id if account else None)
+        
+        if success:
+            logger.info(f"登录成功(账号 {account.name}): {message}")
+        else:
+            logger.error(f"登录失败: {message}")
+        return success
+    
+    def get_campus_interfaces(self):
+        """
+        列出链路在线且地址位于校园网网段内的网络接口
+        
+        Returns:
+            list: (接口名, IP地址)列表，未启用多接口登录时返回空列表
+        """
+        if not self.config.multi_interface:
+            return []
+        try:
+            return get_backend().ipv4_addresses_in(self.config.campus_networks)
+        except ValueError as e:
+            logger.error(f"校园网网段配置无效: {e}")
+            return []
+    
+    def _reachable_interfaces(self, interfaces):
+        """
+        从各接口地址同时向门户发起TCP连接，筛选出能连到门户的接口
+        
+        Args:
+            interfaces: (接口名, IP地址)列表
+        
+        Returns:
+            list: 能连到门户的(接口名, IP地址)列表，保持原有顺序
+        """
+        endpoint = self.get_endpoint_selector().best()
+        port = urlparse(endpoint.base_url).port or 80
+        
+        def reaches_portal(interface):
+            try:
+                socket.create_connection(
+                    (endpoint.host, port), timeout=INTERFACE_PROBE_TIMEOUT, source_address=(interface[1], 0)
+                ).close()
+            except OSError as e:
+                logger.debug(f"接口 {interface[0]}({interface[1]}) 无法连接门户 {endpoint.host}:{port}: {e}")
+                return False
+            return True
+        
+        with ThreadPoolExecutor(max_workers=len(interfaces)) as executor:
+            reachable = list(executor.map(reaches_portal, interfaces))
+        return [interface for interface, ok in zip(interfaces, reachable) if ok]
+    
+    def _login_interface(self, pool, accounts, interface=None, source_ip=None):
+        """
+        在单个网络接口上按账号池顺序尝试登录，遇到账号级错误时标记该账号并切换到下一个账号
+        
+        Args:
+            pool: AccountPool实例
+            accounts: 可用账号列表
+            interface: 接口名，为空时由系统选择地址
+            source_ip: 接口地址
+        
+        Returns:
+            tuple: (接口登录结果, 最后使用的Account)
+        """
+        run = self.last_run
+        result = {
+            "interface": interface,
+            "ip": source_ip,
+            "success": False,
+            "message": "登录失败",
+            "error_code": None,
+            "outcome": OUTCOME_FAILED,
+            "account": None,
+        }
+        portal = None
+        account = None
+        try:
+            for index, account in enumerate(accounts):
+                redirect = portal.redirect if portal is not None else None
+                portal = ePortal(
+                    account.student_id,
+                    account.password,
+                    selector=self.get_endpoint_selector(),
+                    discover=self.config.discover_portal,
+                    breaker=self.get_breaker(),
+                    ipv6=self.config.ipv6,
+                    source_ip=source_ip,
+                    engine=self.config.http_engine,
+                    profiles=self.get_profile_cache(),
+                    redirect_params=self.config.redirect_params,
+                    hedge=self.get_hedge_policy(),
+                )
+                if redirect and portal.redirect_params:
+                    # 切换账号时沿用上一个账号捕获到的门户重定向参数
+                    portal.apply_redirect_params(redirect)
+                self.events.publish(ATTEMPT_STARTED, account=account.student_id, interface=interface, index=index)
+                # 首个账号之外无需重复检查网络状态
+                try:
+                    success, message = portal.login(check_status=(index == 0 and not run["forced"]))
+                finally:
+                    portal.close()
+                prefix = f"{interface}:" if interface else ""
+                with self._run_lock:
+                    run["phases"].extend(dict(phase, name=prefix + phase["name"]) for phase in portal.phases)
+                result.update(ip=portal.wlan_user_ip, message=message, account=account.student_id)
+                
+                if success:
+                    with self._run_lock:
+                        pool.mark_ok(account)
+                    result.update(
+                        success=True,
+                        error_code=None,
+                        outcome=OUTCOME_ONLINE if portal.already_logged_in else OUTCOME_LOGGED_IN,
+                    )
+                    break
+                
+                result["error_code"] = portal.last_error_code
+                if portal.last_error_code not in ACCOUNT_ERRORS:
+                    # 非账号原因（网络、门户故障），换账号同样无法登录
+                    break
+                
+                with self._run_lock:
+                    pool.mark_exhausted(account, portal.last_error_code, message)
+                if index + 1 < len(accounts):
+                    logger.warning(f"账号 {account.name} 不可用: {message}，切换到下一个账号")
+                else:
+                    result["message"] = f"所有账号均不可用，最后错误: {message}"
         except Exception as e:
             error_msg = f"登录过程中发生异常: {str(e)}"
             logger.exception(error_msg)
-            
-            # 尝试发送错误通知
-            if self.config.get("webhook_urls"):
-                self.send_notification(False, error_msg, "未知")
-            
-            return False
+            result.update(success=False, error_code="exception", message=error_msg, outcome=OUTCOME_FAILED)
+        return result, account
+    
+    def _record_history(self, started_at, duration):
+        """
+        将本次运行结果写入登录历史，写入失败不影响登录结果
+        
+        Args:
+            started_at: 开始时间(Unix时间戳)
+            duration: 总耗时(秒)
+        """
+        run = self.last_run
+        try:
+            history = self.get_history()
+            history.record(
+                started_at,
+                round(duration, 4),
+                run["outcome"],
+                account=run["account"],
+                ip=run["ip"],
+                error_code=run["error_code"],
+                message=run["message"],
+                phases=run["phases"],
+            )
+            history.observe_session(
+                run["outcome"], started_at + duration, error_code=run["error_code"], forced=run["forced"]
+            )
+        except Exception as e:
+            logger.warning(f"写入登录历史失败: {e}")
     
-    def send_notification(self, success, message, ip_address):
+    def get_history(self):
+        """
+        获取登录历史记录实例
+        
+        Returns:
+            LoginHistory: 登录历史记录
+        """
+        if self.history is None:
+            self.history = LoginHistory(
+                retention_days=self.config.history_retention_days
+            )
+        return self.history
+    
+    def _notify_event(self, event):
+        """
+        事件总线订阅者：登录运行结束后发送通知，配置不完整时不发送
+        
+        Args:
+            event: login_succeeded或login_failed事件
+        """
+        data = event.data
+        if data["error_code"] == "config_incomplete" or not self.config.webhook_urls:
+            return
+        # 通知在订阅者线程中发送，延续登录运行的追踪，notify和webhook_post span归入同一trace_id
+        with get_tracer().resume(data.get("trace_id")):
+            self.send_notification(
+                event.type == LOGIN_SUCCEEDED, data["message"], data["ip"] or "未知", data["account"]
+            )
+    
+    def send_notification(self, success, message, ip_address, account=None):
         """
         发送登录结果通知
         
@@ -169,23 +527,28 @@ class AutoLogin:
             success: 是否登录成功
             message: 登录结果消息
             ip_address: 当前IP地址
+            account: 本次登录使用的学号，默认为配置中的学号
         """
-        webhook_urls = self.config.get("webhook_urls", [])
+        webhook_urls = self.config.webhook_urls
         if not webhook_urls:
             return
         
         try:
+            # 按需导入：通知依赖requests，未配置webhook时不加载
+            from notify import Notifier
             notifier = Notifier(webhook_urls)
             
             status = "成功" if success else "失败"
             content = f"校园网登录{status}通知\n\n" \
-                    f"学号: {self.config.get('student_id')}\n" \
+                    f"学号: {account or self.config.student_id}\n" \
                     f"IP地址: {ip_address}\n" \
                     f"登录结果: {message}\n" \
                     f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n" \
-                    f"设备: macOS {self.get_macos_version()}"
+                    f"设备: {get_backend().display_name} {self.get_os_version()}"
             
-            sent = notifier.send_text(content)
+            with get_tracer().span("notify", webhooks=len(webhook_urls)) as span:
+                sent = notifier.send_text(content)
+                span.set("sent", sent)
             if sent:
                 logger.info("通知发送成功")
             else:
@@ -193,19 +556,17 @@ class AutoLogin:
         except Exception as e:
             logger.error(f"发送通知时发生错误: {e}")
     
-    def get_macos_version(self):
+    def get_os_version(self):
         """
-        获取macOS系统版本
+        获取系统版本
         
         Returns:
-            str: macOS版本信息
+            str: 系统版本信息
         """
         try:
-            import platform
-            mac_ver = platform.mac_ver()[0]
-            return mac_ver
+            return get_backend().os_version()
         except Exception as e:
-            logger.error(f"获取macOS版本失败: {e}")
+            logger.error(f"获取系统版本失败: {e}")
             return "未知版本"
 
 
@@ -215,11 +576,275 @@ def parse_args():
     parser.add_argument("-c", "--config", help="指定配置文件路径", default="config.json")
     parser.add_argument("-d", "--debug", help="启用调试模式", action="store_true")
     parser.add_argument("-s", "--silent", help="静默模式，不输出日志", action="store_true")
-    parser.add_argument("command", nargs="?", default="login", help="执行的命令，目前支持: login")
+    parser.add_argument("--since", help="history命令的统计起始时间，如 7d、12h 或 2024-09-01", default="7d")
+    parser.add_argument("--until", help="history命令的统计结束时间，默认为当前时间", default=None)
+    parser.add_argument("--json", help="以JSON格式输出统计结果", action="store_true")
+    parser.add_argument("--local", help="不使用常驻服务，直接在当前进程中登录", action="store_true")
+    parser.add_argument("--trace", help="login命令无论耗时都导出本次登录的追踪", action="store_true")
+    parser.add_argument("--output", help="trace命令写入的文件路径，默认写入追踪目录", default=None)
+    parser.add_argument("command", nargs="?", default="login",
+                        help="执行的命令，目前支持: login, history, daemon, status, metrics, trace, systemd, gateway")
+    parser.add_argument("--unit-dir", help="systemd命令写入单元文件的目录，默认为~/.config/systemd/user", default=None)
     
     return parser.parse_args()
 
 
+def parse_time_spec(spec, now=None):
+    """
+    解析时间参数，支持相对时间（30m、12h、7d）和ISO格式日期时间
+    
+    Args:
+        spec: 时间参数
+        now: 当前时间，默认为datetime.now()
+    
+    Returns:
+        float: Unix时间戳
+    
+    Raises:
+        ValueError: 格式无法识别
+    """
+    now = now or datetime.now()
+    units = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+    spec = spec.strip()
+    if spec and spec[-1] in units and spec[:-1].isdigit():
+        return (now - timedelta(**{units[spec[-1]]: int(spec[:-1])})).timestamp()
+    return datetime.fromisoformat(spec).timestamp()
+
+
+def print_history_report(report):
+    """
+    输出登录历史统计结果
+    
+    Args:
+        report: LoginHistory.report()返回的统计结果
+    """
+    def fmt_time(ts):
+        return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')
+    
+    def fmt_ratio(value):
+        return "无数据" if value is None else f"{value * 100:.1f}%"
+    
+    def fmt_seconds(value):
+        return "无数据" if value is None else f"{value:.2f}s"
+    
+    latency = report["login_latency"]
+    print(f"登录历史统计 ({fmt_time(report['since'])} ~ {fmt_time(report['until'])})")
+    print(f"运行次数: {report['runs']} (已在线 {report['already_online']}, "
+          f"登录成功 {report['logged_in']}, 失败 {report['failed']})")
+    print(f"成功率: {fmt_ratio(report['success_ratio'])}")
+    print(f"失败率: {fmt_ratio(report['failure_rate'])}")
+    print(f"登录耗时: p50 {fmt_seconds(latency['p50'])}, p95 {fmt_seconds(latency['p95'])}")
+    if report["failures_by_cause"]:
+        print("失败原因:")
+        for cause, count in report["failures_by_cause"].items():
+            print(f"  {cause}: {count}")
+
+
+def run_history(args):
+    """
+    执行history命令，输出指定时间窗口内的登录统计
+    
+    Args:
+        args: 命令行参数
+    
+    Returns:
+        bool: 是否执行成功
+    """
+    try:
+        since = parse_time_spec(args.since)
+        until = parse_time_spec(args.until) if args.until else None
+    except ValueError:
+        logger.error(f"无法识别的时间参数: {args.since} / {args.until}")
+        return False
+    
+    history = LoginHistory()
+    try:
+        report = history.report(since, until)
+    finally:
+        history.close()
+    
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_history_report(report)
+    return True
+
+
+def run_daemon(auto_login):
+    """
+    运行常驻登录服务，并在本地套接字上提供控制接口
+    
+    Args:
+        auto_login: AutoLogin实例
+    
+    Returns:
+        bool: 是否正常退出
+    """
+    service = LoginDaemon(auto_login)
+    server = ControlServer(service)
+    service.add_listener(server.publish, name="control")
+    try:
+        server.start()
+    except (ControlError, OSError) as e:
+        logger.error(f"启动控制接口失败: {e}")
+        return False
+    
+    signal.signal(signal.SIGTERM, lambda signum, frame: service.stop())
+    
+    idle_exit = auto_login.config.idle_exit
+    if server.socket_activated and idle_exit > 0:
+        threading.Thread(
+            target=watch_idle, args=(service, server, idle_exit), name="idle-exit", daemon=True
+        ).start()
+    
+    try:
+        service.run()
+    finally:
+        server.stop()
+        auto_login.events.close(DEFAULT_FLUSH_TIMEOUT + auto_login.hooks.budget)
+    return True
+
+
+def watch_idle(service, server, idle_exit):
+    """
+    在线且控制接口空闲超过指定时间后停止常驻服务
+    
+    Args:
+        service: LoginDaemon实例
+        server: ControlServer实例
+        idle_exit: 空闲时间(秒)
+    """
+    while not service.stopped:
+        time.sleep(min(30, idle_exit))
+        if service.online and server.idle_seconds() >= idle_exit:
+            logger.info(f"常驻服务已空闲 {idle_exit} 秒，退出等待下次按需启动")
+            service.stop()
+            return
+
+
+def run_gateway(auto_login):
+    """
+    运行局域网网关服务，为局域网内的设备完成校园网认证
+    
+    Args:
+        auto_login: AutoLogin实例
+    
+    Returns:
+        bool: 是否正常退出
+    """
+    try:
+        server = GatewayServer.from_config(auto_login)
+    except (OSError, ValueError) as e:
+        logger.error(f"启动网关服务失败: {e}")
+        return False
+    
+    auto_login.enable_hot_reload()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    thread = threading.Thread(target=server.serve_forever, name="gateway-server", daemon=True)
+    thread.start()
+    try:
+        while not stopping.wait(1.0):
+            pass
+    finally:
+        server.shutdown()
+        thread.join()
+    logger.info("网关服务已停止")
+    return True
+
+
+def run_systemd(args, auto_login):
+    """
+    生成systemd用户单元：定时登录检查，以及按需启动常驻服务的套接字激活
+    
+    Args:
+        args: 命令行参数
+        auto_login: AutoLogin实例
+    
+    Returns:
+        bool: 是否生成成功
+    """
+    interval = auto_login.config.check_interval
+    try:
+        install_units(args.unit_dir, interval=interval)
+    except OSError as e:
+        logger.error(f"写入systemd单元失败: {e}")
+        return False
+    print("systemd用户单元已生成，执行以下命令启用：")
+    print("  systemctl --user daemon-reload")
+    print(f"  systemctl --user enable --now {UNIT_NAME}.socket {UNIT_NAME}-login.timer")
+    return True
+
+
+def login_via_service(client, trace=False):
+    """
+    通过常驻服务执行登录
+    
+    Args:
+        client: ControlClient实例
+        trace: 是否导出本次登录的追踪
+    
+    Returns:
+        bool: 登录是否成功，常驻服务不可用时返回None
+    """
+    try:
+        result = client.call("login", trace=trace) if trace else client.call("login")
+    except (OSError, ValueError, ControlError) as e:
+        logger.warning(f"通过常驻服务登录失败，改为直接登录: {e}")
+        return None
+    
+    if result["success"]:
+        logger.info(f"登录成功(常驻服务，账号 {result['account']}): {result['message']}")
+    else:
+        logger.error(f"登录失败(常驻服务): {result['message']}")
+    if result.get("trace_file"):
+        logger.info(f"登录追踪已导出: {result['trace_file']}")
+    return result["success"]
+
+
+def run_trace(args):
+    """
+    导出常驻服务环形缓冲区中的追踪，可用Perfetto打开
+    
+    Args:
+        args: 命令行参数
+    
+    Returns:
+        bool: 是否导出成功
+    """
+    try:
+        trace = ControlClient(timeout=10).call("trace")
+    except (OSError, ControlError) as e:
+        logger.error(f"无法连接常驻服务: {e}，单次登录可使用 login --trace 导出追踪")
+        return False
+    try:
+        path = write_trace(trace, args.output)
+    except OSError as e:
+        logger.error(f"写入追踪文件失败: {e}")
+        return False
+    print(path)
+    return True
+
+
+def run_service_query(method):
+    """
+    查询常驻服务的状态或指标并以JSON输出
+    
+    Args:
+        method: 控制接口方法名
+    
+    Returns:
+        bool: 是否查询成功
+    """
+    try:
+        result = ControlClient(timeout=5).call(method)
+    except (OSError, ControlError) as e:
+        logger.error(f"无法连接常驻服务: {e}")
+        return False
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return True
+
+
 def main():
     """程序入口点"""
     args = parse_args()
@@ -228,16 +853,52 @@ def main():
     log_level = logging.DEBUG if args.debug else logging.WARNING if args.silent else logging.INFO
     logger.setLevel(log_level)
     
+    if args.command == "history":
+        if not run_history(args) and not args.silent:
+            sys.exit(1)
+        return
+    
+    if args.command in ("status", "metrics"):
+        if not run_service_query(args.command) and not args.silent:
+            sys.exit(1)
+        return
+    
+    if args.command == "trace":
+        if not run_trace(args) and not args.silent:
+            sys.exit(1)
+        return
+    
+    if args.command == "login" and not args.local:
+        # 常驻服务在运行时由其执行登录，避免冷启动
+        client = ControlClient()
+        if client.is_available():
+            success = login_via_service(client, trace=args.trace)
+            if success is not None:
+                if not success and not args.silent:
+                    sys.exit(1)
+                return
+    
     # 使用指定的配置文件路径创建AutoLogin实例
     auto_login = AutoLogin(config_file=args.config, log_level=log_level)
     
     if args.command == "login":
-        success = auto_login.login()
+        success = auto_login.login(trace=args.trace)
+        # 等待通知和钩子等订阅者处理完本次登录的事件再退出
+        auto_login.events.close(DEFAULT_FLUSH_TIMEOUT + auto_login.hooks.budget)
         if not success and not args.silent:
             sys.exit(1)
+    elif args.command == "daemon":
+        if not run_daemon(auto_login):
+            sys.exit(1)
+    elif args.command == "systemd":
+        if not run_systemd(args, auto_login):
+            sys.exit(1)
+    elif args.command == "gateway":
+        if not run_gateway(auto_login):
+            sys.exit(1)
     else:
         logger.error(f"未知命令: {args.command}")
-        logger.info("可用命令: login")
+        logger.info("可用命令: login, history, daemon, status, metrics, trace, systemd, gateway")
         if not args.silent:
             sys.exit(1)
 
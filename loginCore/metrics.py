@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+
+class Metrics:
+    """线程安全的计数器与指标集合，供常驻服务的metrics接口导出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._sources = {}
+        self.started_at = time.time()
+
+    def incr(self, name, value=1):
+        """
+        累加计数器
+
+        Args:
+            name: 指标名称
+            value: 增量
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """
+        设置瞬时指标
+
+        Args:
+            name: 指标名称
+            value: 指标值
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def register(self, name, source):
+        """
+        注册在导出时才计算的指标来源
+
+        Args:
+            name: 指标分组名称
+            source: 无参函数，返回可JSON序列化的字典
+        """
+        with self._lock:
+            self._sources[name] = source
+
+    def snapshot(self):
+        """
+        导出当前所有指标
+
+        Returns:
+            dict: 计数器、瞬时指标和各注册来源的指标
+        """
+        with self._lock:
+            result = {
+                "uptime": round(time.time() - self.started_at, 3),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+            sources = list(self._sources.items())
+        for name, source in sources:
+            result[name] = source()
+        return result
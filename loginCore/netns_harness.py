@@ -0,0 +1,688 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基于Linux网络命名空间的端到端测试环境
+
+用网络命名空间和veth对在一台Linux机器上搭出校园网的拓扑：
+- 终端（client）: 一个或两个接入校园网的接口，各自有独立的路由表，与多接口的真实终端一致
+- 路由器（router）: 连接终端、门户和外网，相当于AC
+- 门户（portal）: 使用真实的门户地址172.16.253.3，提供检查页面(80端口)和登录接口(801端口)
+- 外网（internet）: 代替www.baidu.com和captive.apple.com，强制认证模式下未认证终端的HTTP请求
+  被重定向到门户，HTTPS连接被直接断开；开放模式下不需要认证
+
+终端命名空间中运行的是真实的main.py（登录命令或常驻服务），因此网络接口发现、源地址
+选择、多接口登录、门户重定向参数和链路中断后的恢复都按真实路径执行。测试按脚本执行
+一系列步骤（登录、踢下线、断开或恢复链路、等待重新认证等），并测量每次登录的耗时和
+常驻服务从网络变化到重新认证的反应时间。
+
+需要root权限以及iproute2和openssl。配置、状态和证书都在临时目录中，结束时删除命名空间。
+
+用法: sudo python netns_harness.py [--interfaces 2] [--open] [--set check_interval=5]
+                                   [--script "login; kick; daemon; await 60"] [--json]
+
+脚本步骤以分号分隔：
+- login [参数...]: 运行main.py login，记录退出码和耗时
+- daemon / stop: 启动或停止常驻服务
+- wait 秒数: 等待
+- kick [IP]: 门户踢下线指定终端，默认为全部终端
+- down 接口 / up 接口: 断开或恢复终端的接口
+- captive / open: 切换外网为强制认证或开放模式
+- await 秒数: 等待门户收到新的登录，记录距上一次网络变化（kick、down、up、captive）的时间
+"""
+
+import os
+import sys
+import json
+import ssl
+import time
+import ctypes
+import shutil
+import shlex
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+from endpoints import DEFAULT_PORTAL_URL
+from captive import DEFAULT_PROBE_URL
+from platforms import APP_NAME
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.netns_harness')
+
+NETNS_DIR = "/var/run/netns"
+CLONE_NEWNET = 0x40000000
+
+PORTAL_IP = urlsplit(DEFAULT_PORTAL_URL).hostname
+PORTAL_LOGIN_PORT = urlsplit(DEFAULT_PORTAL_URL).port
+AC_IP = "172.16.253.1"
+AC_NAME = "NETNS-AC"
+INTERNET_IP = "203.0.113.10"
+INTERNET_GATEWAY = "203.0.113.1"
+CAPTIVE_HOST = urlsplit(DEFAULT_PROBE_URL).hostname
+INTERNET_HOSTS = ("www.baidu.com", CAPTIVE_HOST)
+# 终端的校园网接口: (接口名, 终端地址, 网关地址)，都在默认的校园网网段172.16.0.0/12内
+CLIENT_INTERFACES = (
+    ("campus0", "172.20.0.2", "172.20.0.1"),
+    ("campus1", "172.21.0.2", "172.21.0.1"),
+)
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# 测试使用的配置，可用--set覆盖；检查间隔较短以便测量反应时间
+HARNESS_CONFIG = {
+    "student_id": "N00000000",
+    "password": "netns",
+    "http_engine": "builtin",
+    "check_interval": 10,
+    "retry_interval": 5,
+    "burst_interval": 2,
+    "link_monitor_interval": 0,
+    "trace_slow_threshold": 0,
+}
+
+DEFAULT_SCRIPT = ("login; login; kick; daemon; await 60; kick; await 60; "
+                  "down campus0; wait 3; up campus0; kick; await 60; stop")
+
+# 等待常驻服务退出的时间(秒)，超时后强制结束
+DAEMON_STOP_TIMEOUT = 10
+# 单次登录命令的超时时间(秒)
+LOGIN_TIMEOUT = 120
+
+
+class HarnessError(Exception):
+    """测试环境无法搭建或脚本无法执行"""
+
+
+def _enter_netns(name):
+    """让当前线程进入指定的网络命名空间，其中创建的套接字都属于该命名空间"""
+    fd = os.open(os.path.join(NETNS_DIR, name), os.O_RDONLY)
+    try:
+        if hasattr(os, "setns"):
+            os.setns(fd, CLONE_NEWNET)
+            return
+        # Python 3.12之前没有os.setns
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.setns(fd, CLONE_NEWNET) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    finally:
+        os.close(fd)
+
+
+def _in_netns(name, func):
+    """
+    在进入指定网络命名空间的独立线程中执行函数
+
+    Returns:
+        函数的返回值
+    """
+    result = {}
+
+    def run():
+        try:
+            _enter_netns(name)
+            result["value"] = func()
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, name=f"netns-{name}")
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+class CampusPortal:
+    """门户和外网出口的共享状态：已认证的终端地址、登录记录和请求计数"""
+
+    def __init__(self, captive=True):
+        """
+        初始化门户状态
+
+        Args:
+            captive: 外网是否需要认证，为False时相当于开放网络
+        """
+        self.captive = captive
+        self.sessions = {}
+        self.logins = []
+        self.requests = {"login": 0, "portal_page": 0, "internet": 0, "captive": 0}
+        self._cond = threading.Condition()
+
+    def count(self, kind):
+        with self._cond:
+            self.requests[kind] += 1
+
+    def authenticated(self, ip):
+        """
+        Args:
+            ip: 终端地址
+
+        Returns:
+            bool: 该终端能否访问外网
+        """
+        with self._cond:
+            return not self.captive or ip in self.sessions
+
+    def login(self, ip, source, account):
+        """
+        认证终端
+
+        Args:
+            ip: 登录参数中的终端地址(wlan_user_ip)
+            source: 登录请求的实际来源地址
+            account: 登录账号
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.sessions[ip] = now
+            self.logins.append({"at": now, "ip": ip, "source": source, "account": account})
+            self._cond.notify_all()
+        logger.info(f"门户认证 {ip}（来源 {source}，账号 {account}）")
+
+    def kick(self, ip=None):
+        """
+        踢下线
+
+        Args:
+            ip: 终端地址，为空时踢下线全部终端
+
+        Returns:
+            int: 踢下线的终端数
+        """
+        with self._cond:
+            ips = [ip] if ip else list(self.sessions)
+            kicked = sum(1 for address in ips if self.sessions.pop(address, None) is not None)
+        logger.info(f"门户踢下线 {kicked} 个终端")
+        return kicked
+
+    def wait_for_login(self, after, timeout):
+        """
+        等待门户收到after之后的登录
+
+        Args:
+            after: time.monotonic()时间
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            dict: 登录记录，超时返回None
+        """
+        def found():
+            return next((login for login in self.logins if login["at"] >= after), None)
+
+        with self._cond:
+            self._cond.wait_for(found, timeout)
+            return found()
+
+
+class _Server(ThreadingHTTPServer):
+    """在某个网络命名空间中监听的HTTP(S)服务"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, portal, context=None):
+        self.portal = portal
+        self.context = context
+        super().__init__(address, handler)
+
+    def verify_request(self, request, client_address):
+        # 未认证的终端访问HTTPS时直接断开，与门户拦截HTTPS的表现一致
+        if self.context is not None and not self.portal.authenticated(client_address[0]):
+            self.portal.count("internet")
+            return False
+        return True
+
+    def finish_request(self, request, client_address):
+        if self.context is None:
+            super().finish_request(request, client_address)
+            return
+        try:
+            request = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError) as e:
+            logger.debug(f"TLS握手失败({client_address[0]}): {e}")
+            return
+        try:
+            super().finish_request(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _reply(self, status, body=b"", content_type="text/html; charset=utf-8", location=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+class _PortalHandler(_Handler):
+    """门户：检查页面和登录接口"""
+
+    def do_GET(self):
+        portal = self.server.portal
+        query = parse_qs(urlsplit(self.path).query)
+        if "login" not in query.get("a", ()):
+            portal.count("portal_page")
+            self._reply(200, b"<html><head><title>ePortal</title></head><body>netns portal</body></html>")
+            return
+        portal.count("login")
+        ip = query.get("wlan_user_ip", [""])[0]
+        portal.login(ip, self.client_address[0], query.get("user_account", [""])[0])
+        callback = query.get("callback", ["dr1003"])[0]
+        body = json.dumps({"result": "1", "msg": "Portal协议认证成功！"}, ensure_ascii=False)
+        self._reply(200, f"{callback}({body});".encode("utf-8"), "application/javascript; charset=utf-8")
+
+
+class _InternetHandler(_Handler):
+    """外网：未认证的终端被重定向到门户"""
+
+    def do_GET(self):
+        portal = self.server.portal
+        host = (self.headers.get("Host") or "").split(":")[0]
+        kind = "captive" if host == CAPTIVE_HOST else "internet"
+        portal.count(kind)
+        client = self.client_address[0]
+        if not portal.authenticated(client):
+            location = (f"http://{PORTAL_IP}/a79.htm?wlanuserip={client}"
+                        f"&wlanacip={AC_IP}&wlanacname={quote(AC_NAME)}")
+            self._reply(302, location=location)
+            return
+        if kind == "captive":
+            self._reply(200, b"<HTML><HEAD><TITLE>Success</TITLE></HEAD><BODY>Success</BODY></HTML>")
+        else:
+            self._reply(200, b"<html><body>internet</body></html>")
+
+
+class NetnsHarness:
+    """搭建和拆除校园网拓扑，并在终端命名空间中运行登录核心"""
+
+    def __init__(self, prefix="ahu", interfaces=1, captive=True, config=None):
+        """
+        初始化测试环境，实际的搭建在setup()中进行
+
+        Args:
+            prefix: 网络命名空间名称前缀
+            interfaces: 终端接入校园网的接口数(1或2)
+            captive: 外网是否需要认证
+            config: 覆盖的配置项
+        """
+        self.interfaces = CLIENT_INTERFACES[:max(1, min(int(interfaces), len(CLIENT_INTERFACES)))]
+        self.client_ns = f"{prefix}-client"
+        self.router_ns = f"{prefix}-router"
+        self.portal_ns = f"{prefix}-portal"
+        self.internet_ns = f"{prefix}-internet"
+        self.namespaces = (self.client_ns, self.router_ns, self.portal_ns, self.internet_ns)
+        self.portal = CampusPortal(captive)
+        self.config = dict(HARNESS_CONFIG, **(config or {}))
+        self.timeline = []
+        self._servers = []
+        self._daemon = None
+        self._daemon_log = None
+        self._tempdir = None
+        self._mark = time.monotonic()
+        self._started = self._mark
+
+    def __enter__(self):
+        self.setup()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.teardown()
+
+    def _ip(self, *args):
+        try:
+            subprocess.run(["ip", *args], check=True, capture_output=True, text=True, timeout=10)
+        except subprocess.CalledProcessError as e:
+            raise HarnessError(f"ip {' '.join(args)} 失败: {e.stderr.strip()}")
+
+    def setup(self):
+        """
+        创建命名空间、veth对、地址和路由，启动门户和外网服务
+
+        Raises:
+            HarnessError: 没有root权限、缺少iproute2/openssl或搭建失败
+        """
+        if os.geteuid() != 0:
+            raise HarnessError("需要root权限才能创建网络命名空间")
+        for tool in ("ip", "openssl"):
+            if shutil.which(tool) is None:
+                raise HarnessError(f"未找到 {tool}")
+        self._remove_namespaces()
+        self._tempdir = tempfile.TemporaryDirectory(prefix="autonet4ahu-netns-")
+
+        for name in self.namespaces:
+            self._ip("netns", "add", name)
+            self._ip("-n", name, "link", "set", "lo", "up")
+        _in_netns(self.router_ns, lambda: _write_sysctl("net/ipv4/ip_forward", "1"))
+
+        for index, (interface, address, gateway) in enumerate(self.interfaces):
+            self._veth(self.client_ns, interface, address, self.router_ns, f"rt-{interface}", gateway)
+            self._client_routes(index)
+        self._veth(self.portal_ns, "portal0", PORTAL_IP, self.router_ns, "rt-portal", AC_IP)
+        self._ip("-n", self.portal_ns, "route", "add", "default", "via", AC_IP)
+        self._veth(self.internet_ns, "inet0", INTERNET_IP, self.router_ns, "rt-inet", INTERNET_GATEWAY)
+        self._ip("-n", self.internet_ns, "route", "add", "default", "via", INTERNET_GATEWAY)
+
+        self._write_client_files()
+        context = self._tls_context()
+        self._serve(self.portal_ns, (PORTAL_IP, 80), _PortalHandler)
+        self._serve(self.portal_ns, (PORTAL_IP, PORTAL_LOGIN_PORT), _PortalHandler)
+        self._serve(self.internet_ns, (INTERNET_IP, 80), _InternetHandler)
+        self._serve(self.internet_ns, (INTERNET_IP, 443), _InternetHandler, context)
+        self._started = self._mark = time.monotonic()
+        logger.info(f"测试环境已就绪，终端接口: {', '.join(f'{i}({a})' for i, a, _ in self.interfaces)}")
+
+    def _veth(self, ns_a, name_a, address_a, ns_b, name_b, address_b):
+        self._ip("link", "add", name_a, "netns", ns_a, "type", "veth", "peer", "name", name_b, "netns", ns_b)
+        for ns, name, address in ((ns_a, name_a, address_a), (ns_b, name_b, address_b)):
+            self._ip("-n", ns, "addr", "add", f"{address}/24", "dev", name)
+            self._ip("-n", ns, "link", "set", name, "up")
+
+    def _client_routes(self, index):
+        """
+        添加终端接口的路由：默认路由按接口顺序设置优先级，另按源地址使用接口自己的路由表，
+        绑定源地址的请求从对应接口发出
+        """
+        interface, address, gateway = self.interfaces[index]
+        table = str(100 + index)
+        self._ip("-n", self.client_ns, "route", "replace", "default", "via", gateway,
+                 "dev", interface, "metric", str(100 * (index + 1)))
+        self._ip("-n", self.client_ns, "route", "replace", "default", "via", gateway,
+                 "dev", interface, "table", table)
+        try:
+            self._ip("-n", self.client_ns, "rule", "add", "from", address, "table", table)
+        except HarnessError:
+            # 链路恢复时规则仍在
+            pass
+
+    def _write_client_files(self):
+        """写入终端命名空间的hosts（ip netns exec会挂载到/etc下）、配置文件和证书"""
+        netns_etc = os.path.join("/etc/netns", self.client_ns)
+        os.makedirs(netns_etc, exist_ok=True)
+        with open(os.path.join(netns_etc, "hosts"), "w", encoding="utf-8") as f:
+            f.write(f"127.0.0.1 localhost\n{INTERNET_IP} {' '.join(INTERNET_HOSTS)}\n")
+        # 没有DNS服务器，避免终端解析到真实地址
+        with open(os.path.join(netns_etc, "resolv.conf"), "w", encoding="utf-8") as f:
+            f.write("# netns harness\n")
+
+        root = self._tempdir.name
+        config_dir = os.path.join(root, "config", APP_NAME)
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(self.config, f, ensure_ascii=False, indent=2)
+
+        names = ",".join(f"DNS:{host}" for host in INTERNET_HOSTS)
+        result = subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+             "-subj", "/CN=netns-harness", "-addext", f"subjectAltName={names}",
+             "-keyout", self._path("key.pem"), "-out", self._path("cert.pem")],
+            capture_output=True, text=True, timeout=60,
+        )
+        if result.returncode != 0:
+            raise HarnessError(f"生成证书失败: {result.stderr.strip()}")
+
+    def _tls_context(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self._path("cert.pem"), self._path("key.pem"))
+        return context
+
+    def _path(self, name):
+        return os.path.join(self._tempdir.name, name)
+
+    def _serve(self, netns, address, handler, context=None):
+        server = _in_netns(netns, lambda: _Server(address, handler, self.portal, context))
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.2},
+                         name=f"serve-{address[0]}:{address[1]}", daemon=True).start()
+        self._servers.append(server)
+
+    def client_env(self):
+        """
+        Returns:
+            dict: 终端进程的环境变量，配置和状态目录指向临时目录，并信任测试证书
+        """
+        root = self._tempdir.name
+        env = {key: value for key, value in os.environ.items() if "proxy" not in key.lower()}
+        env.update(
+            HOME=os.path.join(root, "home"),
+            XDG_CONFIG_HOME=os.path.join(root, "config"),
+            XDG_STATE_HOME=os.path.join(root, "state"),
+            SSL_CERT_FILE=self._path("cert.pem"),
+            REQUESTS_CA_BUNDLE=self._path("cert.pem"),
+            PYTHONUNBUFFERED="1",
+        )
+        return env
+
+    def _client_command(self, *args):
+        return ["ip", "netns", "exec", self.client_ns, sys.executable, MAIN_SCRIPT, *args]
+
+    def run_login(self, *args):
+        """
+        在终端命名空间中运行一次main.py login
+
+        Args:
+            *args: 附加的命令行参数，如--local、--trace
+
+        Returns:
+            dict: 退出码、耗时(秒)和输出的最后几行
+        """
+        start = time.monotonic()
+        try:
+            result = subprocess.run(self._client_command("login", *args), env=self.client_env(),
+                                    capture_output=True, text=True, timeout=LOGIN_TIMEOUT)
+            code, output = result.returncode, result.stdout + result.stderr
+        except subprocess.TimeoutExpired as e:
+            code, output = None, f"登录命令超过 {LOGIN_TIMEOUT} 秒未结束: {e}"
+        return {
+            "exit_code": code,
+            "seconds": round(time.monotonic() - start, 3),
+            "output": output.strip().splitlines()[-5:],
+        }
+
+    def start_daemon(self):
+        """在终端命名空间中启动常驻服务"""
+        if self._daemon is not None:
+            return
+        self._daemon_log = open(self._path("daemon.log"), "ab")
+        self._daemon = subprocess.Popen(self._client_command("daemon"), env=self.client_env(),
+                                        stdout=self._daemon_log, stderr=subprocess.STDOUT)
+
+    def stop_daemon(self):
+        """停止常驻服务"""
+        if self._daemon is None:
+            return
+        self._daemon.terminate()
+        try:
+            self._daemon.wait(DAEMON_STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning("常驻服务未能按时退出，强制结束")
+            self._daemon.kill()
+            self._daemon.wait()
+        self._daemon = None
+        self._daemon_log.close()
+
+    def daemon_output(self, lines=20):
+        """
+        Returns:
+            list: 常驻服务输出的最后几行
+        """
+        try:
+            with open(self._path("daemon.log"), "r", encoding="utf-8", errors="replace") as f:
+                return f.read().splitlines()[-lines:]
+        except (OSError, TypeError, AttributeError):
+            return []
+
+    def set_link(self, interface, up):
+        """
+        断开或恢复终端的接口，恢复时重新添加其路由
+
+        Args:
+            interface: 接口名
+            up: 是否恢复
+        """
+        index = next((i for i, (name, _, _) in enumerate(self.interfaces) if name == interface), None)
+        if index is None:
+            raise HarnessError(f"终端没有接口 {interface}")
+        self._ip("-n", self.client_ns, "link", "set", interface, "up" if up else "down")
+        if up:
+            self._client_routes(index)
+
+    def run_script(self, script):
+        """
+        按顺序执行脚本步骤
+
+        Args:
+            script: 以分号分隔的步骤，见模块说明
+
+        Returns:
+            list: 各步骤的执行记录
+        """
+        for step in filter(None, (part.strip() for part in script.split(";"))):
+            action, *args = shlex.split(step)
+            started = time.monotonic()
+            entry = {"step": step, "at": round(started - self._started, 3)}
+            if action == "login":
+                entry.update(self.run_login(*args))
+            elif action == "daemon":
+                self.start_daemon()
+            elif action == "stop":
+                self.stop_daemon()
+            elif action == "wait":
+                time.sleep(float(args[0]))
+            elif action == "kick":
+                entry["kicked"] = self.portal.kick(args[0] if args else None)
+                self._mark = started
+            elif action in ("down", "up"):
+                self.set_link(args[0], action == "up")
+                self._mark = started
+            elif action in ("captive", "open"):
+                self.portal.captive = action == "captive"
+                self._mark = started
+            elif action == "await":
+                login = self.portal.wait_for_login(self._mark, float(args[0]))
+                entry["reaction"] = round(login["at"] - self._mark, 3) if login else None
+                if login is None:
+                    logger.warning(f"{args[0]} 秒内门户未收到新的登录")
+            else:
+                raise HarnessError(f"未知的脚本步骤: {step}")
+            logger.info(f"{step} 完成")
+            self.timeline.append(entry)
+        return self.timeline
+
+    def report(self):
+        """
+        汇总测试结果
+
+        Returns:
+            dict: 各步骤记录、门户登录次数、请求计数，以及登录参数中的终端地址与实际来源不一致的次数
+        """
+        logins = self.portal.logins
+        return {
+            "interfaces": [{"name": name, "ip": address} for name, address, _ in self.interfaces],
+            "timeline": self.timeline,
+            "portal_logins": len(logins),
+            "source_mismatches": sum(1 for login in logins if login["ip"] != login["source"]),
+            "requests": dict(self.portal.requests),
+            "logins_by_ip": {ip: sum(1 for login in logins if login["ip"] == ip) for ip in {l["ip"] for l in logins}},
+        }
+
+    def teardown(self):
+        """停止常驻服务和各服务，删除命名空间和临时目录"""
+        self.stop_daemon()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        self._remove_namespaces()
+        shutil.rmtree(os.path.join("/etc/netns", self.client_ns), ignore_errors=True)
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+            self._tempdir = None
+
+    def _remove_namespaces(self):
+        # 删除命名空间时其中的veth一并删除
+        for name in self.namespaces:
+            if os.path.exists(os.path.join(NETNS_DIR, name)):
+                subprocess.run(["ip", "netns", "del", name], capture_output=True, timeout=10)
+
+
+def _write_sysctl(name, value):
+    with open(os.path.join("/proc/sys", name), "w") as f:
+        f.write(value)
+
+
+def _parse_setting(text):
+    """解析--set的key=value，值按JSON解析，失败时作为字符串"""
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"格式应为key=value: {text}")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于Linux网络命名空间的端到端测试")
+    parser.add_argument("--interfaces", type=int, default=1, choices=(1, 2), help="终端接入校园网的接口数")
+    parser.add_argument("--open", action="store_true", help="外网不需要认证（开放网络）")
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="以分号分隔的测试步骤")
+    parser.add_argument("--prefix", default="ahu", help="网络命名空间名称前缀")
+    parser.add_argument("--set", type=_parse_setting, action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖配置项，值按JSON解析，可重复")
+    parser.add_argument("--verbose", action="store_true", help="输出测试过程和常驻服务的日志")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    harness = NetnsHarness(prefix=args.prefix, interfaces=args.interfaces, captive=not args.open,
+                           config=dict(args.set))
+    try:
+        harness.setup()
+        harness.run_script(args.script)
+        report = harness.report()
+        daemon_output = harness.daemon_output()
+    except HarnessError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        harness.teardown()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    for entry in report["timeline"]:
+        line = f"[{entry['at']:8.2f}s] {entry['step']}"
+        if "exit_code" in entry:
+            line += f": 退出码 {entry['exit_code']}，耗时 {entry['seconds']:.2f} 秒"
+        if "kicked" in entry:
+            line += f": 踢下线 {entry['kicked']} 个终端"
+        if "reaction" in entry:
+            line += (f": {entry['reaction']:.2f} 秒后重新认证" if entry["reaction"] is not None
+                     else ": 超时未重新认证")
+        print(line)
+    requests = report["requests"]
+    print(f"门户登录: {report['portal_logins']} 次，各终端地址: {report['logins_by_ip']}，"
+          f"登录参数与实际来源地址不一致 {report['source_mismatches']} 次")
+    print(f"请求: 登录 {requests['login']}，门户页面 {requests['portal_page']}，"
+          f"外网 {requests['internet']}，重定向探测 {requests['captive']}")
+    if args.verbose and daemon_output:
+        print("常驻服务输出:")
+        print("\n".join(daemon_output))
+
+
+if __name__ == "__main__":
+    main()
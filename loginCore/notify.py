@@ -5,10 +5,12 @@ import json
 import requests
 import os
 import logging
-import subprocess
 import sys
 from urllib.parse import urlparse
 
+from platforms import get_backend
+from tracing import get_tracer
+
 # 获取logger
 logger = logging.getLogger('AutoNet4AHU.notify')
 
@@ -38,7 +40,7 @@ class Notifier:
     
     def _get_system_proxies(self):
         """
-        获取macOS系统代理设置
+        获取系统代理设置，环境变量优先
         
         Returns:
             dict: 包含http和https代理的字典，如果没有代理则返回空字典
@@ -55,11 +57,9 @@ class Notifier:
             if https_proxy:
                 proxies['https'] = https_proxy
             
-            # 如果环境变量中没有代理设置，则尝试获取macOS系统代理
+            # 如果环境变量中没有代理设置，则尝试获取系统代理
             if not proxies:
-                mac_proxies = self._get_macos_proxies()
-                if mac_proxies:
-                    proxies.update(mac_proxies)
+                proxies.update(get_backend().system_proxies())
             
             # 记录代理设置
             if proxies:
@@ -72,52 +72,6 @@ class Notifier:
             
         return proxies
     
-    def _get_macos_proxies(self):
-        """
-        获取macOS特定的系统代理设置
-        
-        Returns:
-            dict: 包含http和https代理的字典，如果没有代理则返回空字典
-        """
-        try:
-            # 使用macOS特有的命令获取代理设置
-            # 检查HTTP代理
-            http_proxy_cmd = "networksetup -getwebproxy Wi-Fi"
-            http_proxy_enabled = subprocess.run(f"{http_proxy_cmd} | grep 'Enabled' | awk '{{print $2}}'", 
-                                             shell=True, capture_output=True, text=True).stdout.strip()
-            
-            # 检查HTTPS代理
-            https_proxy_cmd = "networksetup -getsecurewebproxy Wi-Fi"
-            https_proxy_enabled = subprocess.run(f"{https_proxy_cmd} | grep 'Enabled' | awk '{{print $2}}'", 
-                                              shell=True, capture_output=True, text=True).stdout.strip()
-            
-            proxies = {}
-            
-            # 如果HTTP代理已启用
-            if http_proxy_enabled.lower() == "yes":
-                http_proxy_server = subprocess.run(f"{http_proxy_cmd} | grep 'Server' | awk '{{print $2}}'", 
-                                               shell=True, capture_output=True, text=True).stdout.strip()
-                http_proxy_port = subprocess.run(f"{http_proxy_cmd} | grep 'Port' | awk '{{print $2}}'", 
-                                              shell=True, capture_output=True, text=True).stdout.strip()
-                
-                if http_proxy_server and http_proxy_port:
-                    proxies['http'] = f"http://{http_proxy_server}:{http_proxy_port}"
-            
-            # 如果HTTPS代理已启用
-            if https_proxy_enabled.lower() == "yes":
-                https_proxy_server = subprocess.run(f"{https_proxy_cmd} | grep 'Server' | awk '{{print $2}}'", 
-                                                shell=True, capture_output=True, text=True).stdout.strip()
-                https_proxy_port = subprocess.run(f"{https_proxy_cmd} | grep 'Port' | awk '{{print $2}}'", 
-                                               shell=True, capture_output=True, text=True).stdout.strip()
-                
-                if https_proxy_server and https_proxy_port:
-                    proxies['https'] = f"https://{https_proxy_server}:{https_proxy_port}"
-            
-            return proxies
-        except Exception as e:
-            logger.error(f"获取macOS代理设置时发生错误: {str(e)}")
-            return {}
-    
     def validate_webhook_url(self, url):
         """
         验证webhook URL是否有效
@@ -212,14 +166,16 @@ class Notifier:
             try:
                 headers = {"Content-Type": "application/json"}
                 
-                # 使用requests会话和系统代理发送请求
-                response = self.session.post(
-                    webhook, 
-                    headers=headers, 
-                    data=json.dumps(data, ensure_ascii=False).encode('utf-8'),
-                    proxies=self.proxies if self.proxies else None,
-                    timeout=self.timeout
-                )
+                # 使用requests会话和系统代理发送请求；追踪中只记录主机名，不记录webhook密钥
+                with get_tracer().span("webhook_post", host=urlparse(webhook).hostname) as span:
+                    response = self.session.post(
+                        webhook, 
+                        headers=headers, 
+                        data=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                        proxies=self.proxies if self.proxies else None,
+                        timeout=self.timeout
+                    )
+                    span.set("status_code", response.status_code)
                 
                 # 处理响应
                 if response.status_code != 200:
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+
+from platforms import get_backend
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.paths')
+
+
+def get_config_dir():
+    """
+    获取用户配置目录（macOS为~/Library/Application Support，Linux为XDG_CONFIG_HOME）
+
+    Returns:
+        str: 配置目录路径
+    """
+    return get_backend().config_dir()
+
+
+def get_state_dir():
+    """
+    获取运行状态目录，多个独立进程通过该目录共享状态，目录不存在时自动创建
+
+    Returns:
+        str: 状态目录路径
+    """
+    state_dir = get_backend().state_dir()
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"创建状态目录失败: {e}")
+    return state_dir
+
+
+def get_log_dir():
+    """
+    获取日志目录
+
+    Returns:
+        str: 日志目录路径
+    """
+    return get_backend().log_dir()
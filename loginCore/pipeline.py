@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按依赖关系并发执行的步骤图
+
+登录前的各项准备（本机IP探测、在线状态检查、校园网检查、门户重定向探测、预先建立到
+门户的连接）按依赖图并发执行，每个步骤在其依赖全部完成后立即开始（如预先连接等待
+校园网检查选出门户节点），总耗时接近最慢的一条依赖链而不是各步骤之和。
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import get_tracer
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.pipeline')
+
+
+class StepSkipped(Exception):
+    """依赖的步骤失败，本步骤未执行"""
+
+
+class Pipeline:
+    """步骤依赖图，步骤只能依赖先加入的步骤，因此不会出现环"""
+
+    def __init__(self):
+        self._steps = {}
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name, func, deps=()):
+        """
+        加入步骤
+
+        Args:
+            name: 步骤名称
+            func: 无参函数，返回值保存在results中
+            deps: 依赖的步骤名称
+
+        Raises:
+            ValueError: 名称重复或依赖的步骤不存在
+        """
+        if name in self._steps:
+            raise ValueError(f"步骤重复: {name}")
+        missing = [dep for dep in deps if dep not in self._steps]
+        if missing:
+            raise ValueError(f"步骤 {name} 依赖的步骤不存在: {', '.join(missing)}")
+        self._steps[name] = (func, tuple(deps))
+
+    def _call(self, parent, func):
+        # 线程池中的步骤挂在调用方当前的追踪span下
+        with get_tracer().attach(parent):
+            return func()
+
+    def run(self):
+        """
+        执行所有步骤，依赖全部成功的步骤立即提交到线程池
+
+        Returns:
+            dict: 步骤名称到返回值的映射；失败的步骤及其下游不在其中，异常见errors
+        """
+        self.results = {}
+        self.errors = {}
+        if not self._steps:
+            return self.results
+
+        parent = get_tracer().current()
+        pending = dict(self._steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(self._steps), thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    failed = [dep for dep in deps if dep in self.errors]
+                    if failed:
+                        del pending[name]
+                        self.errors[name] = StepSkipped(f"依赖的步骤失败: {', '.join(failed)}")
+                    elif all(dep in self.results for dep in deps):
+                        del pending[name]
+                        running[executor.submit(self._call, parent, func)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        logger.warning(f"步骤 {name} 执行失败: {e}")
+                        self.errors[name] = e
+        return self.results
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+平台相关功能：目录位置、本机IP与路由、系统代理和系统版本
+
+macOS使用ifconfig、networksetup和~/Library下的目录；
+Linux使用iproute2、GNOME代理设置（gsettings）和XDG目录规范。
+"""
+
+import os
+import re
+import sys
+import socket
+import platform
+import ipaddress
+import subprocess
+import logging
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.platforms')
+
+APP_NAME = "AutoNet4AHU"
+
+# 用于确定默认路由出口的外部地址，只做路由查询，不会发出数据
+ROUTE_PROBE_ADDRESS = "8.8.8.8"
+ROUTE_PROBE_ADDRESS_V6 = "2400:3200::1"
+
+
+def _is_global_ipv6(address):
+    try:
+        return ipaddress.IPv6Address(address.split("%")[0]).is_global
+    except ValueError:
+        return False
+
+
+def _run(args, timeout=5):
+    """
+    执行外部命令并返回标准输出，命令不存在或执行失败时返回空字符串
+    """
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"执行命令 {args[0]} 失败: {e}")
+        return ""
+    return result.stdout if result.returncode == 0 else ""
+
+
+class PlatformBackend:
+    """平台后端基类，提供与平台无关的默认实现"""
+
+    name = "unknown"
+    display_name = "未知系统"
+
+    def config_dir(self):
+        """
+        Returns:
+            str: 用户配置目录
+        """
+        return os.path.expanduser(f"~/.{APP_NAME}")
+
+    def state_dir(self):
+        """
+        Returns:
+            str: 运行状态目录
+        """
+        return os.path.join(self.config_dir(), "state")
+
+    def log_dir(self):
+        """
+        Returns:
+            str: 日志目录
+        """
+        return os.path.join(self.config_dir(), "logs")
+
+    def ipv4_addresses(self):
+        """
+        列出本机已启用且链路在线的网络接口的IPv4地址（不含回环地址）
+
+        Returns:
+            list: (接口名, IP地址)列表
+        """
+        return []
+
+    def ipv6_addresses(self):
+        """
+        列出本机已启用且链路在线的网络接口的全局IPv6地址（不含链路本地、唯一本地和已弃用的地址）
+
+        Returns:
+            list: (接口名, IPv6地址)列表
+        """
+        return []
+
+    def ipv4_addresses_in(self, networks):
+        """
+        列出位于指定网段内的接口地址
+
+        Args:
+            networks: 网段列表，如["172.16.0.0/12"]
+
+        Returns:
+            list: (接口名, IP地址)列表
+        """
+        networks = [ipaddress.ip_network(network, strict=False) for network in networks]
+        return [
+            (interface, address) for interface, address in self.ipv4_addresses()
+            if any(ipaddress.ip_address(address) in network for network in networks)
+        ]
+
+    def interface_of(self, ip):
+        """
+        查找IPv4地址所在的网络接口
+
+        Args:
+            ip: IPv4地址
+
+        Returns:
+            str: 接口名，找不到时返回None
+        """
+        for interface, address in self.ipv4_addresses():
+            if address == ip:
+                return interface
+        return None
+
+    def route_source_ip(self, destination=ROUTE_PROBE_ADDRESS):
+        """
+        获取访问指定地址时使用的本机源地址
+
+        Args:
+            destination: 目标地址，IPv6地址时返回IPv6源地址
+
+        Returns:
+            str: 源IP地址，失败返回None
+        """
+        family = socket.AF_INET6 if ":" in destination else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            sock.settimeout(1.0)
+            sock.connect((destination, 80))
+            return sock.getsockname()[0]
+        except OSError as e:
+            logger.debug(f"通过路由查询获取源地址失败: {e}")
+            return None
+        finally:
+            sock.close()
+
+    def primary_ip(self):
+        """
+        获取本机主IP地址：优先使用默认路由的出口地址，其次使用第一个接口地址
+
+        Returns:
+            str: IP地址，失败返回None
+        """
+        ip = self.route_source_ip()
+        if ip and not ip.startswith("127."):
+            return ip
+        addresses = self.ipv4_addresses()
+        return addresses[0][1] if addresses else None
+
+    def global_ipv6(self, interface=None):
+        """
+        获取全局IPv6地址，优先使用系统实际会选用的源地址（可能是临时隐私地址）
+
+        Args:
+            interface: 限定的网络接口，通常为门户所在的接口
+
+        Returns:
+            str: IPv6地址，没有全局IPv6地址时返回None
+        """
+        addresses = self.ipv6_addresses()
+        candidates = [address for name, address in addresses if interface is None or name == interface]
+        source = self.route_source_ip(ROUTE_PROBE_ADDRESS_V6)
+        if source and _is_global_ipv6(source) and (source in candidates or not addresses):
+            return source
+        return candidates[0] if candidates else None
+
+    def system_proxies(self):
+        """
+        获取系统代理设置
+
+        Returns:
+            dict: 包含http和https代理的字典，如果没有代理则返回空字典
+        """
+        return {}
+
+    def os_version(self):
+        """
+        Returns:
+            str: 系统版本
+        """
+        return platform.release() or "未知版本"
+
+
+class MacOSBackend(PlatformBackend):
+    """macOS平台后端"""
+
+    name = "macos"
+    display_name = "macOS"
+
+    def config_dir(self):
+        return os.path.expanduser(f"~/Library/Application Support/{APP_NAME}")
+
+    def log_dir(self):
+        return os.path.expanduser(f"~/Library/Logs/{APP_NAME}")
+
+    def _active_interfaces(self):
+        """
+        按接口拆分ifconfig输出，只保留已启用、链路在线且不是inactive状态的接口
+
+        Returns:
+            list: (接口名, 该接口的输出行)列表
+        """
+        blocks = []
+        for line in _run(["ifconfig"]).splitlines():
+            if line and not line[0].isspace():
+                # 输出格式: en0: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500
+                match = re.search(r"<([^>]*)>", line)
+                flags = set(match.group(1).split(",")) if match else set()
+                blocks.append((line.split(":", 1)[0], flags, []))
+            elif blocks:
+                blocks[-1][2].append(line)
+        return [
+            (interface, lines) for interface, flags, lines in blocks
+            if {"UP", "RUNNING"} <= flags and not any(re.match(r"\s+status: inactive", line) for line in lines)
+        ]
+
+    def ipv4_addresses(self):
+        addresses = []
+        for interface, lines in self._active_interfaces():
+            for line in lines:
+                match = re.match(r"\s+inet (\d+\.\d+\.\d+\.\d+)", line)
+                if match and not match.group(1).startswith("127."):
+                    addresses.append((interface, match.group(1)))
+        return addresses
+
+    def ipv6_addresses(self):
+        addresses = []
+        for interface, lines in self._active_interfaces():
+            for line in lines:
+                match = re.match(r"\s+inet6 ([0-9a-fA-F:]+)\s", line)
+                if match and _is_global_ipv6(match.group(1)) and not re.search(r"\b(deprecated|detached|tentative)\b", line):
+                    addresses.append((interface, match.group(1)))
+        return addresses
+
+    def primary_ip(self):
+        # macOS上ifconfig列出的第一个地址通常就是活动接口，与历史行为保持一致
+        addresses = self.ipv4_addresses()
+        if addresses:
+            return addresses[0][1]
+        return super().primary_ip()
+
+    def system_proxies(self):
+        proxies = {}
+        for scheme, option in (("http", "-getwebproxy"), ("https", "-getsecurewebproxy")):
+            settings = {}
+            for line in _run(["networksetup", option, "Wi-Fi"]).splitlines():
+                key, _, value = line.partition(":")
+                settings[key.strip()] = value.strip()
+            if settings.get("Enabled", "").lower() == "yes" and settings.get("Server") and settings.get("Port"):
+                proxies[scheme] = f"{scheme}://{settings['Server']}:{settings['Port']}"
+        return proxies
+
+    def os_version(self):
+        return platform.mac_ver()[0] or "未知版本"
+
+
+class LinuxBackend(PlatformBackend):
+    """Linux平台后端"""
+
+    name = "linux"
+    display_name = "Linux"
+
+    def _xdg_dir(self, variable, default):
+        base = os.environ.get(variable)
+        if not base or not os.path.isabs(base):
+            base = os.path.expanduser(default)
+        return os.path.join(base, APP_NAME)
+
+    def config_dir(self):
+        return self._xdg_dir("XDG_CONFIG_HOME", "~/.config")
+
+    def state_dir(self):
+        return self._xdg_dir("XDG_STATE_HOME", "~/.local/state")
+
+    def log_dir(self):
+        return os.path.join(self.state_dir(), "logs")
+
+    def _active_interfaces(self):
+        """
+        列出已启用且链路在线（UP和LOWER_UP）的接口，未插线或已停用的接口即使配置了地址也不可用
+
+        Returns:
+            set: 接口名集合
+        """
+        interfaces = set()
+        # 输出格式: 2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 ...
+        for line in _run(["ip", "-o", "link", "show"]).splitlines():
+            match = re.match(r"\d+:\s+([^:]+):\s+<([^>]*)>", line)
+            if match and {"UP", "LOWER_UP"} <= set(match.group(2).split(",")):
+                interfaces.add(match.group(1).split("@")[0])
+        return interfaces
+
+    def ipv4_addresses(self):
+        addresses = []
+        active = self._active_interfaces()
+        # 输出格式: 2: eth0    inet 172.16.1.2/16 brd ... scope global eth0
+        for line in _run(["ip", "-o", "-4", "addr", "show"]).splitlines():
+            match = re.match(r"\d+:\s+(\S+)\s+inet (\d+\.\d+\.\d+\.\d+)/", line)
+            if not match or match.group(2).startswith("127."):
+                continue
+            interface = match.group(1).split("@")[0]
+            if interface in active:
+                addresses.append((interface, match.group(2)))
+        return addresses
+
+    def ipv6_addresses(self):
+        addresses = []
+        active = self._active_interfaces()
+        # 输出格式: 2: eth0    inet6 2001:da8::2/64 scope global dynamic mngtmpaddr ...
+        for line in _run(["ip", "-o", "-6", "addr", "show", "scope", "global"]).splitlines():
+            match = re.match(r"\d+:\s+(\S+)\s+inet6 ([0-9a-fA-F:]+)/", line)
+            if not match or not _is_global_ipv6(match.group(2)) or re.search(r"\b(deprecated|tentative|dadfailed)\b", line):
+                continue
+            interface = match.group(1).split("@")[0]
+            if interface in active:
+                addresses.append((interface, match.group(2)))
+        return addresses
+
+    def route_source_ip(self, destination=ROUTE_PROBE_ADDRESS):
+        version = "-6" if ":" in destination else "-4"
+        match = re.search(r"\bsrc ([0-9a-fA-F:.]+)", _run(["ip", version, "route", "get", destination]))
+        if match:
+            return match.group(1)
+        return super().route_source_ip(destination)
+
+    def system_proxies(self):
+        # 桌面环境使用GNOME代理设置，服务器上通常只有环境变量
+        if _run(["gsettings", "get", "org.gnome.system.proxy", "mode"]).strip().strip("'") != "manual":
+            return {}
+        proxies = {}
+        for scheme in ("http", "https"):
+            schema = f"org.gnome.system.proxy.{scheme}"
+            host = _run(["gsettings", "get", schema, "host"]).strip().strip("'")
+            port = _run(["gsettings", "get", schema, "port"]).strip()
+            if host and port.isdigit() and port != "0":
+                proxies[scheme] = f"http://{host}:{port}"
+        return proxies
+
+    def os_version(self):
+        try:
+            with open("/etc/os-release", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("PRETTY_NAME="):
+                        return line.split("=", 1)[1].strip().strip('"')
+        except OSError:
+            pass
+        return super().os_version()
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    获取当前平台的后端
+
+    Returns:
+        PlatformBackend: 平台后端实例
+    """
+    global _backend
+    if _backend is None:
+        if sys.platform == "darwin":
+            _backend = MacOSBackend()
+        elif sys.platform.startswith("linux"):
+            _backend = LinuxBackend()
+        else:
+            _backend = PlatformBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    替换当前平台的后端，模拟器用于隔离配置、状态目录和网络接口
+
+    Args:
+        backend: PlatformBackend实例，为None时恢复按平台自动选择
+
+    Returns:
+        PlatformBackend: 替换前的后端，尚未创建时为None
+    """
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
@@ -1,22 +1,104 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
-import socket
 import re
+import socket
 import json
 import logging
 import time
-import subprocess
-from urllib.parse import urlencode
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlparse
+
+from endpoints import EndpointSelector, PortalEndpoint
+from captive import probe_redirect, parse_redirect_params
+from platforms import get_backend
+from transport import create_transport, DEFAULT_ENGINE, TransportTimeout, TransportConnectionError
+from tracing import get_tracer
+from portal_profile import ProfileCache, discover_profile
+from pipeline import Pipeline
+from clock import get_clock
 
 # 获取logger
 logger = logging.getLogger('AutoNet4AHU.portal')
 
+# 登录错误码
+ERROR_AUTH = "auth_failed"
+ERROR_DEVICE_LIMIT = "device_limit"
+ERROR_QUOTA = "quota_exhausted"
+ERROR_ACCOUNT_DISABLED = "account_disabled"
+ERROR_PORTAL = "portal_error"
+ERROR_NETWORK = "network_unavailable"
+ERROR_NOT_CAMPUS = "not_on_campus"
+ERROR_RETRIES = "retries_exhausted"
+ERROR_PORTAL_UNAVAILABLE = "portal_unavailable"
+
+# 账号级错误：换用其他账号可能成功，同一账号重试无意义
+ACCOUNT_ERRORS = frozenset([ERROR_AUTH, ERROR_DEVICE_LIMIT, ERROR_QUOTA, ERROR_ACCOUNT_DISABLED])
+
+# 门户返回信息中的短语与错误码的对应关系。账号级错误会让账号进入冷却并切换账号，
+# 因此只匹配明确指向账号的完整短语，"终端IP已经在线"、"服务暂停"等信息不算账号错误
+_ERROR_PATTERNS = tuple((code, re.compile(pattern, re.IGNORECASE)) for code, pattern in (
+    (ERROR_AUTH, r"密码错误|用户不存在|userid error|ldap auth error|账号或密码|帐号或密码"),
+    (ERROR_DEVICE_LIMIT, r"(终端|设备|在线)(数|数量|个数)\s*(已达|达到|已超过|超过|超出)|limit users err"
+                         r"|其[它他]设备.{0,4}(登录|在线)"),
+    (ERROR_QUOTA, r"余额不足|欠费|(流量|时长)已?(用完|用尽)"),
+    (ERROR_ACCOUNT_DISABLED, r"(账号|帐号|账户|用户)\s*(已|已被|被)?(停用|冻结|禁用|锁定|暂停)"),
+))
+
+
+def classify_error(message):
+    """
+    根据门户返回的错误信息判断错误类型
+
+    Args:
+        message: 门户返回的错误信息
+
+    Returns:
+        str: 错误码
+    """
+    text = message or ""
+    for code, pattern in _ERROR_PATTERNS:
+        if pattern.search(text):
+            return code
+    return ERROR_PORTAL
+
+
+def _parse_json(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def probe_online(timeout=5, source_ip=None, engine=DEFAULT_ENGINE):
+    """
+    检查是否可以访问外网，即当前是否已通过校园网认证
+    
+    Args:
+        timeout: 请求超时时间(秒)
+        source_ip: 绑定的本机源地址，用于检查指定网络接口
+        engine: HTTP引擎，requests或builtin
+    
+    Returns:
+        bool: 是否已在线
+    """
+    transport = create_transport(engine, source_ip)
+    try:
+        response = transport.get("https://www.baidu.com", timeout=timeout)
+        return response.status_code == 200
+    except Exception:
+        return False
+    finally:
+        transport.close()
+
+
 class ePortal:
     """安徽大学校园网自动登录类"""
     
-    def __init__(self, user_account, user_password, max_retries=3, retry_interval=2):
+    def __init__(self, user_account, user_password, max_retries=3, retry_interval=2,
+                 endpoints=None, selector=None, discover=True, breaker=None, ipv6=True,
+                 wlan_user_ip=None, source_ip=None, engine=DEFAULT_ENGINE, profiles=None,
+                 redirect_params=True, hedge=None):
         """
         初始化ePortal实例
         
@@ -25,81 +107,270 @@ class ePortal:
             user_password: 密码
             max_retries: 最大重试次数
             retry_interval: 重试间隔(秒)
+            endpoints: 门户节点列表（URL字符串或对象），为空时使用默认节点
+            selector: 共享的EndpointSelector实例，提供时忽略endpoints
+            discover: 是否从门户重定向中发现新的节点
+            breaker: 门户熔断器（CircuitBreaker），熔断期间不发出登录请求
+            ipv6: 是否同时认证门户所在接口的全局IPv6地址
+            wlan_user_ip: 需要认证的设备IP，为空时认证本机；指定时不做本机IP探测和IPv6认证
+            source_ip: 本机网络接口的地址，指定时探测和登录请求都从该地址发出，并认证该地址
+            engine: HTTP引擎，requests或builtin（只依赖标准库的内置引擎）
+            profiles: 共享的门户协议参数缓存（ProfileCache），为空时从状态目录读取
+            redirect_params: 是否使用门户重定向中携带的用户IP、MAC和AC参数；指定wlan_user_ip时不使用
+            hedge: 登录请求的对冲策略（HedgePolicy），为空时不对冲
         """
         self.user_account = user_account
         self.user_password = user_password
         self.max_retries = max_retries
         self.retry_interval = retry_interval
-        self.base_url = "http://172.16.253.3:801/eportal/"
-        self.login_url = f"{self.base_url}?c=Portal&a=login&callback=dr1003&login_method=1&jsVersion=3.3.2&v=1117"
-        self.campus_check_url = "http://172.16.253.3/a79.htm"
+        self.discover = discover
+        # 为其他设备认证时，本机捕获到的重定向参数不适用
+        self.redirect_params = redirect_params and wlan_user_ip is None
+        self.breaker = breaker
+        self.hedge = hedge
+        self.ipv6 = ipv6 and wlan_user_ip is None
+        self.fixed_ip = wlan_user_ip is not None or source_ip is not None
+        self.source_ip = source_ip
+        self.engine = engine
+        self.selector = selector or EndpointSelector(endpoints)
+        self.profiles = profiles or ProfileCache()
+        self._profile_refreshed = False
         self.headers = {
             "Accept": "*/*",
             "Accept-Language": "zh-CN,zh;q=0.9",
             "Cache-Control": "no-cache",
             "Pragma": "no-cache",
-            "Referer": "http://172.16.253.3/",
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Safari/605.1.15"
         }
-        self.wlan_user_ip = self.get_local_ip()
-        self.session = requests.Session()
+        self._use_endpoint(self.selector.best())
+        self.phases = []
+        # 本机IP在登录时与其他检查并发探测，见discover_ip()
+        self.wlan_user_ip = wlan_user_ip or source_ip
+        self.wlan_user_ipv6 = ""
+        self._ip_discovered = False
+        self.wlan_user_mac = "000000000000"
+        self.wlan_ac_ip = ""
+        self.wlan_ac_name = ""
+        self.redirect = None
+        self._redirect_probed = False
+        self.last_error_code = None
+        self.already_logged_in = False
+        # 双栈网络下IPv4和IPv6连接竞速，先连通者胜出
+        self.transport = create_transport(engine, source_ip)
+    
+    def close(self):
+        """关闭门户请求使用的传输及其保持的连接"""
+        self.transport.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _use_endpoint(self, endpoint):
+        """
+        切换当前使用的门户节点
         
-        # 应对macOS网络环境可能的变化
-        self.session.trust_env = True  # 允许从环境变量读取代理配置
+        Args:
+            endpoint: PortalEndpoint实例
+        """
+        self.endpoint = endpoint
+        self.profile = self.profiles.get(endpoint.host)
+        self.base_url = self.profile.base_url(endpoint)
+        self.login_url = self.profile.login_url(endpoint)
+        self.campus_check_url = self.profile.check_url(endpoint)
+        self.headers["Referer"] = endpoint.referer
+    
+    def discover_ip(self):
+        """
+        探测本机IP和门户所在接口的IPv6地址，只返回结果，不修改实例状态
+        
+        Returns:
+            tuple: (IPv4地址, IPv6地址)
+        """
+        with self._phase("ip_discovery") as span:
+            ip = self.wlan_user_ip if self.fixed_ip else self.get_local_ip()
+            ipv6 = self.get_local_ipv6(ip)
+            span.set("ip", ip)
+        return ip, ipv6
+    
+    def warm_up(self, login_url=None):
+        """
+        预先建立到门户节点登录接口的连接，登录请求直接复用
+        
+        Args:
+            login_url: 登录接口地址，默认为当前门户节点的登录接口
+        """
+        login_url = login_url or self.login_url
+        with self._phase("warmup", endpoint=urlparse(login_url).hostname) as span:
+            span.set("connected", self.transport.preconnect(login_url, timeout=5))
+    
+    def fetch_redirect(self):
+        """
+        访问明文HTTP地址捕获门户重定向，只返回结果，不修改实例状态
+        
+        Returns:
+            str: 门户重定向地址，未被拦截时返回None
+        """
+        with self._phase("captive_probe") as span:
+            redirect = probe_redirect(self.transport)
+            span.set("redirected", redirect is not None)
+        return redirect
+    
+    def _use_redirect(self, redirect):
+        """
+        记录捕获到的门户重定向，并从中发现门户节点
+        
+        Args:
+            redirect: 门户重定向地址，未被拦截时为None
+        """
+        self._redirect_probed = True
+        self.redirect = redirect
+        if redirect and self.discover:
+            self.discover_endpoint(redirect)
+    
+    def capture_redirect(self):
+        """
+        访问明文HTTP地址捕获门户重定向，并从中发现门户节点
+        
+        Returns:
+            str: 门户重定向地址，未被拦截时返回None
+        """
+        redirect = self.fetch_redirect()
+        self._use_redirect(redirect)
+        return redirect
+    
+    def probe_captive_redirect(self):
+        """
+        捕获门户重定向，发现门户节点并使用其中的登录参数
+        
+        Returns:
+            str: 门户重定向地址，未被拦截时返回None
+        """
+        redirect = self.capture_redirect()
+        if redirect and self.redirect_params:
+            self.apply_redirect_params(redirect)
+        return redirect
+    
+    def apply_redirect_params(self, redirect):
+        """
+        使用门户重定向中携带的用户IP、MAC和AC参数，门户据此识别终端，比本机探测的地址可靠
+        
+        Args:
+            redirect: 门户重定向地址
+        """
+        params = parse_redirect_params(redirect)
+        if params.user_ip and params.user_ip != self.wlan_user_ip:
+            if self.wlan_user_ip:
+                logger.info(f"门户识别的终端地址为 {params.user_ip}（本机探测为 {self.wlan_user_ip}），使用门户提供的地址")
+            self.wlan_user_ip = params.user_ip
+        if params.user_ip:
+            # 地址由门户给出，重试时无需重新探测
+            self.fixed_ip = True
+        if params.user_mac:
+            self.wlan_user_mac = params.user_mac
+        if params.ac_ip:
+            self.wlan_ac_ip = params.ac_ip
+        if params.ac_name:
+            self.wlan_ac_name = params.ac_name
+    
+    def discover_endpoint(self, redirect):
+        """
+        从门户重定向中发现门户节点，加入节点列表
+        
+        Args:
+            redirect: 门户重定向地址
+        """
+        host = urlparse(redirect).hostname
+        # 选择器由多个接口的登录共享，通过ranked()在锁内取得节点列表的副本
+        if not host or any(endpoint.host == host for endpoint in self.selector.ranked()):
+            return
+        self.selector.add_discovered(PortalEndpoint(f"http://{host}:801/eportal/"))
+    
+    def refresh_profile(self):
+        """
+        登录请求出现协议层面的失败（接口404、响应无法解析）后重新发现当前门户的协议参数，
+        每次登录最多发现一次
+        
+        Returns:
+            bool: 是否得到了与当前不同的新参数
+        """
+        if self._profile_refreshed:
+            return False
+        self._profile_refreshed = True
+        logger.warning(f"门户 {self.endpoint.host} 的响应与协议参数不符，重新发现协议参数")
+        with self._phase("profile_discovery", endpoint=self.endpoint.host) as span:
+            profile = discover_profile(self.transport, self.endpoint, self.profile, self.headers)
+            span.set("changed", profile is not None and profile != self.profile)
+        if profile is None or profile == self.profile:
+            return False
+        self.profiles.put(self.endpoint.host, profile)
+        self._use_endpoint(self.endpoint)
+        return True
+    
+    @contextmanager
+    def _phase(self, name, **attributes):
+        """
+        记录登录流程中单个阶段的耗时，同时生成同名的追踪span
+        
+        Args:
+            name: 阶段名称
+            **attributes: span属性
+        
+        Yields:
+            Span: 追踪span，可补充属性
+        """
+        start = time.perf_counter()
+        try:
+            with get_tracer().span(name, **attributes) as span:
+                yield span
+        finally:
+            self.phases.append({"name": name, "duration": round(time.perf_counter() - start, 4)})
     
     def get_local_ip(self):
         """
-        获取本机IP地址，针对macOS系统优化
+        获取本机IP地址，通过平台后端查询路由和网络接口
         
         Returns:
             str: 本机IP地址
         """
+        ip = get_backend().primary_ip()
+        if ip:
+            logger.info(f"获取到IP地址: {ip}")
+            return ip
+        
         try:
-            # 首先尝试使用原生macOS命令获取网络接口信息
-            result = self._get_mac_active_ip()
-            if result:
-                logger.info(f"通过macOS命令获取到IP地址: {result}")
-                return result
-            
-            # 如果macOS命令失败，尝试通过socket连接获取
-            logger.info("尝试通过socket连接获取IP地址")
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.settimeout(1.0)  # 设置较短的超时时间
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            logger.info(f"通过socket连接获取到IP地址: {ip}")
+            hostname = socket.gethostname()
+            ip = socket.gethostbyname(hostname)
+            logger.info(f"通过hostname获取到IP地址: {ip}")
             return ip
         except Exception as e:
-            # 如果上述方法失败，尝试其他方法
-            logger.warning(f"通过socket连接获取IP地址失败: {e}")
-            try:
-                hostname = socket.gethostname()
-                ip = socket.gethostbyname(hostname)
-                logger.info(f"通过hostname获取到IP地址: {ip}")
-                return ip
-            except Exception as e:
-                logger.error(f"获取IP地址失败: {e}")
-                # 在macOS上，优先返回一个可能的局域网IP范围
-                return "10.0.0.1"  # macOS常用局域网IP
+            logger.error(f"获取IP地址失败: {e}")
+            # 优先返回一个可能的局域网IP范围
+            return "10.0.0.1"
     
-    def _get_mac_active_ip(self):
+    def get_local_ipv6(self, ip=None):
         """
-        使用macOS特有命令获取活动网络接口的IP地址
+        获取门户所在网络接口的全局IPv6地址
+        
+        Args:
+            ip: 门户所在接口的IPv4地址，默认为当前认证的地址
         
         Returns:
-            str: 活动网络接口的IP地址，失败返回None
+            str: IPv6地址，未启用IPv6或没有全局地址时返回空字符串
         """
+        if not self.ipv6:
+            return ""
+        backend = get_backend()
         try:
-            # 使用ifconfig和grep查找活动接口
-            cmd = "ifconfig | grep 'inet ' | grep -v 127.0.0.1 | awk '{print $2}' | head -n 1"
-            ip = subprocess.check_output(cmd, shell=True, universal_newlines=True).strip()
-            if ip:
-                return ip
-            return None
+            ipv6 = backend.global_ipv6(backend.interface_of(ip or self.wlan_user_ip))
         except Exception as e:
-            logger.warning(f"通过macOS命令获取IP地址失败: {e}")
-            return None
+            logger.warning(f"获取IPv6地址失败: {e}")
+            return ""
+        if ipv6:
+            logger.info(f"获取到IPv6地址: {ipv6}")
+        return ipv6 or ""
     
     def check_network_connectivity(self):
         """
@@ -114,7 +385,7 @@ class ePortal:
                 return True
             
             # 如果校园网不可访问，检查互联网连接
-            response = requests.get("https://www.baidu.com", timeout=5)
+            response = self.transport.get("https://www.baidu.com", timeout=5)
             return response.status_code == 200
         except Exception as e:
             logger.warning(f"网络连接检查失败: {e}")
@@ -122,17 +393,50 @@ class ePortal:
     
     def is_connected_to_campus_network(self):
         """
-        检查是否已连接到校园网（但可能尚未认证）
+        检查是否已连接到校园网（但可能尚未认证），并切换到可达的门户节点
         
         Returns:
             bool: 是否已连接到校园网
         """
-        try:
-            response = self.session.get(self.campus_check_url, timeout=5, headers=self.headers)
-            return response.status_code == 200
-        except Exception as e:
-            logger.warning(f"校园网连接检查失败: {e}")
+        endpoint = self.find_campus_endpoint(self.headers)
+        if endpoint is None:
             return False
+        self._use_endpoint(endpoint)
+        return True
+    
+    def find_campus_endpoint(self, headers):
+        """
+        按得分依次检查各门户节点，找出第一个可达的节点，不切换当前节点
+        
+        Args:
+            headers: 请求头
+        
+        Returns:
+            PortalEndpoint: 可达的节点，都不可达时返回None
+        """
+        # 依次检查各门户节点，顺便测量RTT；有节点可达时才记录其他节点的失败，
+        # 避免不在校园网时把所有节点都记为故障
+        unreachable = []
+        for endpoint in self.selector.ranked():
+            start = time.perf_counter()
+            try:
+                with get_tracer().span("probe", endpoint=endpoint.host) as span:
+                    check_url = self.profiles.get(endpoint.host).check_url(endpoint)
+                    response = self.transport.get(check_url, timeout=5, headers=headers)
+                    span.set("status_code", response.status_code)
+            except Exception as e:
+                logger.warning(f"校园网连接检查失败({endpoint.host}): {e}")
+                unreachable.append(endpoint)
+                continue
+            if response.status_code != 200:
+                unreachable.append(endpoint)
+                continue
+            
+            self.selector.record_success(endpoint, time.perf_counter() - start)
+            for failed in unreachable:
+                self.selector.record_failure(failed)
+            return endpoint
+        return None
     
     def is_already_logged_in(self):
         """
@@ -141,104 +445,252 @@ class ePortal:
         Returns:
             bool: 是否已登录
         """
-        try:
-            # 尝试访问外网
-            response = requests.get("https://www.baidu.com", timeout=5)
-            return response.status_code == 200
-        except Exception:
-            return False
+        return probe_online(source_ip=self.source_ip, engine=self.engine)
     
-    def login(self):
+    def _prepare(self, check_status, portal_allowed=True):
+        """
+        并发执行登录前的准备步骤：本机IP探测、预先连接门户，以及（check_status时）
+        在线状态检查、校园网检查和门户重定向探测。检查状态时预先连接依赖校园网检查，
+        连接到检查选出的门户节点；其余步骤互不依赖，总耗时约等于最慢的一条依赖链
+        
+        各步骤只读取开始前取得的节点和请求头并返回结果，切换门户节点、更新请求头和
+        本机地址等状态变化在所有步骤结束后统一进行
+        
+        Args:
+            check_status: 是否检查登录和网络状态
+            portal_allowed: 熔断器是否允许访问门户，为False时跳过预先连接、校园网检查和
+                门户重定向探测，只执行本机IP探测和在线状态检查
+        
+        Returns:
+            dict: 步骤名称到结果的映射，campus_check的结果为可达的门户节点
+        """
+        login_url = self.login_url
+        headers = dict(self.headers)
+        
+        def status_check():
+            with self._phase("status_check"):
+                return self.is_already_logged_in()
+        
+        def campus_check():
+            with self._phase("campus_check"):
+                return self.find_campus_endpoint(headers)
+        
+        def warmup():
+            if not check_status:
+                return self.warm_up(login_url)
+            endpoint = pipeline.results.get("campus_check")
+            if endpoint is None:
+                # 门户都不可达，不会发出登录请求
+                return None
+            return self.warm_up(self.profiles.get(endpoint.host).login_url(endpoint))
+        
+        pipeline = Pipeline()
+        if not self._ip_discovered:
+            pipeline.add("ip_discovery", self.discover_ip)
+        if check_status:
+            pipeline.add("status_check", status_check)
+        # 以下步骤都会访问门户，熔断期间跳过
+        if portal_allowed and check_status:
+            pipeline.add("campus_check", campus_check)
+            pipeline.add("warmup", warmup, deps=("campus_check",))
+            if self.discover or self.redirect_params:
+                pipeline.add("captive_probe", self.fetch_redirect)
+        elif portal_allowed:
+            pipeline.add("warmup", warmup)
+        results = pipeline.run()
+        
+        if "ip_discovery" in results:
+            self.wlan_user_ip, self.wlan_user_ipv6 = results["ip_discovery"]
+            self._ip_discovered = True
+        if "captive_probe" in results:
+            self._use_redirect(results["captive_probe"])
+        if results.get("campus_check") is not None:
+            self._use_endpoint(results["campus_check"])
+        return results
+    
+    def _portal_unavailable(self):
+        """
+        门户熔断期间放弃本次登录
+        
+        Returns:
+            tuple: (False, 结果信息)
+        """
+        retry_after = self.breaker.retry_after()
+        logger.warning(f"门户暂不可用（熔断中），{retry_after:.0f} 秒后再试")
+        self.last_error_code = ERROR_PORTAL_UNAVAILABLE
+        return False, f"门户暂不可用，{retry_after:.0f} 秒后再试"
+    
+    def login(self, check_status=True):
         """
         执行登录操作，支持重试机制
         
+        Args:
+            check_status: 是否先检查登录和网络状态，账号故障转移时已检查过可跳过
+        
         Returns:
-            tuple: (bool, str) 登录是否成功，登录结果信息
-        """
-        # 检查是否已登录
-        if self.is_already_logged_in():
-            logger.info("已经登录校园网，无需再次登录")
-            return True, "已经登录校园网"
-        
-        # 检查网络连接状态
-        if not self.check_network_connectivity():
-            logger.error("网络连接不可用")
-            return False, "网络连接不可用"
-        
-        # 检查是否已连接到校园网
-        if not self.is_connected_to_campus_network():
-            logger.error("尚未连接校园网")
-            return False, "尚未连接校园网"
+            tuple: (bool, str) 登录是否成功，登录结果信息；失败原因见last_error_code
+        """
+        self.last_error_code = None
+        self.already_logged_in = False
+        
+        # 熔断期间不向门户发出任何请求，准备阶段只保留访问外网的在线状态检查；
+        # 半开状态下allow()只给出一次试探机会，获准后作为第一次登录尝试的许可
+        portal_allowed = self.breaker is None or self.breaker.allow()
+        results = self._prepare(check_status, portal_allowed)
+        if check_status:
+            # 检查是否已登录
+            if results.get("status_check"):
+                logger.info("已经登录校园网，无需再次登录")
+                self.already_logged_in = True
+                return True, "已经登录校园网"
+        if not portal_allowed:
+            return self._portal_unavailable()
+        if check_status:
+            # 校园网不可达时区分网络不可用和未连接校园网
+            if not results.get("campus_check"):
+                with self._phase("connectivity_check"):
+                    connected = self.check_network_connectivity()
+                if not connected:
+                    logger.error("网络连接不可用")
+                    self.last_error_code = ERROR_NETWORK
+                    return False, "网络连接不可用"
+                logger.error("尚未连接校园网")
+                self.last_error_code = ERROR_NOT_CAMPUS
+                return False, "尚未连接校园网"
             
-        # 支持重试机制
+            if self.redirect and self.redirect_params:
+                self.apply_redirect_params(self.redirect)
+            
+        # 支持重试机制，本次运行中无响应的节点排到最后
+        failed_endpoints = set()
         for attempt in range(1, self.max_retries + 1):
-            try:
-                logger.info(f"尝试登录 (第 {attempt}/{self.max_retries} 次)")
-                # 更新IP地址，因为可能已经变化
-                if attempt > 1:
-                    self.wlan_user_ip = self.get_local_ip()
-                    logger.info(f"更新IP地址: {self.wlan_user_ip}")
+            if attempt > 1 and self.breaker is not None and not self.breaker.allow():
+                return self._portal_unavailable()
+            
+            endpoint_failed = False
+            protocol_failed = False
+            self._use_endpoint(self.selector.best(exclude=failed_endpoints))
+            with self._phase(f"attempt_{attempt}", endpoint=self.endpoint.host) as span:
+                try:
+                    logger.info(f"尝试登录 (第 {attempt}/{self.max_retries} 次，门户节点 {self.endpoint.host})")
+                    # 更新IP地址，因为可能已经变化；优先使用门户重定向中的地址
+                    if attempt > 1 and not self.fixed_ip and self.redirect_params and not self._redirect_probed:
+                        self.probe_captive_redirect()
+                    if attempt > 1 and not self.fixed_ip:
+                        self.wlan_user_ip = self.get_local_ip()
+                        self.wlan_user_ipv6 = self.get_local_ipv6()
+                        logger.info(f"更新IP地址: {self.wlan_user_ip} {self.wlan_user_ipv6}")
                 
-                # 构建登录参数
-                params = {
-                    "c": "Portal",
-                    "a": "login",
-                    "callback": "dr1003",
-                    "login_method": "1",
-                    "user_account": self.user_account,
-                    "user_password": self.user_password,
-                    "wlan_user_ip": self.wlan_user_ip,
-                    "wlan_user_ipv6": "",
-                    "wlan_user_mac": "000000000000",
-                    "wlan_ac_ip": "",
-                    "wlan_ac_name": "",
-                    "jsVersion": "3.3.2",
-                    "v": "1117"
-                }
+                    # 构建登录参数
+                    params = {
+                        "c": "Portal",
+                        "a": "login",
+                        "callback": self.profile.callback,
+                        "login_method": "1",
+                        "user_account": self.user_account,
+                        "user_password": self.user_password,
+                        "wlan_user_ip": self.wlan_user_ip,
+                        "wlan_user_ipv6": self.wlan_user_ipv6,
+                        "wlan_user_mac": self.wlan_user_mac,
+                        "wlan_ac_ip": self.wlan_ac_ip,
+                        "wlan_ac_name": self.wlan_ac_name,
+                        "jsVersion": self.profile.js_version,
+                        "v": self.profile.v
+                    }
                 
-                # 发送登录请求
-                response = self.session.get(
-                    self.login_url, 
-                    params=params,
-                    headers=self.headers,
-                    timeout=10  # 增加超时时间
-                )
+                    # 发送登录请求
+                    request_start = time.perf_counter()
+                    if self.hedge is not None:
+                        # 首个请求迟迟未响应时通过新连接发出对冲请求
+                        response, hedged = self.hedge.get(
+                            self.transport,
+                            lambda: create_transport(self.engine, self.source_ip),
+                            self.login_url,
+                            params=params,
+                            headers=self.headers,
+                            timeout=10
+                        )
+                        if hedged:
+                            span.set("hedged", hedged)
+                    else:
+                        response = self.transport.get(
+                            self.login_url, 
+                            params=params,
+                            headers=self.headers,
+                            timeout=10  # 增加超时时间
+                        )
+                    
+                    span.set("status_code", response.status_code)
+                    # 门户有响应即记录RTT，服务器错误视为节点故障
+                    if response.status_code >= 500:
+                        endpoint_failed = True
+                    else:
+                        self.selector.record_success(self.endpoint, time.perf_counter() - request_start)
+                        if self.breaker is not None:
+                            self.breaker.record_success()
                 
-                # 处理返回结果
-                if response.status_code == 200:
-                    # 提取JSON数据 (通常在dr1003()中)
-                    json_str = re.search(r'dr1003\((.*)\)', response.text)
-                    if json_str:
-                        result = json.loads(json_str.group(1))
-                        if result.get("result") == "1":
-                            logger.info("登录成功")
-                            return True, "登录成功"
-                        else:
-                            error_msg = result.get("msg", "登录失败，未知原因")
-                            logger.error(f"登录失败: {error_msg}")
+                    # 处理返回结果
+                    if response.status_code == 200:
+                        # 提取JSON数据 (通常在dr1003()中)
+                        json_str = self.profile.response_pattern.search(response.text)
+                        result = _parse_json(json_str.group(1)) if json_str else None
+                        if isinstance(result, dict):
+                            if result.get("result") == "1":
+                                span.set("success", True)
+                                logger.info("登录成功")
+                                return True, "登录成功"
+                            else:
+                                error_msg = result.get("msg", "登录失败，未知原因")
+                                logger.error(f"登录失败: {error_msg}")
+                                self.last_error_code = classify_error(error_msg)
+                                span.set("error_code", self.last_error_code)
                             
-                            # 检查是否是密码错误，如果是则不再重试
-                            if "密码错误" in error_msg or "用户不存在" in error_msg:
-                                return False, error_msg
+                                # 账号级错误（密码错误、设备数超限、欠费等）重试无意义
+                                if self.last_error_code in ACCOUNT_ERRORS:
+                                    return False, error_msg
                             
-                            # 其他错误继续重试
+                                # 其他错误继续重试
+                        else:
+                            logger.warning(f"无法解析返回数据: {response.text[:100]}...")
+                            protocol_failed = True
                     else:
-                        logger.warning(f"无法解析返回数据: {response.text[:100]}...")
-                else:
-                    logger.error(f"HTTP请求失败，状态码: {response.status_code}")
+                        logger.error(f"HTTP请求失败，状态码: {response.status_code}")
+                        protocol_failed = response.status_code == 404
             
-            except requests.exceptions.Timeout:
-                logger.warning("登录请求超时")
-            except requests.exceptions.ConnectionError:
-                logger.warning("连接错误，可能是网络不稳定")
-            except Exception as e:
-                logger.exception(f"登录过程中发生异常: {str(e)}")
+                except TransportTimeout:
+                    logger.warning("登录请求超时")
+                    span.set("error", "timeout")
+                    endpoint_failed = True
+                except TransportConnectionError:
+                    logger.warning("连接错误，可能是网络不稳定")
+                    span.set("error", "connection")
+                    endpoint_failed = True
+                except Exception as e:
+                    logger.exception(f"登录过程中发生异常: {str(e)}")
+                    span.set("error", f"{type(e).__name__}: {e}")
+            
+            # 门户可能已升级，协议参数更新后立即重试
+            if protocol_failed and attempt < self.max_retries and self.refresh_profile():
+                continue
+            
+            if endpoint_failed:
+                self.selector.record_failure(self.endpoint)
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                failed_endpoints.add(self.endpoint)
+                # 还有未失败的节点时立即切换，无需等待
+                if attempt < self.max_retries and len(failed_endpoints) < len(self.selector.endpoints):
+                    logger.info(f"门户节点 {self.endpoint.host} 无响应，切换到其他节点")
+                    continue
             
             # 如果不是最后一次尝试，等待后重试
             if attempt < self.max_retries:
                 logger.info(f"等待 {self.retry_interval} 秒后重试...")
-                time.sleep(self.retry_interval)
+                with self._phase("backoff", seconds=self.retry_interval):
+                    get_clock().sleep(self.retry_interval)
         
+        if self.last_error_code is None:
+            self.last_error_code = ERROR_RETRIES
         return False, f"登录失败，已尝试 {self.max_retries} 次"
 
 
@@ -253,8 +705,8 @@ if __name__ == "__main__":
     user_account = input("请输入学号: ")
     user_password = getpass.getpass("请输入密码: ")
     
-    portal = ePortal(user_account, user_password)
-    success, message = portal.login()
+    with ePortal(user_account, user_password) as portal:
+        success, message = portal.login()
     
     print(message)
     if not success:
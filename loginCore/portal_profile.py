@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+门户协议参数（profile）的自动发现与缓存
+
+ePortal登录请求依赖几个随门户版本变化的常量：JSONP回调名（callback）、jsVersion、
+v参数、ePortal接口的端口和路径，以及校园网检查页面。网络中心升级门户后这些值可能改变。
+
+正常运行时直接使用缓存（首次运行使用内置默认值），不发出额外请求；只有登录请求出现
+协议层面的失败（接口404、响应无法解析）时才重新抓取门户首页及其引用的脚本，
+从中提取参数并按门户主机缓存到状态目录。
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import logging
+from urllib.parse import urljoin, urlparse
+
+from paths import get_state_dir
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.portal_profile')
+
+# 缓存格式版本，格式不兼容时旧缓存作废
+SCHEMA_VERSION = 1
+
+DEFAULT_CALLBACK = "dr1003"
+DEFAULT_JS_VERSION = "3.3.2"
+DEFAULT_V = "1117"
+
+# 发现时最多抓取的脚本数和每个页面参与解析的最大长度
+MAX_SCRIPTS = 8
+MAX_PAGE_CHARS = 256 * 1024
+DISCOVERY_TIMEOUT = 5
+
+# 参数格式校验，缓存中不符合格式的值视为无效
+_VALID = {
+    "callback": re.compile(r"^[A-Za-z_$][\w$]{0,31}$"),
+    "js_version": re.compile(r"^\d+(\.\d+){0,3}$"),
+    "v": re.compile(r"^\d{1,8}$"),
+    "port": re.compile(r"^\d{1,5}$"),
+    "path": re.compile(r"^/[\w./-]{0,63}/$"),
+    "check_page": re.compile(r"^[\w.-]{1,32}\.html?$"),
+}
+
+_SCRIPT_SRC = re.compile(r"""<script[^>]+src\s*=\s*['"]([^'"]+)['"]""", re.IGNORECASE)
+_EXTRACTORS = {
+    "callback": (
+        re.compile(r"""[?&]callback=([A-Za-z_$][\w$]*)"""),
+        re.compile(r"""['"]?callback['"]?\s*[:=]\s*['"]([A-Za-z_$][\w$]*)['"]"""),
+    ),
+    "js_version": (
+        re.compile(r"""[?&]jsVersion=(\d+(?:\.\d+){0,3})"""),
+        re.compile(r"""['"]?jsVersion['"]?\s*[:=]\s*['"](\d+(?:\.\d+){0,3})['"]"""),
+    ),
+    "v": (
+        re.compile(r"""[?&]v=(\d{1,8})\b"""),
+    ),
+    "location": (
+        re.compile(r""":(\d{1,5})(/[\w.-]*eportal[\w.-]*/)"""),
+    ),
+    "check_page": (
+        re.compile(r"""\b(a\d{1,4}\.html?)\b"""),
+    ),
+}
+
+
+class PortalProfile:
+    """单个门户的协议参数"""
+
+    def __init__(self, callback=DEFAULT_CALLBACK, js_version=DEFAULT_JS_VERSION, v=DEFAULT_V,
+                 port=None, path=None, check_page=None, discovered_at=None):
+        """
+        初始化协议参数
+
+        Args:
+            callback: JSONP回调名
+            js_version: jsVersion参数
+            v: v参数
+            port: ePortal接口端口，为空时使用节点配置的地址
+            path: ePortal接口路径，如/eportal/，为空时使用节点配置的地址
+            check_page: 校园网检查页面，如a79.htm，为空时使用节点配置的地址
+            discovered_at: 发现时间，内置默认值为None
+        """
+        self.callback = callback
+        self.js_version = js_version
+        self.v = v
+        self.port = port
+        self.path = path
+        self.check_page = check_page
+        self.discovered_at = discovered_at
+        self.response_pattern = re.compile(re.escape(callback) + r"\((.*)\)", re.DOTALL)
+
+    def base_url(self, endpoint):
+        """
+        Args:
+            endpoint: PortalEndpoint实例
+
+        Returns:
+            str: 该节点的ePortal接口地址
+        """
+        if self.port is None or self.path is None:
+            return endpoint.base_url
+        scheme = urlparse(endpoint.base_url).scheme or "http"
+        return f"{scheme}://{endpoint.host}:{self.port}{self.path}"
+
+    def check_url(self, endpoint):
+        """
+        Args:
+            endpoint: PortalEndpoint实例
+
+        Returns:
+            str: 该节点的校园网检查页面地址
+        """
+        if self.check_page is None or endpoint.custom_check_url:
+            return endpoint.check_url
+        return urljoin(endpoint.check_url, self.check_page)
+
+    def login_url(self, endpoint):
+        """
+        Args:
+            endpoint: PortalEndpoint实例
+
+        Returns:
+            str: 登录接口地址（不含账号参数）
+        """
+        return (f"{self.base_url(endpoint)}?c=Portal&a=login&callback={self.callback}"
+                f"&login_method=1&jsVersion={self.js_version}&v={self.v}")
+
+    def to_dict(self):
+        return {
+            "schema": SCHEMA_VERSION,
+            "callback": self.callback,
+            "js_version": self.js_version,
+            "v": self.v,
+            "port": self.port,
+            "path": self.path,
+            "check_page": self.check_page,
+            "discovered_at": self.discovered_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        从缓存数据创建，并做有效性检查
+
+        Returns:
+            PortalProfile: 协议参数，格式版本不符或参数格式无效时返回None
+        """
+        if not isinstance(data, dict) or data.get("schema") != SCHEMA_VERSION:
+            return None
+        for key in ("callback", "js_version", "v"):
+            if not _is_valid(key, data.get(key)):
+                return None
+        for key in ("port", "path", "check_page"):
+            if data.get(key) is not None and not _is_valid(key, data[key]):
+                return None
+        if (data.get("port") is None) != (data.get("path") is None):
+            return None
+        return cls(data["callback"], data["js_version"], data["v"], data.get("port"),
+                   data.get("path"), data.get("check_page"), data.get("discovered_at"))
+
+    def __eq__(self, other):
+        return isinstance(other, PortalProfile) and {
+            key: value for key, value in self.to_dict().items() if key != "discovered_at"
+        } == {key: value for key, value in other.to_dict().items() if key != "discovered_at"}
+
+    def __repr__(self):
+        return f"PortalProfile(callback={self.callback}, jsVersion={self.js_version}, v={self.v})"
+
+
+DEFAULT_PROFILE = PortalProfile()
+
+
+def _is_valid(key, value):
+    return isinstance(value, str) and bool(_VALID[key].match(value))
+
+
+def extract_profile(pages, base=DEFAULT_PROFILE):
+    """
+    从门户页面和脚本中提取协议参数，未找到的参数沿用基准值
+
+    Args:
+        pages: 页面文本列表，靠前的页面优先
+        base: 基准参数
+
+    Returns:
+        PortalProfile: 提取结果
+    """
+    found = {}
+    for text in pages:
+        for key, patterns in _EXTRACTORS.items():
+            if key in found:
+                continue
+            for pattern in patterns:
+                match = pattern.search(text)
+                if match:
+                    found[key] = match.groups() if key == "location" else match.group(1)
+                    break
+
+    port, path = found.get("location") or (base.port, base.path)
+    values = {
+        "callback": found.get("callback"),
+        "js_version": found.get("js_version"),
+        "v": found.get("v"),
+        "port": port,
+        "path": path,
+        "check_page": found.get("check_page"),
+    }
+    for key, value in values.items():
+        if value is not None and not _is_valid(key, value):
+            values[key] = None
+    return PortalProfile(
+        values["callback"] or base.callback,
+        values["js_version"] or base.js_version,
+        values["v"] or base.v,
+        values["port"] if values["path"] else base.port,
+        values["path"] if values["port"] else base.path,
+        values["check_page"] or base.check_page,
+        discovered_at=time.time(),
+    )
+
+
+def discover_profile(transport, endpoint, base=DEFAULT_PROFILE, headers=None):
+    """
+    抓取门户首页及其引用的同主机脚本，提取协议参数
+
+    Args:
+        transport: HTTP传输（见transport.create_transport）
+        endpoint: PortalEndpoint实例
+        base: 基准参数，未找到的参数沿用
+        headers: 请求头
+
+    Returns:
+        PortalProfile: 发现的参数，首页无法访问时返回None
+    """
+    # 门户首页与检查页面位于同一站点
+    landing_url = urljoin(endpoint.check_url, "/")
+    try:
+        response = transport.get(landing_url, headers=headers, timeout=DISCOVERY_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"抓取门户首页失败({endpoint.host}): {e}")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"抓取门户首页失败({endpoint.host})，状态码: {response.status_code}")
+        return None
+
+    final_url = getattr(response, "url", None) or landing_url
+    landing = response.text[:MAX_PAGE_CHARS]
+    # 首页跳转后的页面名即检查页面
+    page = urlparse(final_url).path.rsplit("/", 1)[-1]
+    pages = [page, landing] if _is_valid("check_page", page) else [landing]
+
+    scripts = []
+    for src in _SCRIPT_SRC.findall(landing):
+        url = urljoin(final_url, src)
+        if urlparse(url).hostname == endpoint.host and url not in scripts:
+            scripts.append(url)
+    for url in scripts[:MAX_SCRIPTS]:
+        try:
+            script = transport.get(url, headers=headers, timeout=DISCOVERY_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"抓取门户脚本失败({url}): {e}")
+            continue
+        if script.status_code == 200:
+            pages.append(script.text[:MAX_PAGE_CHARS])
+
+    profile = extract_profile(pages, base)
+    logger.info(f"门户 {endpoint.host} 的协议参数: {profile}")
+    return profile
+
+
+class ProfileCache:
+    """按门户主机缓存协议参数，保存在状态目录供各进程共享"""
+
+    def __init__(self, state_file=None):
+        """
+        初始化缓存
+
+        Args:
+            state_file: 缓存文件路径，默认保存在状态目录
+        """
+        self.state_file = state_file or os.path.join(get_state_dir(), "portal_profiles.json")
+        self._lock = threading.Lock()
+        self._profiles = self._load_state()
+
+    def get(self, host):
+        """
+        获取门户的协议参数
+
+        Args:
+            host: 门户主机
+
+        Returns:
+            PortalProfile: 缓存的参数，没有有效缓存时返回内置默认值
+        """
+        with self._lock:
+            return self._profiles.get(host) or DEFAULT_PROFILE
+
+    def put(self, host, profile):
+        """
+        缓存门户的协议参数
+
+        Args:
+            host: 门户主机
+            profile: PortalProfile实例
+        """
+        with self._lock:
+            self._profiles[host] = profile
+            self._save_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取门户协议参数缓存失败: {e}")
+            return {}
+        profiles = {}
+        for host, data in (state.items() if isinstance(state, dict) else ()):
+            profile = PortalProfile.from_dict(data)
+            if profile is None:
+                logger.warning(f"忽略无效的门户协议参数缓存: {host}")
+                continue
+            profiles[host] = profile
+        return profiles
+
+    def _save_state(self):
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({host: profile.to_dict() for host, profile in self._profiles.items()}, f, indent=4)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"保存门户协议参数缓存失败: {e}")
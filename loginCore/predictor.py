@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from clock import get_clock
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.predictor')
+
+DAY = 86400
+
+# 会话到期预测结果
+Prediction = namedtuple("Prediction", ["expires_at", "model", "samples"])
+
+
+def _quantile(sorted_values, q):
+    """最近秩分位数"""
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _seconds_of_day(ts):
+    dt = datetime.fromtimestamp(ts)
+    return dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def _circular_distance(a, b):
+    diff = abs(a - b) % DAY
+    return min(diff, DAY - diff)
+
+
+class SessionPredictor:
+    """根据历史掉线记录学习会话时长分布，预测当前会话的到期时间"""
+
+    def __init__(self, history, lookback_days=30, min_samples=3,
+                 max_spread_ratio=0.2, cutoff_window=900, cutoff_share=0.5):
+        """
+        初始化预测器
+
+        Args:
+            history: LoginHistory实例
+            lookback_days: 参与学习的历史天数
+            min_samples: 启用某个模型所需的最少样本数
+            max_spread_ratio: 会话时长p10~p90跨度与中位数之比不超过该值时认为存在固定最长会话时长
+            cutoff_window: 每日定时断网的时间聚类窗口(秒)
+            cutoff_share: 落在同一时间窗口内的掉线占比不低于该值时认为存在每日定时断网
+        """
+        self.history = history
+        self.lookback_days = lookback_days
+        self.min_samples = min_samples
+        self.max_spread_ratio = max_spread_ratio
+        self.cutoff_window = cutoff_window
+        self.cutoff_share = cutoff_share
+        self.max_session = None
+        self.daily_cutoff = None
+        self.samples = 0
+
+    def fit(self, now=None):
+        """
+        从登录历史中重新学习会话时长与每日断网时间
+
+        Args:
+            now: 当前时间，默认为当前时间
+        """
+        now = get_clock().time() if now is None else now
+        sessions = self.history.ended_sessions(now - self.lookback_days * DAY)
+        self.samples = len(sessions)
+        self.max_session = self._fit_max_session(sessions)
+        self.daily_cutoff = self._fit_daily_cutoff(sessions)
+
+        if self.max_session is not None:
+            logger.info(f"学习到最长会话时长约 {self.max_session / 60:.1f} 分钟 (样本 {self.samples})")
+        if self.daily_cutoff is not None:
+            cutoff = timedelta(seconds=int(self.daily_cutoff))
+            logger.info(f"学习到每日定时断网时间约为 {cutoff} (样本 {self.samples})")
+
+    def _fit_max_session(self, sessions):
+        """
+        会话时长集中时，取会话至少存活时长的p10作为保守的最长会话时长
+
+        Returns:
+            float: 最长会话时长(秒)，不存在规律时返回None
+        """
+        if len(sessions) < self.min_samples:
+            return None
+        # 掉线发生在最后在线时间与检测到掉线的时间之间，取区间中点估计会话时长
+        mids = sorted((last_seen + ended) / 2 - started for started, last_seen, ended in sessions)
+        median = _quantile(mids, 0.5)
+        if median <= 0 or _quantile(mids, 0.9) - _quantile(mids, 0.1) > self.max_spread_ratio * median:
+            return None
+        # 以最后在线时间为准偏向提前；常驻服务在预测点附近密集探测后样本区间会迅速收窄
+        lower_bounds = sorted(last_seen - started for started, last_seen, _ in sessions)
+        return _quantile(lower_bounds, 0.1)
+
+    def _fit_daily_cutoff(self, sessions):
+        """
+        寻找掉线时间在一天中的聚集点，取聚集簇中最早的时间作为断网时间
+
+        Returns:
+            float: 当天零点起的秒数，不存在规律时返回None
+        """
+        if len(sessions) < self.min_samples:
+            return None
+        ends = [_seconds_of_day((last_seen + ended) / 2) for _, last_seen, ended in sessions]
+        best = []
+        for center in ends:
+            cluster = [t for t in ends if _circular_distance(t, center) <= self.cutoff_window]
+            if len(cluster) > len(best):
+                best = cluster
+        if len(best) < self.min_samples or len(best) < self.cutoff_share * len(ends):
+            return None
+        anchor = best[0]
+        # 以簇内第一个点为基准展开，避免跨越零点时取最小值出错
+        offsets = [((t - anchor + DAY / 2) % DAY) - DAY / 2 for t in best]
+        return (anchor + min(offsets)) % DAY
+
+    def predict(self, session_start, now=None):
+        """
+        预测当前会话的到期时间
+
+        Args:
+            session_start: 当前会话开始时间(Unix时间戳)，未知时为None
+            now: 当前时间，默认为当前时间
+
+        Returns:
+            Prediction: 预测结果，没有可用模型时返回None
+        """
+        now = get_clock().time() if now is None else now
+        candidates = []
+
+        if self.max_session is not None and session_start is not None:
+            expires_at = session_start + self.max_session
+            if expires_at > now - self.cutoff_window:
+                candidates.append(Prediction(expires_at, "max_session", self.samples))
+
+        if self.daily_cutoff is not None:
+            base = datetime.fromtimestamp(max(now, session_start or now))
+            base = base.replace(hour=0, minute=0, second=0, microsecond=0)
+            expires_at = base.timestamp() + self.daily_cutoff
+            if expires_at < now - self.cutoff_window:
+                expires_at = (base + timedelta(days=1)).timestamp() + self.daily_cutoff
+            candidates.append(Prediction(expires_at, "daily_cutoff", self.samples))
+
+        if not candidates:
+            return None
+        return min(candidates, key=lambda prediction: prediction.expires_at)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+requests传输适配器：连接通过Happy Eyeballs建立，并可绑定本机源地址；
+在cancel_scope()内发出的请求把使用的连接登记到CancelHandle，可以单独中断
+"""
+
+import socket
+import threading
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from happy_eyeballs import happy_eyeballs_connect
+
+# 当前线程正在进行的请求的CancelHandle
+_local = threading.local()
+
+
+@contextmanager
+def cancel_scope(cancel):
+    """
+    在当前线程中发出的请求把使用的连接登记到cancel
+
+    Args:
+        cancel: CancelHandle，为空时不登记
+    """
+    if cancel is None:
+        yield
+        return
+    _local.cancel = cancel
+    try:
+        yield
+    finally:
+        _local.cancel = None
+        cancel.finish()
+
+
+def _attach(sock):
+    cancel = getattr(_local, "cancel", None)
+    return cancel is None or cancel.attach(sock)
+
+
+class _HappyEyeballsMixin:
+    """替换urllib3连接的建连方式"""
+
+    def _new_conn(self):
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else None
+        try:
+            sock = happy_eyeballs_connect(self._dns_host, self.port, timeout, self.source_address)
+        except socket.timeout as e:
+            raise ConnectTimeoutError(self, f"连接 {self.host} 超时 (timeout={timeout})") from e
+        except OSError as e:
+            raise NewConnectionError(self, f"无法建立连接: {e}") from e
+        for option in self.socket_options or ():
+            sock.setsockopt(*option)
+        if not _attach(sock):
+            raise NewConnectionError(self, f"请求 {self.host} 已取消")
+        return sock
+
+
+class HappyEyeballsHTTPConnection(_HappyEyeballsMixin, HTTPConnection):
+    pass
+
+
+class HappyEyeballsHTTPSConnection(_HappyEyeballsMixin, HTTPSConnection):
+    pass
+
+
+class _CancelMixin:
+    """从连接池取出已建立的连接时登记到当前请求的CancelHandle"""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        if conn.sock is not None and not _attach(conn.sock):
+            # 连接已被关闭，放回连接池，之后使用时会重新建立
+            conn.close()
+            self._put_conn(conn)
+            raise NewConnectionError(conn, f"请求 {self.host} 已取消")
+        return conn
+
+
+class _HTTPConnectionPool(_CancelMixin, HTTPConnectionPool):
+    ConnectionCls = HappyEyeballsHTTPConnection
+
+
+class _HTTPSConnectionPool(_CancelMixin, HTTPSConnectionPool):
+    ConnectionCls = HappyEyeballsHTTPSConnection
+
+
+class HappyEyeballsAdapter(HTTPAdapter):
+    """使用Happy Eyeballs建连的requests传输适配器"""
+
+    def __init__(self, source_address=None, **kwargs):
+        """
+        Args:
+            source_address: 绑定的本地地址(host, port)，为空时由系统选择
+        """
+        self.source_address = source_address
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.source_address:
+            kwargs["source_address"] = self.source_address
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool,
+            "https": _HTTPSConnectionPool,
+        }
+
+
+def mount_happy_eyeballs(session, source_ip=None):
+    """
+    为requests会话启用Happy Eyeballs建连
+
+    Args:
+        session: requests.Session实例
+        source_ip: 绑定的本机源地址，为空时由系统选择
+
+    Returns:
+        requests.Session: 同一会话
+    """
+    adapter = HappyEyeballsAdapter(source_address=(source_ip, 0) if source_ip else None)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
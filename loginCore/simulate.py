@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常驻服务的长时间调度模拟
+
+在虚拟时钟下运行常驻服务（LoginDaemon），门户和网络由进程内的脚本化模型代替：
+会话在最长时长或每日定时断网时被门户踢下线，登录请求按比例超时。几秒内即可跑完
+模拟的一周，统计登录次数、发往门户的请求量、未认证时长和通知数量，用于在上线前
+比较不同的调度配置（check_interval、reauth_mode、burst_interval等）。
+
+模拟使用独立的临时配置和状态目录，不会读写真实的登录历史和状态。
+
+用法: python simulate.py [--days 7] [--max-session 8] [--daily-cutoff 23:30]
+                         [--set reauth_mode=relogin] [--json]
+"""
+
+import os
+import json
+import random
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs, urlencode, quote
+
+from clock import VirtualClock, set_clock
+from platforms import PlatformBackend, set_backend
+from transport import Response, Headers, TransportTimeout, register_engine
+from captive import DEFAULT_PROBE_URL
+from endpoints import DEFAULT_PORTAL_URL
+from main import AutoLogin
+from daemon import LoginDaemon
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.simulate')
+
+ENGINE_SIMULATED = "simulated"
+
+DEFAULT_DAYS = 7
+# 门户会话的最长时长(小时)
+DEFAULT_MAX_SESSION = 8
+# 每次请求的模拟耗时(毫秒)
+DEFAULT_LATENCY = 30
+# 登录请求超时的比例
+DEFAULT_FAILURE_RATE = 0.02
+# 模拟开始时间，固定为某个周一早上，便于比较不同配置
+DEFAULT_START = "2024-09-02T08:00"
+
+# 模拟运行的配置，可用--set覆盖
+BASE_CONFIG = {
+    "student_id": "S00000000",
+    "password": "simulated",
+    "webhook_urls": ["http://webhook.invalid/simulated"],
+    "http_engine": ENGINE_SIMULATED,
+    "link_monitor_interval": 0,
+    "trace_slow_threshold": 0,
+}
+
+_INTERNET_HOST = "www.baidu.com"
+_CAPTIVE_HOST = urlsplit(DEFAULT_PROBE_URL).hostname
+
+
+class SimulatedNetwork:
+    """脚本化的门户和网络模型，会话状态按虚拟时钟计算"""
+
+    def __init__(self, clock, max_session=DEFAULT_MAX_SESSION * 3600, daily_cutoff=None,
+                 latency=DEFAULT_LATENCY / 1000, failure_rate=DEFAULT_FAILURE_RATE, seed=0,
+                 client_ip="172.16.10.2"):
+        """
+        初始化网络模型
+
+        Args:
+            clock: VirtualClock实例
+            max_session: 会话最长时长(秒)
+            daily_cutoff: 每日定时断网时间，(时, 分)，为空时不断网
+            latency: 每次请求的耗时(秒)
+            failure_rate: 登录请求超时的比例
+            seed: 随机数种子
+            client_ip: 终端地址
+        """
+        self.clock = clock
+        self.max_session = max_session
+        self.daily_cutoff = daily_cutoff
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.client_ip = client_ip
+        self.portal_host = urlsplit(DEFAULT_PORTAL_URL).hostname
+        self.requests = {"login": 0, "portal_page": 0, "internet": 0, "captive": 0}
+        self.logins = 0
+        self.login_timeouts = 0
+        self.sessions_expired = 0
+        self.unauthenticated = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._session_until = None
+        self._offline_since = clock.time()
+
+    def _next_cutoff(self, now):
+        if self.daily_cutoff is None:
+            return None
+        hour, minute = self.daily_cutoff
+        day = datetime.fromtimestamp(now)
+        cutoff = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if cutoff.timestamp() <= now:
+            cutoff += timedelta(days=1)
+        return cutoff.timestamp()
+
+    def settle(self, now=None):
+        """
+        处理到期的会话，并累计未认证时长
+
+        Args:
+            now: 当前时间，默认为虚拟时钟的当前时间
+
+        Returns:
+            bool: 当前是否在线
+        """
+        now = self.clock.time() if now is None else now
+        with self._lock:
+            if self._session_until is not None and now >= self._session_until:
+                self._offline_since = self._session_until
+                self._session_until = None
+                self.sessions_expired += 1
+            return self._session_until is not None
+
+    def finish(self, now=None):
+        """
+        结束模拟，把结束时仍未认证的时长计入统计
+
+        Args:
+            now: 结束时间，默认为虚拟时钟的当前时间
+        """
+        now = self.clock.time() if now is None else now
+        self.settle(now)
+        with self._lock:
+            if self._offline_since is not None:
+                self.unauthenticated += max(0.0, now - self._offline_since)
+                self._offline_since = now
+
+    def _login(self, now):
+        with self._lock:
+            if self._offline_since is not None:
+                self.unauthenticated += now - self._offline_since
+                self._offline_since = None
+            until = now + self.max_session
+            cutoff = self._next_cutoff(now)
+            self._session_until = until if cutoff is None else min(until, cutoff)
+            self.logins += 1
+
+    def request(self, url, params=None, timeout=10):
+        """
+        处理一次GET请求
+
+        Args:
+            url: 请求地址
+            params: 查询参数
+            timeout: 超时时间(秒)
+
+        Returns:
+            Response: 响应
+
+        Raises:
+            TransportTimeout: 登录请求按比例超时
+        """
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        online = self.settle()
+
+        if parts.hostname == _INTERNET_HOST:
+            kind = "internet"
+        elif parts.hostname == _CAPTIVE_HOST:
+            kind = "captive"
+        elif "login" in query.get("a", ()):
+            kind = "login"
+        else:
+            kind = "portal_page"
+        with self._lock:
+            self.requests[kind] += 1
+
+        if kind == "login" and self._random.random() < self.failure_rate:
+            self.clock.advance(timeout)
+            with self._lock:
+                self.login_timeouts += 1
+            raise TransportTimeout(f"请求 {parts.hostname} 超时")
+        self.clock.advance(self.latency)
+
+        if kind in ("internet", "captive") and not online:
+            # 未认证时外网请求被重定向到门户
+            location = (f"http://{self.portal_host}/a79.htm?wlanuserip={self.client_ip}"
+                        f"&wlanacip=172.16.253.1&wlanacname={quote('SIM-AC')}")
+            return _response(302, b"", url, location=location)
+        if kind == "captive":
+            return _response(200, b"<HTML><BODY>Success</BODY></HTML>", url)
+        if kind == "login":
+            self._login(self.clock.time())
+            callback = query.get("callback", ["dr1003"])[0]
+            body = json.dumps({"result": "1", "msg": "Portal协议认证成功！"}, ensure_ascii=False)
+            return _response(200, f"{callback}({body});".encode("utf-8"), url)
+        return _response(200, b"ok", url)
+
+
+def _response(status_code, content, url, location=None):
+    headers = [("Content-Type", "text/html; charset=utf-8")]
+    if location:
+        headers.append(("Location", location))
+    return Response(status_code, Headers(headers), content, url)
+
+
+class SimulatedTransport:
+    """把请求交给网络模型处理的传输，接口与BuiltinTransport一致"""
+
+    def __init__(self, network, source_ip=None):
+        self.network = network
+
+    def get(self, url, params=None, headers=None, timeout=10, allow_redirects=True, cancel=None):
+        return self.network.request(url, params=params, timeout=timeout)
+
+    def preconnect(self, url, timeout=10):
+        return False
+
+    def close(self):
+        pass
+
+
+class SimulatedBackend(PlatformBackend):
+    """模拟平台后端：配置和状态保存在临时目录，只有一个位于校园网的接口"""
+
+    name = "simulated"
+    display_name = "模拟环境"
+
+    def __init__(self, root, client_ip):
+        self.root = root
+        self.client_ip = client_ip
+
+    def config_dir(self):
+        return os.path.join(self.root, "config")
+
+    def state_dir(self):
+        return os.path.join(self.root, "state")
+
+    def log_dir(self):
+        return os.path.join(self.root, "logs")
+
+    def ipv4_addresses(self):
+        return [("sim0", self.client_ip)]
+
+    def route_source_ip(self, destination=None):
+        return None if destination and ":" in destination else self.client_ip
+
+    def os_version(self):
+        return "simulated"
+
+
+class _SimulatedAutoLogin(AutoLogin):
+    """只统计通知而不真正发送"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.notifications = {"success": 0, "failure": 0}
+
+    def send_notification(self, success, message, ip_address, account=None):
+        self.notifications["success" if success else "failure"] += 1
+
+
+class Simulation:
+    """一次模拟运行，创建时替换进程内的时钟、平台后端和HTTP引擎，close()时恢复"""
+
+    def __init__(self, config=None, start=None, log_level=logging.WARNING, **network_options):
+        """
+        初始化模拟
+
+        Args:
+            config: 覆盖的配置项
+            start: 起始的Unix时间戳，默认为DEFAULT_START
+            log_level: 登录核心的日志级别
+            **network_options: 传给SimulatedNetwork的参数
+        """
+        if start is None:
+            start = datetime.fromisoformat(DEFAULT_START).timestamp()
+        logging.getLogger('AutoNet4AHU').setLevel(log_level)
+        self.clock = VirtualClock(start)
+        self.network = SimulatedNetwork(self.clock, **network_options)
+        self._tempdir = tempfile.TemporaryDirectory(prefix="autonet4ahu-sim-")
+        self._previous_clock = set_clock(self.clock)
+        self._previous_backend = set_backend(SimulatedBackend(self._tempdir.name, self.network.client_ip))
+        register_engine(ENGINE_SIMULATED, lambda source_ip: SimulatedTransport(self.network, source_ip))
+
+        config_dir = os.path.join(self._tempdir.name, "config")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(BASE_CONFIG, **(config or {})), f, ensure_ascii=False)
+        self.auto_login = _SimulatedAutoLogin(os.path.join(config_dir, "config.json"), log_level=log_level)
+        self.daemon = LoginDaemon(self.auto_login)
+        self.steps = 0
+        self.started_at = start
+        self.finished_at = start
+
+    def run(self, days=DEFAULT_DAYS):
+        """
+        按常驻服务主循环的方式运行到指定的模拟时长
+
+        Args:
+            days: 模拟天数
+
+        Returns:
+            dict: 模拟报告
+        """
+        wall_start = time.perf_counter()
+        end = self.clock.time() + days * 86400
+        self.daemon.predictor.fit()
+        while self.clock.time() < end:
+            self.steps += 1
+            try:
+                delay = self.daemon.step(self.clock.time())
+            except Exception as e:
+                logger.exception(f"常驻服务执行检查时发生异常: {e}")
+                delay = self.auto_login.config.retry_interval
+            # 防止配置错误导致原地空转
+            self.clock.advance(max(delay, 0.1))
+        self.finished_at = min(self.clock.time(), end)
+        self.network.finish(self.finished_at)
+        # 通知在事件总线的订阅者线程中统计，汇总前等待其处理完
+        self.auto_login.events.flush()
+        return self.report(time.perf_counter() - wall_start)
+
+    def report(self, wall_time=None):
+        """
+        汇总模拟结果
+
+        Args:
+            wall_time: 实际运行耗时(秒)
+
+        Returns:
+            dict: 模拟报告
+        """
+        network = self.network
+        counters = self.daemon.metrics.snapshot()["counters"]
+        simulated = self.finished_at - self.started_at
+        return {
+            "simulated_days": round(simulated / 86400, 3),
+            "wall_seconds": None if wall_time is None else round(wall_time, 2),
+            "steps": self.steps,
+            "probes": counters.get("probes", 0),
+            "logins": counters.get("logins", 0),
+            "login_successes": counters.get("login_successes", 0),
+            "login_failures": counters.get("login_failures", 0),
+            "deauths_detected": counters.get("deauths", 0),
+            "sessions_expired": network.sessions_expired,
+            "portal_logins": network.logins,
+            "portal_login_timeouts": network.login_timeouts,
+            "requests": dict(network.requests),
+            "portal_requests": network.requests["login"] + network.requests["portal_page"],
+            "unauthenticated_seconds": round(network.unauthenticated, 1),
+            "unauthenticated_ratio": round(network.unauthenticated / simulated, 6) if simulated else None,
+            "notifications": sum(self.auto_login.notifications.values()),
+            "notifications_failed": self.auto_login.notifications["failure"],
+        }
+
+    def close(self):
+        """恢复进程内的时钟、平台后端和HTTP引擎，删除临时目录"""
+        self.auto_login.events.close()
+        if self.auto_login.history is not None:
+            self.auto_login.history.close()
+        register_engine(ENGINE_SIMULATED, None)
+        set_backend(self._previous_backend)
+        set_clock(self._previous_clock)
+        self._tempdir.cleanup()
+
+
+def _parse_setting(text):
+    """解析--set的key=value，值按JSON解析，失败时作为字符串"""
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"格式应为key=value: {text}")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def _parse_cutoff(text):
+    try:
+        parsed = datetime.strptime(text, "%H:%M")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"格式应为HH:MM: {text}")
+    return parsed.hour, parsed.minute
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻服务的长时间调度模拟")
+    parser.add_argument("--days", type=float, default=DEFAULT_DAYS, help="模拟天数")
+    parser.add_argument("--max-session", type=float, default=DEFAULT_MAX_SESSION, help="门户会话最长时长(小时)")
+    parser.add_argument("--daily-cutoff", type=_parse_cutoff, help="每日定时断网时间，如23:30")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="每次请求的耗时(毫秒)")
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_FAILURE_RATE, help="登录请求超时的比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--start", default=DEFAULT_START, help="模拟开始时间，如2024-09-02T08:00")
+    parser.add_argument("--set", type=_parse_setting, action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖配置项，值按JSON解析，可重复")
+    parser.add_argument("--verbose", action="store_true", help="输出登录核心的日志")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    simulation = Simulation(
+        config=dict(args.set),
+        start=datetime.fromisoformat(args.start).timestamp(),
+        log_level=logging.INFO if args.verbose else logging.ERROR,
+        max_session=args.max_session * 3600,
+        daily_cutoff=args.daily_cutoff,
+        latency=args.latency / 1000,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    try:
+        report = simulation.run(args.days)
+    finally:
+        simulation.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    requests = report["requests"]
+    print(f"模拟时长: {report['simulated_days']} 天（实际耗时 {report['wall_seconds']} 秒，{report['steps']} 次检查）")
+    print(f"登录: {report['logins']} 次（成功 {report['login_successes']}，失败 {report['login_failures']}），"
+          f"检测到掉线 {report['deauths_detected']} 次，门户踢下线 {report['sessions_expired']} 次")
+    print(f"门户请求: {report['portal_requests']} 次（登录 {requests['login']}，页面 {requests['portal_page']}，"
+          f"登录超时 {report['portal_login_timeouts']}），外网探测 {requests['internet']} 次，"
+          f"重定向探测 {requests['captive']} 次")
+    print(f"未认证时长: {report['unauthenticated_seconds']:.0f} 秒（{report['unauthenticated_ratio']:.4%}）")
+    print(f"通知: {report['notifications']} 条（失败通知 {report['notifications_failed']} 条）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+生成Linux上的systemd用户单元
+
+- autonet4ahu.socket: 监听控制套接字，有连接时按需启动常驻服务
+- autonet4ahu.service: 常驻登录服务，由套接字激活，空闲一段时间后自动退出
+- autonet4ahu-login.service / .timer: 定时登录检查，通过控制套接字唤醒常驻服务
+"""
+
+import os
+import sys
+import logging
+
+from control import get_socket_path
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.systemd')
+
+UNIT_NAME = "autonet4ahu"
+DEFAULT_TIMER_INTERVAL = 900
+
+
+def get_unit_dir():
+    """
+    获取systemd用户单元目录
+
+    Returns:
+        str: 单元目录路径
+    """
+    base = os.environ.get("XDG_CONFIG_HOME")
+    if not base or not os.path.isabs(base):
+        base = os.path.expanduser("~/.config")
+    return os.path.join(base, "systemd", "user")
+
+
+def get_exec_command():
+    """
+    获取启动登录核心的命令，打包后的可执行文件直接运行，否则通过当前解释器运行main.py
+
+    Returns:
+        list: 命令及参数
+    """
+    if getattr(sys, "frozen", False):
+        return [sys.executable]
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+
+
+def _quote(arg):
+    """按systemd ExecStart的规则转义参数"""
+    arg = arg.replace("%", "%%")
+    if arg and not any(c in arg for c in ' \t"\'\\;$'):
+        return arg
+    return '"' + arg.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def render_units(command=None, socket_path=None, interval=DEFAULT_TIMER_INTERVAL):
+    """
+    生成systemd用户单元内容
+
+    Args:
+        command: 启动登录核心的命令，默认为get_exec_command()
+        socket_path: 控制套接字路径，默认与常驻服务一致
+        interval: 定时登录检查的间隔(秒)
+
+    Returns:
+        dict: 单元文件名到内容的映射
+    """
+    exec_command = " ".join(_quote(arg) for arg in (command or get_exec_command()))
+    socket_path = socket_path or get_socket_path()
+    return {
+        f"{UNIT_NAME}.socket": f"""[Unit]
+Description=AutoNet4AHU 控制接口套接字
+
+[Socket]
+ListenStream={socket_path}
+SocketMode=0600
+DirectoryMode=0700
+
+[Install]
+WantedBy=sockets.target
+""",
+        f"{UNIT_NAME}.service": f"""[Unit]
+Description=AutoNet4AHU 常驻登录服务
+Requires={UNIT_NAME}.socket
+After={UNIT_NAME}.socket
+
+[Service]
+Type=simple
+ExecStart={exec_command} daemon
+Restart=on-failure
+RestartSec=30
+""",
+        f"{UNIT_NAME}-login.service": f"""[Unit]
+Description=AutoNet4AHU 定时登录检查
+Wants={UNIT_NAME}.socket
+After={UNIT_NAME}.socket
+
+[Service]
+Type=oneshot
+ExecStart={exec_command} login
+""",
+        f"{UNIT_NAME}-login.timer": f"""[Unit]
+Description=AutoNet4AHU 定时登录检查
+
+[Timer]
+OnBootSec=60
+OnUnitActiveSec={int(interval)}
+AccuracySec=30
+
+[Install]
+WantedBy=timers.target
+""",
+    }
+
+
+def install_units(unit_dir=None, interval=DEFAULT_TIMER_INTERVAL):
+    """
+    将systemd用户单元写入单元目录
+
+    Args:
+        unit_dir: 单元目录，默认为~/.config/systemd/user
+        interval: 定时登录检查的间隔(秒)
+
+    Returns:
+        list: 写入的文件路径
+    """
+    unit_dir = unit_dir or get_unit_dir()
+    os.makedirs(unit_dir, exist_ok=True)
+    written = []
+    for filename, content in render_units(interval=interval).items():
+        path = os.path.join(unit_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        written.append(path)
+        logger.info(f"已生成systemd单元: {path}")
+    return written
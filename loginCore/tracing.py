@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+登录流程的分段追踪
+
+每次登录运行生成一棵嵌套的span树（IP探测、各次探测、各次登录尝试、退避等待、
+通知发送等），span记录耗时和属性，保存在有界环形缓冲区中。慢速运行或按需时导出为
+Chrome trace-event JSON，可以直接用Perfetto（ui.perfetto.dev）或chrome://tracing打开。
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from paths import get_state_dir
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.tracing')
+
+# 环形缓冲区保留的span数量
+DEFAULT_CAPACITY = 4096
+# 追踪目录中保留的导出文件数量
+DEFAULT_KEEP = 20
+
+# 墙上时间与单调时钟的对应关系，用于把perf_counter换算为trace中的绝对时间
+_WALL_ORIGIN = time.time()
+_PERF_ORIGIN = time.perf_counter()
+
+
+class Span:
+    """一个计时区间"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration",
+                 "thread_id", "thread_name", "attributes")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.duration = None
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.attributes = dict(attributes or {})
+
+    def set(self, key, value):
+        """
+        设置span属性
+
+        Args:
+            key: 属性名
+            value: 属性值，需可JSON序列化
+        """
+        self.attributes[key] = value
+
+    def to_event(self, pid):
+        """
+        转换为Chrome trace-event的完整事件（ph=X）
+
+        Args:
+            pid: 进程ID
+
+        Returns:
+            dict: trace事件
+        """
+        args = dict(self.attributes, trace_id=self.trace_id, span_id=self.span_id)
+        if self.parent_id:
+            args["parent_id"] = self.parent_id
+        return {
+            "name": self.name,
+            "cat": "login",
+            "ph": "X",
+            "ts": round((_WALL_ORIGIN + self.start - _PERF_ORIGIN) * 1e6, 1),
+            "dur": round((self.duration or 0.0) * 1e6, 1),
+            "pid": pid,
+            "tid": self.thread_id,
+            "args": args,
+        }
+
+
+class Tracer:
+    """span的记录器，结束的span进入有界环形缓冲区"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        初始化记录器
+
+        Args:
+            capacity: 环形缓冲区保留的span数量
+        """
+        self._spans = deque(maxlen=max(1, int(capacity)))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def capacity(self):
+        return self._spans.maxlen
+
+    def resize(self, capacity):
+        """
+        调整环形缓冲区容量，保留最近的span
+
+        Args:
+            capacity: 新容量
+        """
+        capacity = max(1, int(capacity))
+        with self._lock:
+            if capacity != self._spans.maxlen:
+                self._spans = deque(self._spans, maxlen=capacity)
+
+    def current(self):
+        """
+        Returns:
+            Span: 当前线程中正在进行的span，没有时返回None
+        """
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """
+        记录一个span，嵌套在当前线程正在进行的span之下
+
+        Args:
+            name: span名称
+            parent: 父span，在线程池等其他线程中延续追踪时指定
+            **attributes: span属性
+
+        Yields:
+            Span: 可通过set()补充属性
+        """
+        parent = parent or self.current()
+        trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+            with self._lock:
+                self._spans.append(span)
+
+    @contextmanager
+    def attach(self, span):
+        """
+        在当前线程中延续已有的span，其中新建的span都挂在它下面，span本身不会重复记录
+
+        Args:
+            span: 其他线程中正在进行的span，为None时不做任何处理
+        """
+        if span is None:
+            yield
+            return
+        stack = getattr(self._local, "stack", None)
+        self._local.stack = [span]
+        try:
+            yield
+        finally:
+            self._local.stack = stack
+
+    @contextmanager
+    def resume(self, trace_id):
+        """
+        在当前线程中延续已结束的追踪（如在事件订阅者中延续登录运行的追踪），
+        其中新建的span使用该trace_id，在导出该追踪时一并导出
+
+        Args:
+            trace_id: 要延续的追踪ID，为空时不做任何处理
+        """
+        if not trace_id:
+            yield
+            return
+        # 占位的父span只提供trace_id，本身不会被记录
+        anchor = Span("resume", trace_id)
+        anchor.span_id = None
+        with self.attach(anchor):
+            yield
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """
+        开始一次新的追踪，不继承当前线程正在进行的span
+
+        Args:
+            name: 根span名称
+            **attributes: span属性
+
+        Yields:
+            Span: 根span，其trace_id标识本次追踪
+        """
+        stack = getattr(self._local, "stack", None)
+        self._local.stack = []
+        try:
+            with self.span(name, **attributes) as root:
+                yield root
+        finally:
+            self._local.stack = stack
+
+    def spans(self, trace_id=None):
+        """
+        获取缓冲区中的span
+
+        Args:
+            trace_id: 只返回指定追踪的span，为空时返回全部
+
+        Returns:
+            list: Span列表，按结束顺序排列
+        """
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+    def export(self, trace_id=None):
+        """
+        导出为Chrome trace-event格式
+
+        Args:
+            trace_id: 只导出指定追踪，为空时导出缓冲区中的全部span
+
+        Returns:
+            dict: 可直接序列化为JSON的trace
+        """
+        pid = os.getpid()
+        spans = self.spans(trace_id)
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "AutoNet4AHU"}}]
+        threads = {}
+        for span in spans:
+            threads.setdefault(span.thread_id, span.thread_name)
+        for thread_id, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        events.extend(span.to_event(pid) for span in sorted(spans, key=lambda span: span.start))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path=None, trace_id=None, keep=DEFAULT_KEEP):
+        """
+        将trace写入文件
+
+        Args:
+            path: 文件路径，为空时写入追踪目录并清理旧文件
+            trace_id: 只导出指定追踪
+            keep: 写入追踪目录时保留的文件数量
+
+        Returns:
+            str: 写入的文件路径
+        """
+        return write_trace(self.export(trace_id), path, keep=keep, label=trace_id)
+
+
+def get_trace_dir():
+    """
+    获取追踪文件目录
+
+    Returns:
+        str: 状态目录下的traces目录
+    """
+    return os.path.join(get_state_dir(), "traces")
+
+
+def write_trace(trace, path=None, keep=DEFAULT_KEEP, label=None):
+    """
+    原子写入trace文件
+
+    Args:
+        trace: Chrome trace-event格式的数据
+        path: 文件路径，为空时写入追踪目录并只保留最近keep个文件
+        keep: 追踪目录中保留的文件数量
+        label: 默认文件名中的标识，如trace_id
+
+    Returns:
+        str: 写入的文件路径
+    """
+    if path is None:
+        trace_dir = get_trace_dir()
+        os.makedirs(trace_dir, exist_ok=True)
+        name = f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(trace_dir, f"{name}-{label}.json" if label else f"{name}.json")
+        _prune(trace_dir, max(1, keep) - 1)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _prune(trace_dir, keep):
+    """删除追踪目录中较旧的文件，只保留最近keep个"""
+    files = sorted(name for name in os.listdir(trace_dir) if name.startswith("trace-") and name.endswith(".json"))
+    for name in files[:max(0, len(files) - keep)]:
+        try:
+            os.unlink(os.path.join(trace_dir, name))
+        except OSError as e:
+            logger.debug(f"删除旧追踪文件失败: {e}")
+
+
+class RunIdFilter(logging.Filter):
+    """
+    为日志记录添加run字段：在登录运行中记录的日志为"[trace_id] "，其余为空，
+    日志格式中使用%(run)s，便于在日志中筛选某一次运行
+    """
+
+    def filter(self, record):
+        span = _tracer.current()
+        record.run = f"[{span.trace_id}] " if span else ""
+        return True
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """
+    获取进程内共享的记录器
+
+    Returns:
+        Tracer: 记录器
+    """
+    return _tracer
@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+门户请求的HTTP传输层
+
+- requests: 默认引擎，基于requests/urllib3，支持系统代理
+- builtin: 内置引擎，只依赖标准库。明文HTTP直接使用套接字，请求头按主机预先编码，
+  连接保持复用，响应读取有长度上限；HTTPS使用http.client。不加载requests，
+  启动更快、内存占用更小，适合门户登录这类局域网内的单个GET请求
+
+两种引擎的get()参数和返回的响应对象（status_code、headers、text）一致，
+超时和连接失败分别抛出TransportTimeout和TransportConnectionError。get()可传入
+CancelHandle，在其他线程中只中断这一个请求，传输中的其他连接不受影响。
+"""
+
+import socket
+import threading
+import http.client
+import logging
+from urllib.parse import urlsplit, urlencode, urljoin
+
+from happy_eyeballs import happy_eyeballs_connect
+
+# 获取logger
+logger = logging.getLogger('AutoNet4AHU.transport')
+
+ENGINE_REQUESTS = "requests"
+ENGINE_BUILTIN = "builtin"
+ENGINES = (ENGINE_REQUESTS, ENGINE_BUILTIN)
+DEFAULT_ENGINE = ENGINE_REQUESTS
+
+# 内置引擎的响应读取上限
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 256 * 1024
+MAX_REDIRECTS = 5
+RECV_SIZE = 8192
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# 额外注册的引擎（如模拟器的进程内网络），名称到工厂函数的映射
+_registered_engines = {}
+
+
+class TransportError(Exception):
+    """HTTP请求失败"""
+
+
+class TransportTimeout(TransportError):
+    """HTTP请求超时"""
+
+
+class TransportConnectionError(TransportError):
+    """无法建立连接或连接中断"""
+
+
+class CancelHandle:
+    """单个请求的取消句柄，cancel()只关闭该请求正在使用的连接"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sockets = set()
+        self.cancelled = False
+        self._finished = False
+
+    def attach(self, sock):
+        """
+        登记请求使用的套接字
+
+        Args:
+            sock: 套接字
+
+        Returns:
+            bool: 请求已被取消时返回False并关闭套接字
+        """
+        with self._lock:
+            if not self.cancelled:
+                if not self._finished:
+                    self._sockets.add(sock)
+                return True
+        _shutdown(sock)
+        return False
+
+    def finish(self):
+        """请求结束，之后的cancel()不再影响已放回连接池的连接"""
+        with self._lock:
+            self._finished = True
+            self._sockets.clear()
+
+    def cancel(self):
+        """中断请求，已结束的请求不受影响"""
+        with self._lock:
+            if self._finished:
+                return
+            self.cancelled = True
+            sockets = list(self._sockets)
+            self._sockets.clear()
+        # 阻塞在recv上的线程需要shutdown才能立即返回
+        for sock in sockets:
+            _shutdown(sock)
+
+
+class Headers(dict):
+    """键不区分大小写的响应头"""
+
+    def __init__(self, items=()):
+        super().__init__((key.lower(), value) for key, value in items)
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super().__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+class Response:
+    """内置引擎的HTTP响应"""
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        content_type = self.headers.get("Content-Type", "")
+        charset = "utf-8"
+        for part in content_type.split(";")[1:]:
+            key, _, value = part.strip().partition("=")
+            if key.lower() == "charset" and value:
+                charset = value.strip('"')
+        try:
+            return self.content.decode(charset, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+class BuiltinTransport:
+    """只依赖标准库的HTTP传输"""
+
+    def __init__(self, source_ip=None):
+        """
+        初始化内置传输
+
+        Args:
+            source_ip: 绑定的本机源地址，为空时由系统选择
+        """
+        self.source_address = (source_ip, 0) if source_ip else None
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._templates = {}
+        # 正在进行的请求（线程ID到连接），close()时一并中断
+        self._in_flight = {}
+        self._generation = 0
+
+    def get(self, url, params=None, headers=None, timeout=10, allow_redirects=True, cancel=None):
+        """
+        发送GET请求
+
+        Args:
+            url: 请求地址
+            params: 追加到查询字符串的参数
+            headers: 请求头
+            timeout: 超时时间(秒)
+            allow_redirects: 是否跟随重定向
+            cancel: 本请求的CancelHandle，为空时只能通过close()中断
+
+        Returns:
+            Response: 响应
+
+        Raises:
+            TransportTimeout: 请求超时
+            TransportConnectionError: 连接失败
+            TransportError: 响应无效或超出长度上限
+        """
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                response = self._request(url, headers or {}, timeout, cancel)
+                location = response.headers.get("Location")
+                if not allow_redirects or response.status_code not in _REDIRECT_CODES or not location:
+                    return response
+                url = urljoin(url, location)
+        finally:
+            if cancel is not None:
+                cancel.finish()
+        raise TransportError(f"重定向次数过多: {url}")
+
+    def _request(self, url, headers, timeout, cancel=None):
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        if parts.scheme == "https":
+            return self._https_request(parts, target, headers, timeout, url, cancel)
+        if parts.scheme != "http":
+            raise TransportError(f"不支持的协议: {parts.scheme}")
+
+        host, port = parts.hostname, parts.port or 80
+        request = b"GET " + target.encode("ascii") + b" HTTP/1.1\r\n" + self._template(parts.netloc, headers)
+        key = (host, port)
+        ident = threading.get_ident()
+        with self._lock:
+            sock = self._connections.pop(key, None)
+            generation = self._generation
+        reused = sock is not None
+
+        try:
+            while True:
+                try:
+                    if sock is None:
+                        sock = happy_eyeballs_connect(host, port, timeout, self.source_address)
+                        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    with self._lock:
+                        if self._generation != generation:
+                            raise _Cancelled()
+                        self._in_flight[ident] = sock
+                    if cancel is not None and not cancel.attach(sock):
+                        raise _Cancelled()
+                    sock.settimeout(timeout)
+                    sock.sendall(request)
+                    status, response_headers, content, keep_alive = self._read_response(sock)
+                    break
+                except _Cancelled as e:
+                    _close(sock)
+                    raise TransportConnectionError(f"请求 {host}:{port} 已取消") from e
+                except socket.timeout as e:
+                    _close(sock)
+                    raise TransportTimeout(f"请求 {host}:{port} 超时") from e
+                except (ConnectionError, _StaleConnection) as e:
+                    _close(sock)
+                    sock = None
+                    # 复用的连接可能已被服务器关闭，重新建立一次；被取消或被close()中断的请求不再重试
+                    if reused and self._generation == generation and not (cancel and cancel.cancelled):
+                        reused = False
+                        continue
+                    raise TransportConnectionError(f"连接 {host}:{port} 失败: {e}") from e
+                except OSError as e:
+                    _close(sock)
+                    raise TransportConnectionError(f"连接 {host}:{port} 失败: {e}") from e
+                except TransportError:
+                    _close(sock)
+                    raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(ident, None)
+
+        if keep_alive and not (cancel and cancel.cancelled):
+            with self._lock:
+                if self._generation == generation:
+                    _close(self._connections.pop(key, None))
+                    self._connections[key] = sock
+                    sock = None
+            _close(sock)
+        else:
+            sock.close()
+        return Response(status, response_headers, content, url)
+
+    def _template(self, netloc, headers):
+        """按主机和请求头缓存预先编码的请求头部分"""
+        key = (netloc, tuple(headers.items()))
+        template = self._templates.get(key)
+        if template is None:
+            lines = [f"Host: {netloc}"]
+            lines.extend(f"{name}: {value}" for name, value in headers.items()
+                         if name.lower() not in ("host", "connection"))
+            lines.append("Accept-Encoding: identity")
+            lines.append("Connection: keep-alive")
+            template = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+            self._templates[key] = template
+        return template
+
+    def _read_response(self, sock):
+        """
+        读取并解析响应，头部和正文都有长度上限
+
+        Returns:
+            tuple: (状态码, 响应头, 正文, 连接能否复用)
+        """
+        buffer = bytearray()
+        while True:
+            end = buffer.find(b"\r\n\r\n")
+            if end >= 0:
+                break
+            if len(buffer) > MAX_HEADER_SIZE:
+                raise TransportError("响应头过长")
+            chunk = sock.recv(RECV_SIZE)
+            if not chunk:
+                if not buffer:
+                    raise _StaleConnection("服务器关闭了连接")
+                raise TransportError("响应头不完整")
+            buffer += chunk
+
+        lines = bytes(buffer[:end]).decode("latin-1").split("\r\n")
+        version, _, rest = lines[0].partition(" ")
+        try:
+            status = int(rest[:3])
+        except ValueError:
+            raise TransportError(f"无效的状态行: {lines[0][:100]}")
+        response_headers = Headers(
+            (name.strip(), value.strip()) for name, _, value in (line.partition(":") for line in lines[1:])
+        )
+        body = buffer[end + 4:]
+        keep_alive = version == "HTTP/1.1" and response_headers.get("Connection", "").lower() != "close"
+
+        if status in (204, 304) or 100 <= status < 200:
+            return status, response_headers, b"", keep_alive
+        if "chunked" in response_headers.get("Transfer-Encoding", "").lower():
+            return status, response_headers, _read_chunked(sock, body), keep_alive
+
+        length = response_headers.get("Content-Length")
+        if length is not None:
+            try:
+                length = int(length)
+            except ValueError:
+                raise TransportError(f"无效的Content-Length: {length}")
+            if length > MAX_BODY_SIZE:
+                raise TransportError(f"响应正文过长: {length}")
+            while len(body) < length:
+                chunk = sock.recv(min(RECV_SIZE, length - len(body)))
+                if not chunk:
+                    raise TransportError("响应正文不完整")
+                body += chunk
+            return status, response_headers, bytes(body[:length]), keep_alive
+
+        # 没有长度信息时读到连接关闭为止
+        while True:
+            chunk = sock.recv(RECV_SIZE)
+            if not chunk:
+                break
+            body += chunk
+            if len(body) > MAX_BODY_SIZE:
+                raise TransportError("响应正文过长")
+        return status, response_headers, bytes(body), False
+
+    def _https_request(self, parts, target, headers, timeout, url, cancel=None):
+        """HTTPS请求使用标准库http.client"""
+        connection = http.client.HTTPSConnection(
+            parts.hostname, parts.port or 443, timeout=timeout, source_address=self.source_address
+        )
+        try:
+            connection.connect()
+            if cancel is not None and not cancel.attach(connection.sock):
+                raise TransportConnectionError(f"请求 {parts.hostname} 已取消")
+            connection.request("GET", target, headers=headers)
+            response = connection.getresponse()
+            content = response.read(MAX_BODY_SIZE + 1)
+            if len(content) > MAX_BODY_SIZE:
+                raise TransportError("响应正文过长")
+            return Response(response.status, Headers(response.getheaders()), content, url)
+        except socket.timeout as e:
+            raise TransportTimeout(f"请求 {parts.hostname} 超时") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportConnectionError(f"请求 {parts.hostname} 失败: {e}") from e
+        finally:
+            connection.close()
+
+    def preconnect(self, url, timeout=10):
+        """
+        预先建立到目标主机的连接并放入连接池，之后的请求直接复用，省去建立连接的时间
+
+        Args:
+            url: 之后要请求的地址，只对明文HTTP生效
+            timeout: 连接超时时间(秒)
+
+        Returns:
+            bool: 是否新建了连接
+        """
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            return False
+        key = (parts.hostname, parts.port or 80)
+        with self._lock:
+            if key in self._connections:
+                return False
+        try:
+            sock = happy_eyeballs_connect(key[0], key[1], timeout, self.source_address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            logger.debug(f"预先连接 {key[0]}:{key[1]} 失败: {e}")
+            return False
+        with self._lock:
+            if key in self._connections:
+                sock.close()
+                return False
+            self._connections[key] = sock
+        return True
+
+    def close(self):
+        """关闭所有保持的连接，并中断其他线程中正在进行的请求"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            in_flight = list(self._in_flight.values())
+            self._generation += 1
+        for sock in connections:
+            _close(sock)
+        # 阻塞在recv上的线程需要shutdown才能立即返回
+        for sock in in_flight:
+            _shutdown(sock)
+
+
+class _StaleConnection(Exception):
+    """复用的连接在收到响应前被关闭"""
+
+
+class _Cancelled(Exception):
+    """请求在发出前被close()取消"""
+
+
+def _close(sock):
+    if sock is not None:
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _fill_until(sock, buffer, delimiter):
+    """接收数据直到缓冲区中出现分隔符，返回分隔符位置"""
+    while True:
+        index = buffer.find(delimiter)
+        if index >= 0:
+            return index
+        if len(buffer) > MAX_HEADER_SIZE:
+            raise TransportError("分块头过长")
+        chunk = sock.recv(RECV_SIZE)
+        if not chunk:
+            raise TransportError("分块正文不完整")
+        buffer += chunk
+
+
+def _read_chunked(sock, buffer):
+    """读取分块编码的正文"""
+    buffer = bytearray(buffer)
+    body = bytearray()
+    while True:
+        line_end = _fill_until(sock, buffer, b"\r\n")
+        try:
+            size = int(bytes(buffer[:line_end]).split(b";")[0], 16)
+        except ValueError:
+            raise TransportError("无效的分块长度")
+        del buffer[:line_end + 2]
+        if size == 0:
+            # 跳过尾部字段，读到空行为止
+            while True:
+                line_end = _fill_until(sock, buffer, b"\r\n")
+                del buffer[:line_end + 2]
+                if line_end == 0:
+                    return bytes(body)
+        if len(body) + size > MAX_BODY_SIZE:
+            raise TransportError("响应正文过长")
+        while len(buffer) < size + 2:
+            chunk = sock.recv(RECV_SIZE)
+            if not chunk:
+                raise TransportError("分块正文不完整")
+            buffer += chunk
+        body += buffer[:size]
+        del buffer[:size + 2]
+
+
+class RequestsTransport:
+    """基于requests的HTTP传输，支持系统代理"""
+
+    def __init__(self, source_ip=None):
+        """
+        初始化requests传输
+
+        Args:
+            source_ip: 绑定的本机源地址，为空时由系统选择
+        """
+        # 按需导入，使用内置引擎时不加载requests
+        import requests
+        from requests_adapter import mount_happy_eyeballs, cancel_scope
+
+        self._exceptions = requests.exceptions
+        self._cancel_scope = cancel_scope
+        self.session = mount_happy_eyeballs(requests.Session(), source_ip)
+        self.session.trust_env = True  # 允许从环境变量读取代理配置
+
+    def get(self, url, params=None, headers=None, timeout=10, allow_redirects=True, cancel=None):
+        """
+        发送GET请求，参数与BuiltinTransport.get()相同
+
+        Returns:
+            requests.Response: 响应
+        """
+        try:
+            with self._cancel_scope(cancel):
+                return self.session.get(url, params=params, headers=headers, timeout=timeout,
+                                        allow_redirects=allow_redirects)
+        except self._exceptions.Timeout as e:
+            raise TransportTimeout(str(e)) from e
+        except self._exceptions.ConnectionError as e:
+            raise TransportConnectionError(str(e)) from e
+        except self._exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+
+    def preconnect(self, url, timeout=10):
+        """
+        与BuiltinTransport.preconnect()接口一致：向目标主机的根路径发出HEAD请求，
+        建立的连接留在会话的连接池中，之后同一主机和端口的请求直接复用
+
+        Args:
+            url: 之后要请求的地址
+            timeout: 超时时间(秒)
+
+        Returns:
+            bool: 是否连通了目标主机
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        # 不请求url本身，避免把不带账号参数的登录接口请求发给门户
+        try:
+            self.session.head(f"{parts.scheme}://{parts.netloc}/", timeout=timeout, allow_redirects=False).close()
+        except self._exceptions.RequestException as e:
+            logger.debug(f"预先连接 {parts.netloc} 失败: {e}")
+            return False
+        return True
+
+    def close(self):
+        """关闭会话"""
+        self.session.close()
+
+
+def create_transport(engine=DEFAULT_ENGINE, source_ip=None):
+    """
+    创建HTTP传输
+
+    Args:
+        engine: 引擎名称，requests、builtin或通过register_engine()注册的名称，无效时使用默认引擎
+        source_ip: 绑定的本机源地址
+
+    Returns:
+        BuiltinTransport或RequestsTransport实例
+    """
+    if engine in _registered_engines:
+        return _registered_engines[engine](source_ip)
+    if engine == ENGINE_BUILTIN:
+        return BuiltinTransport(source_ip)
+    if engine not in ENGINES:
+        logger.warning(f"未知的HTTP引擎 {engine}，使用 {DEFAULT_ENGINE}")
+    return RequestsTransport(source_ip)
+
+
+def register_engine(name, factory):
+    """
+    注册额外的HTTP引擎
+
+    Args:
+        name: 引擎名称，配置项http_engine使用
+        factory: 工厂函数，参数为source_ip，返回与BuiltinTransport接口一致的传输；为None时取消注册
+    """
+    if factory is None:
+        _registered_engines.pop(name, None)
+    else:
+        _registered_engines[name] = factory